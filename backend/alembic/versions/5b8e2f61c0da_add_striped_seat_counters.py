@@ -0,0 +1,57 @@
+"""Add striped seat counters for hot flights
+
+Revision ID: 5b8e2f61c0da
+Revises: e3a1c9d4b7f2
+Create Date: 2026-10-17 11:40:27.502114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e2f61c0da'
+down_revision: Union[str, Sequence[str], None] = 'e3a1c9d4b7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add flights.seat_stripes and the flight_seat_stripes table."""
+    op.add_column(
+        'flights',
+        sa.Column('seat_stripes', sa.Integer(), server_default='0', nullable=False,
+                  comment='Stripes per cabin in flight_seat_stripes; 0 = counts live on this row'),
+    )
+    op.create_table('flight_seat_stripes',
+        sa.Column('flight_id', sa.UUID(), sa.ForeignKey('flights.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('availability_field', sa.String(), primary_key=True,
+                  comment='Flight column this stripe belongs to, e.g. economy_available'),
+        sa.Column('stripe', sa.Integer(), primary_key=True),
+        sa.Column('available', sa.Integer(), nullable=False),
+        sa.CheckConstraint('available >= 0', name='ck_flight_seat_stripes_available'),
+    )
+
+
+def downgrade() -> None:
+    """Fold any stripes back into flights and drop the striped counters."""
+    op.execute("""
+    UPDATE flights SET
+      economy_available = COALESCE(t.economy_available, flights.economy_available),
+      premium_economy_available = COALESCE(t.premium_economy_available, flights.premium_economy_available),
+      business_available = COALESCE(t.business_available, flights.business_available),
+      first_available = COALESCE(t.first_available, flights.first_available)
+    FROM (
+      SELECT flight_id,
+        SUM(available) FILTER (WHERE availability_field = 'economy_available') AS economy_available,
+        SUM(available) FILTER (WHERE availability_field = 'premium_economy_available') AS premium_economy_available,
+        SUM(available) FILTER (WHERE availability_field = 'business_available') AS business_available,
+        SUM(available) FILTER (WHERE availability_field = 'first_available') AS first_available
+      FROM flight_seat_stripes GROUP BY flight_id
+    ) t
+    WHERE flights.id = t.flight_id
+    """)
+    op.drop_table('flight_seat_stripes')
+    op.drop_column('flights', 'seat_stripes')
@@ -0,0 +1,27 @@
+"""Index booking_flights by flight
+
+Revision ID: 7c2d94e0b1a6
+Revises: 5b8e2f61c0da
+Create Date: 2026-10-17 14:05:12.318407
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d94e0b1a6'
+down_revision: Union[str, Sequence[str], None] = '5b8e2f61c0da'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Let flight cancellation and status notifications find a flight's bookings without a scan."""
+    op.create_index('ix_booking_flights_flight_id', 'booking_flights', ['flight_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the booking_flights.flight_id index."""
+    op.drop_index('ix_booking_flights_flight_id', table_name='booking_flights')
@@ -0,0 +1,27 @@
+"""Add booking reference sequence
+
+Revision ID: d41f7a3b9e58
+Revises: 7c2d94e0b1a6
+Create Date: 2026-10-17 15:22:48.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f7a3b9e58'
+down_revision: Union[str, Sequence[str], None] = '7c2d94e0b1a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the sequence workers lease booking number blocks from; the increment is the block size."""
+    op.execute("CREATE SEQUENCE booking_reference_seq START WITH 1 INCREMENT BY 1000 NO CYCLE")
+
+
+def downgrade() -> None:
+    """Drop the booking reference sequence."""
+    op.execute("DROP SEQUENCE IF EXISTS booking_reference_seq")
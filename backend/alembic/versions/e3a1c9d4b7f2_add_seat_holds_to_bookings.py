@@ -0,0 +1,37 @@
+"""Add seat hold expiry to bookings
+
+Revision ID: e3a1c9d4b7f2
+Revises: 97104f13e472
+Create Date: 2026-10-17 09:12:04.318520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a1c9d4b7f2'
+down_revision: Union[str, Sequence[str], None] = '97104f13e472'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add bookings.hold_expires_at and the partial index the expiry reaper scans."""
+    op.add_column(
+        'bookings',
+        sa.Column('hold_expires_at', sa.DateTime(timezone=True), nullable=True,
+                  comment='Seats of a pending booking are returned after this'),
+    )
+    op.create_index(
+        'ix_bookings_pending_hold_expires_at', 'bookings', ['hold_expires_at'],
+        unique=False, postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    """Drop the seat hold expiry."""
+    op.drop_index('ix_bookings_pending_hold_expires_at', table_name='bookings')
+    op.drop_column('bookings', 'hold_expires_at')
@@ -3,8 +3,15 @@ import sys
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, users, airports, flights, bookings, payments, flight_admin, test_endpoints
+from app.routers import auth, users, airports, flights, bookings, payments, flight_admin, metrics, test_endpoints
 from app.database.init_db import init_db, logger as db_logger
+from app.services.reference_data import reference_data
+from app.services.flight_index import SEARCH_BACKEND, flight_index
+from app.services.booking import booking_pipeline
+from app.services.booking_reference import booking_references
+from app.services.idempotency import ensure_single_worker
+from app.services.seat_holds import seat_hold_reaper
+from app.services.seat_stripes import striped_totals_sync
 import uvicorn
 
 # Configure logging for the main application
@@ -33,8 +40,8 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "Accept"],
-    expose_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "Accept", "Idempotency-Key"],
+    expose_headers=["Content-Type", "Authorization", "X-Search-Partial", "X-Next-Cursor", "Idempotent-Replayed"],
 )
 
 # Include routers
@@ -45,6 +52,7 @@ app.include_router(flights.router, prefix="/flights", tags=["Flights"])
 app.include_router(bookings.router, prefix="/bookings", tags=["Bookings"])
 app.include_router(payments.router, prefix="/payments", tags=["Payments"])
 app.include_router(flight_admin.router, prefix="/admin/flights", tags=["Flight Administration"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
 
 # Include test endpoints for testing authentication
 app.include_router(test_endpoints.router, prefix="/api", tags=["Test Endpoints"])
@@ -53,6 +61,9 @@ app.include_router(test_endpoints.router, prefix="/api", tags=["Test Endpoints"]
 async def startup_event():
     logger.info("Starting SkyBound Journeys API...")
     try:
+        # Idempotency-Key outcomes are per process; several workers would book retries twice
+        ensure_single_worker()
+        
         # Initialize database connection
         logger.info("Initializing database connection...")
         await init_db()
@@ -77,12 +88,49 @@ async def startup_event():
                 logger.error(f"Failed to run migrations: {e}", exc_info=True)
                 # Continue startup even if migrations fail
         
+        # Load airports and airlines into the in-process registry
+        try:
+            await reference_data.load()
+            reference_data.start_periodic_refresh()
+        except Exception as e:
+            # Searches will retry the load lazily on first use
+            logger.warning(f"Could not load reference data at startup: {e}")
+        
+        # Optionally hold the flights table in memory for columnar search
+        if SEARCH_BACKEND == "columnar":
+            try:
+                await flight_index.load()
+                flight_index.start_periodic_reload()
+            except Exception as e:
+                logger.warning(f"Columnar search index unavailable, using SQL search: {e}")
+        
+        # Lease the first block of booking numbers
+        try:
+            await booking_references.start()
+        except Exception as e:
+            # The first booking will lease it instead
+            logger.warning(f"Could not lease booking numbers at startup: {e}")
+        
+        # Return seats of pending bookings whose hold expired
+        seat_hold_reaper.start()
+        # Fold striped seat counters back into the flights table for search
+        striped_totals_sync.start()
+        
         logger.info("SkyBound Journeys API startup complete")
     except Exception as e:
         logger.error(f"Failed to initialize application: {e}", exc_info=True)
         # Re-raise the exception to prevent app startup if critical initialization fails
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await reference_data.stop_periodic_refresh()
+    await flight_index.stop_periodic_reload()
+    await seat_hold_reaper.stop()
+    await striped_totals_sync.stop()
+    await booking_references.stop()
+    await booking_pipeline.stop()
+
 @app.get("/", tags=["Root"])
 async def root():
     """
@@ -3,6 +3,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import os
 from app.services.supabase_client import get_supabase_client
+from app.services.principal_cache import principal_cache
 
 # JWT security scheme
 security = HTTPBearer()
@@ -17,6 +18,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     Validates the JWT token and returns the user
     """
     token = credentials.credentials
+    user = principal_cache.get(token, scope="middleware")
+    if user is not None:
+        return user
     
     try:
         # Verify the token
@@ -36,8 +40,10 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"},
             )
             
-        # Return the user ID from the token
-        return {"id": user_id, "email": payload.get("email")}
+        # Return the user ID from the token, and reuse it until the token expires
+        user = {"id": user_id, "email": payload.get("email")}
+        principal_cache.set(token, user, payload.get("exp"), scope="middleware")
+        return user
         
     except jwt.PyJWTError:
         raise HTTPException(
@@ -2,6 +2,8 @@
 Base models and mixins
 """
 import uuid
+from decimal import Decimal
+from typing import Any, Dict
 from sqlalchemy import Column, DateTime
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
@@ -15,3 +17,18 @@ class TimestampMixin:
 def generate_uuid():
     """Generate UUID for primary keys"""
     return str(uuid.uuid4())
+
+def model_to_dict(instance) -> Dict[str, Any]:
+    """
+    Convert an ORM instance into a plain dict shaped like the PostgREST rows
+    the API used to return (UUIDs as strings, numerics as floats)
+    """
+    data = {}
+    for column in instance.__table__.columns:
+        value = getattr(instance, column.key)
+        if isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, Decimal):
+            value = float(value)
+        data[column.key] = value
+    return data
@@ -1,7 +1,7 @@
 """
 Booking models for SQLAlchemy ORM
 """
-from sqlalchemy import Column, String, ForeignKey, Numeric, Boolean, CheckConstraint, UniqueConstraint, Index
+from sqlalchemy import Column, String, ForeignKey, Numeric, Boolean, DateTime, CheckConstraint, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import text
 from sqlalchemy.orm import relationship
@@ -18,6 +18,7 @@ class Booking(Base, TimestampMixin):
     trip_type = Column(String, nullable=False)
     total_amount = Column(Numeric, nullable=False)
     status = Column(String, nullable=False, server_default="confirmed")
+    hold_expires_at = Column(DateTime(timezone=True), nullable=True, comment="Seats of a pending booking are returned after this")
     
     # Relationships
     booking_flights = relationship("BookingFlight", back_populates="booking", cascade="all, delete-orphan")
@@ -29,6 +30,7 @@ class Booking(Base, TimestampMixin):
         CheckConstraint("trip_type IN ('one-way', 'round-trip')"),
         CheckConstraint("status IN ('confirmed', 'cancelled', 'pending')"),
         Index('ix_bookings_user_id_created_at', 'user_id', 'created_at'),
+        Index('ix_bookings_pending_hold_expires_at', 'hold_expires_at', postgresql_where=text("status = 'pending'")),
     )
     
     def __repr__(self):
@@ -51,6 +53,7 @@ class BookingFlight(Base, TimestampMixin):
     # Unique constraint to prevent duplicating the same flight in a booking
     __table_args__ = (
         UniqueConstraint('booking_id', 'flight_id', 'is_return_flight', name='unique_booking_flight'),
+        Index('ix_booking_flights_flight_id', 'flight_id'),
     )
     
     def __repr__(self):
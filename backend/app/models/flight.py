@@ -33,6 +33,7 @@ class Flight(Base, TimestampMixin):
     first_available = Column(Integer, server_default="0", nullable=True)
     
     stops = Column(Integer, server_default="0", nullable=False)
+    seat_stripes = Column(Integer, server_default="0", nullable=False, comment="Stripes per cabin in flight_seat_stripes; 0 = counts live on this row")
     
     # Relationships
     airline = relationship("Airline")
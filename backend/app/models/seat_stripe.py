@@ -0,0 +1,23 @@
+"""
+Striped seat counter model for SQLAlchemy ORM
+"""
+from sqlalchemy import Column, String, Integer, ForeignKey, CheckConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from app.database.database import Base
+
+
+class FlightSeatStripe(Base):
+    """One slice of a hot flight's availability for one cabin (flight_seat_stripes table)"""
+    __tablename__ = "flight_seat_stripes"
+
+    flight_id = Column(UUID(as_uuid=True), ForeignKey("flights.id", ondelete="CASCADE"), primary_key=True)
+    availability_field = Column(String, primary_key=True, comment="Flight column this stripe belongs to, e.g. economy_available")
+    stripe = Column(Integer, primary_key=True)
+    available = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("available >= 0", name="ck_flight_seat_stripes_available"),
+    )
+
+    def __repr__(self):
+        return f"<FlightSeatStripe(flight_id={self.flight_id}, field={self.availability_field}, stripe={self.stripe})>"
@@ -3,6 +3,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.schemas.user import UserCreate, UserResponse, TokenResponse, LoginRequest, RefreshTokenRequest
 from app.middleware.auth import get_current_user
 from app.services.supabase_client import get_supabase_client, get_gotrue_client
+from app.services.principal_cache import principal_cache
 from gotrue.errors import AuthApiError
 
 router = APIRouter()
@@ -149,6 +150,8 @@ async def logout(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(
     """
     gotrue_client = get_gotrue_client()
     token = credentials.credentials
+    # Stop accepting the token in this process right away
+    principal_cache.invalidate(token)
     
     try:
         gotrue_client.sign_out(token)
@@ -1,22 +1,32 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Header, Query, Response
+from typing import List, Dict, Any, Optional
 from app.schemas.booking import BookingCreate, BookingUpdate, BookingResponse, BookingDetailResponse
 from app.services.auth import get_current_user
 from app.services.email import EmailNotificationService
 from app.services.booking import (
-    create_booking, get_booking_details_by_id, generate_booking_reference, 
-    get_all_booking_details_for_user, validate_flight_availability, update_seat_availability, rollback_seat_deductions
+    create_booking, get_booking_details_by_id, generate_booking_reference,
+    list_user_bookings, update_booking_details, DEFAULT_BOOKING_PAGE_SIZE, MAX_BOOKING_PAGE_SIZE
 )
+from app.services import seat_holds
+from app.services.idempotency import run_idempotent
 from app.database.init_db import get_supabase_client
 
 router = APIRouter()
 
 
 @router.post("", response_model=BookingDetailResponse)
-async def create_new_booking(booking_data: BookingCreate, current_user: dict = Depends(get_current_user)):
+async def create_new_booking(
+    booking_data: BookingCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: dict = Depends(get_current_user),
+):
     """
     Create a new booking for the authenticated user and deduct seats from flights.
     Supports both one-way and round-trip bookings with proper seat availability validation.
+
+    Retries that send the same `Idempotency-Key` get the first response back
+    (marked with `Idempotent-Replayed: true`) instead of booking again.
     """
     # Convert Pydantic model to dictionary
     booking_dict = booking_data.dict()
@@ -32,28 +42,48 @@ async def create_new_booking(booking_data: BookingCreate, current_user: dict = D
     
     # Create the booking using the enhanced booking service
     # This will handle all validation, seat deduction, and rollback if needed
-    try:
-        booking_details = await create_booking(current_user["id"], booking_dict)
-        return booking_details
-    except HTTPException as e:
-        # Re-raise HTTP exceptions from the booking service
-        raise e
-    except Exception as e:
-        # For any other exceptions, wrap in an HTTP exception
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An unexpected error occurred while creating the booking: {str(e)}"
-        )
+    async def book():
+        try:
+            return await create_booking(current_user["id"], booking_dict)
+        except HTTPException as e:
+            # Re-raise HTTP exceptions from the booking service
+            raise e
+        except Exception as e:
+            # For any other exceptions, wrap in an HTTP exception
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"An unexpected error occurred while creating the booking: {str(e)}"
+            )
+    
+    replayed, booking_details = await run_idempotent(
+        idempotency_key, f"bookings:{current_user['id']}", booking_dict, book
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return booking_details
 
 
 @router.get("", response_model=List[BookingDetailResponse])
-async def get_user_bookings(current_user: dict = Depends(get_current_user)):
+async def get_user_bookings(
+    response: Response,
+    limit: int = Query(DEFAULT_BOOKING_PAGE_SIZE, ge=1, le=MAX_BOOKING_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    status_filter: str = Query(None, alias="status", pattern="^(confirmed|cancelled|pending)$"),
+    when: str = Query(None, pattern="^(upcoming|past)$", description="upcoming while any flight has yet to depart"),
+    trip_type: str = Query(None, pattern="^(one-way|round-trip)$"),
+    current_user: dict = Depends(get_current_user),
+):
     """
-    Get all detailed bookings for the authenticated user.
+    Get detailed bookings for the authenticated user, newest first.
+
+    Results are paged by keyset; `X-Next-Cursor` carries the cursor for the
+    next page and is absent on the last one.
     """
     try:
-        bookings = await get_all_booking_details_for_user(current_user["id"])
-        return bookings
+        page = await list_user_bookings(
+            current_user["id"], limit=limit, cursor=cursor, status_filter=status_filter,
+            when=when, trip_type=trip_type,
+        )
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -61,6 +91,9 @@ async def get_user_bookings(current_user: dict = Depends(get_current_user)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to retrieve bookings: {str(e)}"
         )
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.bookings
 
 
 @router.get("/{booking_id}", response_model=BookingDetailResponse)
@@ -68,24 +101,9 @@ async def get_booking(booking_id: str, current_user: dict = Depends(get_current_
     """
     Get detailed information about a specific booking
     """
-    supabase = get_supabase_client()
-    
-    # Check if booking exists and belongs to the user
-    booking_response = supabase.table("bookings") \
-        .select("id") \
-        .eq("id", booking_id) \
-        .eq("user_id", current_user["id"]) \
-        .execute()
-    
-    if hasattr(booking_response, "error") or len(booking_response.data) == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Booking with ID {booking_id} not found or does not belong to you"
-        )
-    
-    # Get booking details using the service
+    # Scoping by user makes a booking owned by someone else look missing
     try:
-        booking_details = await get_booking_details_by_id(booking_id)
+        booking_details = await get_booking_details_by_id(booking_id, user_id=current_user["id"])
         return booking_details
     except HTTPException as e:
         # Re-raise HTTP exceptions
@@ -99,69 +117,27 @@ async def get_booking(booking_id: str, current_user: dict = Depends(get_current_
 
 
 @router.put("/{booking_id}", response_model=BookingDetailResponse)
-async def update_booking(booking_id: str, booking_update: BookingUpdate, current_user: dict = Depends(get_current_user)):
+async def update_booking(
+    booking_id: str,
+    booking_update: BookingUpdate,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user),
+):
     """
     Update a booking (e.g., change status to cancelled)
+
+    The status change and all passenger edits commit together; the
+    notification email is sent after the response.
     """
-    supabase = get_supabase_client()
-    
-    # Check if booking exists and belongs to the user
-    check_response = supabase.table("bookings") \
-        .select("id") \
-        .eq("id", booking_id) \
-        .eq("user_id", current_user["id"]) \
-        .execute()
-    
-    if hasattr(check_response, "error") or len(check_response.data) == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Booking with ID {booking_id} not found or does not belong to you"
-        )
-    
-    # Separate passenger updates from booking status updates
     update_payload = booking_update.dict(exclude_unset=True)
-    passenger_updates = update_payload.pop('passengers', None)
-
-    # Update passenger details if provided
-    if passenger_updates:
-        for p_update in passenger_updates:
-            p_id = p_update.pop('id')
-            passenger_update_response = supabase.table('passengers') \
-                .update(p_update) \
-                .eq('id', p_id) \
-                .eq('booking_id', booking_id) \
-                .execute()
-            if hasattr(passenger_update_response, 'error') and passenger_update_response.error:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Failed to update passenger {p_id}: {passenger_update_response.error}"
-                )
-
-    # Update booking status if provided
-    if update_payload:
-        update_response = supabase.table("bookings") \
-            .update(update_payload) \
-            .eq("id", booking_id) \
-            .execute()
-        if hasattr(update_response, "error") and update_response.error:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to update booking status: {update_response.error}"
-            )
-    
-    # Fetch the final, updated booking details to return
-    updated_booking = await get_booking_details_by_id(booking_id)
-    
+    updated_booking = await update_booking_details(booking_id, current_user["id"], update_payload)
 
-    
     # Send email notification about the update
     user_email = current_user.get('email')
     if user_email:
-        update_type = 'modified'
-        if 'status' in update_payload and update_payload['status'] == 'cancelled':
-            update_type = 'cancelled'
-        
-        await EmailNotificationService.send_booking_update(
+        update_type = 'cancelled' if update_payload.get('status') == 'cancelled' else 'modified'
+        background_tasks.add_task(
+            EmailNotificationService.send_booking_update,
             email_to=[user_email],
             booking_details=updated_booking,
             update_type=update_type
@@ -175,8 +151,9 @@ async def cancel_booking(booking_id: str, current_user: dict = Depends(get_curre
     """
     Cancel a booking.
 
-    This endpoint marks a booking as 'cancelled'. It checks for ownership
-    and prevents cancelling an already cancelled booking.
+    This endpoint marks a booking as 'cancelled' and returns its seats to the
+    flights. It checks for ownership and prevents cancelling an already
+    cancelled booking.
     """
     supabase = get_supabase_client()
 
@@ -201,22 +178,20 @@ async def cancel_booking(booking_id: str, current_user: dict = Depends(get_curre
             detail="Booking is already cancelled."
         )
 
-    # 3. Update the booking status to 'cancelled'.
-    update_response = supabase.table("bookings") \
-        .update({"status": "cancelled"}) \
-        .eq("id", booking_id) \
-        .execute()
-
-    if hasattr(update_response, "error") and update_response.error:
+    # 3. Mark the booking 'cancelled' and return its seats in one transaction.
+    try:
+        cancelled_booking = await seat_holds.cancel_booking(booking_id, user_id=current_user["id"])
+    except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to cancel booking: {update_response.error.message}"
+            detail=f"Failed to cancel booking: {str(e)}"
         )
 
-    if not update_response.data:
+    if not cancelled_booking:
+        # Cancelled concurrently after the check above
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve booking details after cancellation."
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Booking is already cancelled."
         )
 
     # 4. Send email notification about booking cancellation
@@ -234,7 +209,7 @@ async def cancel_booking(booking_id: str, current_user: dict = Depends(get_curre
         print(f"Failed to send cancellation email for booking {booking_id}: {e}")
 
     # 5. Return the updated booking object.
-    return update_response.data[0]
+    return cancelled_booking
 
 
 @router.get("/reference/generate", response_model=Dict[str, str])
@@ -242,5 +217,5 @@ async def generate_booking_ref(current_user: dict = Depends(get_current_user)):
     """
     Generate a unique booking reference
     """
-    booking_ref = generate_booking_reference()
+    booking_ref = await generate_booking_reference()
     return {"booking_reference": booking_ref}
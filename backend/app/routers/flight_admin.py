@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import uuid
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends
 from typing import Dict, Any
 from datetime import datetime
-from app.schemas.flight import FlightStatusUpdate, FlightDetailResponse
-from app.services.auth import get_current_user
+from app.schemas.flight import FlightCancellationResponse, FlightStatusUpdate, FlightDetailResponse, SeatStripesResponse, SeatStripesUpdate
+from app.services.auth import get_current_user_remote
 from app.services.email import EmailNotificationService
 from app.database.init_db import get_supabase_client
+from app.database.database import AsyncSessionLocal
+from app.models import Flight
+from app.models.base import model_to_dict
+from app.services.reference_data import reference_data
+from app.services.flight_index import SEARCH_BACKEND, flight_index
+from app.services import flight_cancellation, inventory_events, seat_stripes
 
 router = APIRouter()
 
@@ -13,25 +20,105 @@ connected_clients = {}
 
 async def get_flight_with_details(flight_id: str):
     """Get flight details with airline and airport information"""
-    supabase = get_supabase_client()
-    
-    response = supabase.table("flights") \
-        .select("*, airline:airlines(*), origin_airport:airports!origin_airport_id(*), destination_airport:airports!destination_airport_id(*)") \
-        .eq("id", flight_id) \
-        .single() \
-        .execute()
-    
-    if hasattr(response, "error") or not response.data:
+    try:
+        flight_uuid = uuid.UUID(str(flight_id))
+    except ValueError:
+        flight_uuid = None
+
+    flight = None
+    if flight_uuid:
+        async with AsyncSessionLocal() as session:
+            flight = await session.get(Flight, flight_uuid)
+
+    if not flight:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Flight with ID {flight_id} not found"
         )
     
-    return response.data
+    flight_details = model_to_dict(flight)
+    await reference_data.refresh_missing([flight_details])
+    return reference_data.attach(flight_details)
+
+
+def require_admin_user(current_user: dict):
+    """Raise a 403 unless the current user has admin privileges"""
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can perform this action"
+        )
+
+
+@router.post("/reference-data/reload")
+async def reload_reference_data(current_user: dict = Depends(get_current_user_remote)):
+    """
+    Reload the in-process airport and airline registry (requires admin privileges)
+    
+    Use after editing the airports or airlines tables so searches and booking
+    documents pick up the change without waiting for the periodic check.
+    """
+    require_admin_user(current_user)
+    await reference_data.load()
+    return reference_data.stats()
+
+
+@router.post("/search-index/reload")
+async def reload_search_index(current_user: dict = Depends(get_current_user_remote)):
+    """
+    Rebuild the columnar in-memory search index (requires admin privileges)
+    
+    Only meaningful when SEARCH_BACKEND=columnar.
+    """
+    require_admin_user(current_user)
+    if SEARCH_BACKEND != "columnar":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The columnar search index is not enabled (SEARCH_BACKEND=sql)"
+        )
+    await flight_index.load()
+    return flight_index.stats()
+
+
+@router.post("/{flight_id}/seat-stripes", response_model=SeatStripesResponse)
+async def update_seat_stripes(flight_id: str, stripes_update: SeatStripesUpdate, current_user: dict = Depends(get_current_user_remote)):
+    """
+    Switch a flight into striped seat counters, or back with stripes=0 (requires admin privileges)
+    
+    Striping splits each cabin's availability over several rows so that
+    concurrent bookings on a hot flight stop queueing on one row lock.
+    """
+    require_admin_user(current_user)
+    return await seat_stripes.set_stripes(flight_id, stripes_update.stripes)
+
+
+@router.post("/{flight_id}/cancel", response_model=FlightCancellationResponse)
+async def cancel_flight(flight_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user_remote)):
+    """
+    Cancel a flight and every booking on it (requires admin privileges)
+    
+    Bookings are cancelled and their seats returned in one transaction;
+    their owners are emailed after the response is sent. Safe to re-run:
+    bookings that are already cancelled are left alone.
+    """
+    require_admin_user(current_user)
+    cancellation = await flight_cancellation.cancel_flight(flight_id)
+    
+    if flight_id in connected_clients:
+        for queue in connected_clients[flight_id]:
+            await queue.put({
+                "flight_id": flight_id,
+                "status": "cancelled",
+                "timestamp": datetime.utcnow().isoformat()
+            })
+    
+    if cancellation.bookings:
+        background_tasks.add_task(flight_cancellation.notify_cancelled_bookings, cancellation)
+    return cancellation.summary()
 
 
 @router.post("/status/{flight_id}", response_model=FlightDetailResponse)
-async def update_flight_status(flight_id: str, status_update: FlightStatusUpdate, current_user: dict = Depends(get_current_user)):
+async def update_flight_status(flight_id: str, status_update: FlightStatusUpdate, current_user: dict = Depends(get_current_user_remote)):
     """
     Update flight status (requires admin privileges)
     
@@ -59,6 +146,9 @@ async def update_flight_status(flight_id: str, status_update: FlightStatusUpdate
             detail=f"Flight with ID {flight_id} not found or couldn't be updated"
         )
     
+    # Drop cached searches and update the search index for this flight
+    inventory_events.publish_status_change(update_response.data[0], status_update.status)
+    
     # Get updated flight with details
     flight_details = await get_flight_with_details(flight_id)
     
@@ -1,23 +1,41 @@
 import logging
-from fastapi import APIRouter, HTTPException, status, Request, Depends
+from fastapi import APIRouter, HTTPException, status, Request, Response, Depends, Query
 from fastapi.responses import StreamingResponse
 from app.services.auth import get_current_user
 from app.services.booking import get_booking_details_by_id
+from app.services.flight_search import (
+    FARE_CALENDAR_MAX_DAYS,
+    fare_calendar,
+    search_connections,
+    search_round_trip_pairs,
+    search_flight_inventory,
+    search_flight_page,
+    plan_search,
+    stream_flight_search,
+)
+from app.services import inventory_events, seat_stripes
 import random
 from typing import List, Literal
-from app.schemas.flight import FlightSearchParams, FlightResponse, FlightDetailResponse, FlightAvailabilityResponse, FlightStatusUpdate, Passengers
+from app.schemas.flight import ConnectionItinerary, FareCalendarDay, FlightSearchParams, FlightResponse, FlightDetailResponse, FlightAvailabilityResponse, FlightStatusUpdate, Passengers, RoundTripPair
 from app.database.init_db import get_supabase_client
+from app.database.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
 from sse_starlette.sse import EventSourceResponse
 import json
 import asyncio
-import warnings
 from datetime import datetime
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+# Page size used when only a cursor is supplied
+DEFAULT_SEARCH_PAGE_SIZE = 50
+
 
 @router.get("/search", response_model=List[FlightResponse])
 async def search_flights(
+    response: Response,
     from_code: str,
     to_code: str,
     departure_date: str,
@@ -32,10 +50,22 @@ async def search_flights(
     max_price: float = None,
     airline_code: str = None,
     max_duration: int = None,  # in minutes
+    limit: int = Query(None, ge=1, le=500, description="Page size; enables keyset pagination"),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    stream: bool = Query(False, description="Stream results as NDJSON instead of one JSON array"),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Search for flights based on origin, destination, date, and other criteria.
     Supports round-trip searches, filtering, and sorting.
+
+    If one leg of a round trip fails, the other leg is still returned and the
+    `X-Search-Partial` response header names the missing leg.
+
+    With `limit`, results are returned one keyset page at a time (outbound
+    leg first, then return leg) and `X-Next-Cursor` carries the cursor for
+    the next page. With `stream=true`, rows are written as newline-delimited
+    JSON while they are read from the database.
     """
     passengers = Passengers(adults=adults, children=children, infants=infants)
     trip_type = 'round-trip' if return_date else 'one-way'
@@ -50,143 +80,181 @@ async def search_flights(
         trip_type=trip_type
     )
 
-    total_passengers = params.passengers.adults + params.passengers.children
-    cabin_availability_column = f"{params.cabin_class.replace('-', '_')}_available"
-    cabin_price_column = f"{params.cabin_class.replace('-', '_')}_price"
+    filters = dict(
+        sort_by=sort_by,
+        sort_order=sort_order,
+        min_price=min_price,
+        max_price=max_price,
+        airline_code=airline_code,
+        max_duration=max_duration,
+    )
+
+    if stream:
+        if limit or cursor:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="stream cannot be combined with limit or cursor"
+            )
+
+        # Resolved up front: once streaming starts, an error can no longer change the status
+        plan = await plan_search(params, **filters)
+
+        async def ndjson_rows():
+            async for flight in stream_flight_search(plan):
+                yield FlightResponse.model_validate(flight).model_dump_json() + "\n"
+
+        return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson")
 
     try:
-        warnings.warn(
-            "get_supabase_client() is deprecated. Use SQLAlchemy ORM models and async sessions instead.",
-            DeprecationWarning
+        if limit or cursor:
+            result = await search_flight_page(db, params, limit or DEFAULT_SEARCH_PAGE_SIZE, cursor, **filters)
+        else:
+            result = await search_flight_inventory(db, params, **filters)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Flight search failed: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred: {str(e)}"
         )
 
-        supabase = get_supabase_client()
-
-        # First, get the IDs of the airports from their IATA codes
-        origin_airport_response = supabase.table('airports').select('id').eq('iata_code', params.from_code.upper()).execute()
-        if not origin_airport_response.data:
-            return []  # No flights if origin airport not found
-        origin_airport_id = origin_airport_response.data[0]['id']
+    if result.partial:
+        # One leg of a round trip failed; tell the client which one is missing
+        response.headers["X-Search-Partial"] = ",".join(result.failed_legs)
+    if result.next_cursor:
+        response.headers["X-Next-Cursor"] = result.next_cursor
+    return result.flights
 
-        destination_airport_response = supabase.table('airports').select('id').eq('iata_code', params.to_code.upper()).execute()
-        if not destination_airport_response.data:
-            return []  # No flights if destination airport not found
-        destination_airport_id = destination_airport_response.data[0]['id']
 
-        # Query for outbound flights
-        outbound_query = supabase.table('flights').select(
-            '*, airline:airlines(*), origin_airport:airports!origin_airport_id(*), destination_airport:airports!destination_airport_id(*)'
+@router.get("/search/pairs", response_model=List[RoundTripPair])
+async def search_round_trip_combinations(
+    response: Response,
+    from_code: str,
+    to_code: str,
+    departure_date: str,
+    return_date: str,
+    cabin_class: Literal['economy', 'premium-economy', 'business', 'first'] = 'economy',
+    adults: int = 1,
+    children: int = 0,
+    infants: int = 0,
+    rank_by: Literal['price', 'duration', 'score'] = 'price',
+    top_k: int = Query(20, ge=1, le=200),
+    min_price: float = None,
+    max_price: float = None,
+    airline_code: str = None,
+    max_duration: int = None,  # in minutes
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Round-trip search that returns the best outbound + return combinations,
+    ranked by total price, total duration or a composite score, instead of
+    two flat lists for the client to pair up.
+    """
+    params = FlightSearchParams(
+        from_code=from_code,
+        to_code=to_code,
+        departure_date=departure_date,
+        return_date=return_date,
+        passengers=Passengers(adults=adults, children=children, infants=infants),
+        cabin_class=cabin_class,
+        trip_type='round-trip',
+    )
+    try:
+        pairs, failed_legs = await search_round_trip_pairs(
+            db, params, rank_by=rank_by, top_k=top_k,
+            min_price=min_price, max_price=max_price, airline_code=airline_code, max_duration=max_duration,
         )
-        outbound_query = outbound_query.eq('origin_airport_id', origin_airport_id)
-        outbound_query = outbound_query.eq('destination_airport_id', destination_airport_id)
-        outbound_query = outbound_query.gte("departure_time", f"{params.departure_date}T00:00:00") \
-                                      .lt("departure_time", f"{params.departure_date}T23:59:59")
-
-        # Apply common filters
-        if total_passengers > 0:
-            outbound_query = outbound_query.gte(cabin_availability_column, total_passengers)
-        
-        # Apply price filters if specified
-        if min_price is not None:
-            outbound_query = outbound_query.gte(cabin_price_column, min_price)
-        if max_price is not None:
-            outbound_query = outbound_query.lte(cabin_price_column, max_price)
-            
-        # Apply duration filter if specified
-        if max_duration is not None:
-            outbound_query = outbound_query.lte('duration_minutes', max_duration)
-            
-        # Apply airline filter if specified
-        if airline_code:
-            airline_response = supabase.table('airlines').select('id').eq('iata_code', airline_code.upper()).execute()
-            if airline_response.data:
-                airline_id = airline_response.data[0]['id']
-                outbound_query = outbound_query.eq('airline_id', airline_id)
-        
-        # Apply sorting
-        if sort_by:
-            # Handle price sorting specially since it depends on cabin class
-            if sort_by == 'price':
-                outbound_query = outbound_query.order(cabin_price_column, desc=(sort_order == 'desc'))
-            else:
-                outbound_query = outbound_query.order(sort_by, desc=(sort_order == 'desc'))
-        
-        outbound_response = outbound_query.execute()
-        
-        if hasattr(outbound_response, 'error') and outbound_response.error:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Database error: {outbound_response.error.message}"
-            )
-        
-        outbound_flights = outbound_response.data
-        
-        # For one-way trips, return just the outbound flights
-        if trip_type == 'one-way':
-            return outbound_flights
-        
-        # For round-trips, also query return flights
-        return_query = supabase.table('flights').select(
-            '*, airline:airlines(*), origin_airport:airports!origin_airport_id(*), destination_airport:airports!destination_airport_id(*)'
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Round-trip pair search failed: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred: {str(e)}"
         )
-        return_query = return_query.eq('origin_airport_id', destination_airport_id)  # Swap origin and destination
-        return_query = return_query.eq('destination_airport_id', origin_airport_id)
-        return_query = return_query.gte("departure_time", f"{params.return_date}T00:00:00") \
-                                  .lt("departure_time", f"{params.return_date}T23:59:59")
-        
-        # Apply the same filters to return flights
-        if total_passengers > 0:
-            return_query = return_query.gte(cabin_availability_column, total_passengers)
-            
-        if min_price is not None:
-            return_query = return_query.gte(cabin_price_column, min_price)
-        if max_price is not None:
-            return_query = return_query.lte(cabin_price_column, max_price)
-            
-        if max_duration is not None:
-            return_query = return_query.lte('duration_minutes', max_duration)
-            
-        if airline_code:
-            if airline_response and airline_response.data:
-                return_query = return_query.eq('airline_id', airline_id)
-        
-        # Apply the same sorting to return flights
-        if sort_by:
-            if sort_by == 'price':
-                return_query = return_query.order(cabin_price_column, desc=(sort_order == 'desc'))
-            else:
-                return_query = return_query.order(sort_by, desc=(sort_order == 'desc'))
-        
-        return_response = return_query.execute()
-        
-        if hasattr(return_response, 'error') and return_response.error:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Database error: {return_response.error.message}"
-            )
-        
-        # Combine outbound and return flights
-        # Mark outbound flights
-        for flight in outbound_flights:
-            flight['is_return'] = False
-            
-        # Mark return flights
-        return_flights = return_response.data
-        for flight in return_flights:
-            flight['is_return'] = True
-            
-        # Return combined results
-        return outbound_flights + return_flights
 
+    if failed_legs:
+        response.headers["X-Search-Partial"] = ",".join(failed_legs)
+    return pairs
+
+
+@router.get("/connections", response_model=List[ConnectionItinerary])
+async def search_connecting_flights(
+    from_code: str,
+    to_code: str,
+    departure_date: str,
+    cabin_class: Literal['economy', 'premium-economy', 'business', 'first'] = 'economy',
+    adults: int = 1,
+    children: int = 0,
+    infants: int = 0,
+    max_stops: int = Query(2, ge=0, le=2),
+    sort_by: Literal['price', 'duration'] = 'price',
+    min_connection_minutes: int = Query(None, ge=0),
+    max_connection_minutes: int = Query(None, ge=0),
+    max_duration: int = Query(None, ge=1, description="Maximum door-to-door minutes"),
+    max_price: float = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Search nonstop, one-stop and two-stop itineraries between two airports,
+    enforcing minimum and maximum connection times at each hub.
+    """
+    params = FlightSearchParams(
+        from_code=from_code,
+        to_code=to_code,
+        departure_date=departure_date,
+        passengers=Passengers(adults=adults, children=children, infants=infants),
+        cabin_class=cabin_class,
+    )
+    try:
+        return await search_connections(
+            db,
+            params,
+            max_stops=max_stops,
+            sort_by=sort_by,
+            min_connection_minutes=min_connection_minutes,
+            max_connection_minutes=max_connection_minutes,
+            max_duration=max_duration,
+            max_price=max_price,
+            limit=limit,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error(f"Connection search failed: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected error occurred: {str(e)}"
         )
 
+
+@router.get("/calendar", response_model=List[FareCalendarDay])
+async def get_fare_calendar(
+    from_code: str,
+    to_code: str,
+    departure_date: str,
+    days: int = Query(3, ge=0, le=FARE_CALENDAR_MAX_DAYS, description="Days before and after departure_date"),
+    cabin_class: Literal['economy', 'premium-economy', 'business', 'first'] = 'economy',
+    adults: int = 1,
+    children: int = 0,
+    infants: int = 0,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Cheapest available fare and number of flights for each day in a window
+    around departure_date, computed with a single grouped query.
+    """
+    try:
+        return await fare_calendar(
+            db, from_code, to_code, departure_date, days,
+            cabin_class=cabin_class, total_passengers=adults + children,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error(f"Fare calendar failed: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected error occurred: {str(e)}"
@@ -214,26 +282,22 @@ async def get_flight_details(flight_id: str):
 
 
 @router.get("/{flight_id}/availability", response_model=FlightAvailabilityResponse)
-async def get_flight_availability(flight_id: str):
+async def get_flight_availability(flight_id: str, db: AsyncSession = Depends(get_db)):
     """
     Get seat availability for a specific flight.
+    
+    Striped flights report the sum of their seat stripes.
     """
     try:
-        response = get_supabase_client().table('flights').select(
-            'economy_available, premium_economy_available, business_available, first_available'
-        ).eq('id', flight_id).single().execute()
-
-        if hasattr(response, 'error') and response.error:
-            if "PGRST116" in response.error.code:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found")
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {response.error.message}")
-
-        return response.data
-
+        availability = await seat_stripes.flight_availability(db, flight_id)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error(f"Availability lookup failed for flight {flight_id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {str(e)}")
 
+    if availability is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found")
+    return availability
+
 
 @router.put("/{flight_id}/status", status_code=status.HTTP_204_NO_CONTENT)
 async def update_flight_status(flight_id: str, status_update: FlightStatusUpdate):
@@ -249,6 +313,7 @@ async def update_flight_status(flight_id: str, status_update: FlightStatusUpdate
         if not response.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found to update")
 
+        inventory_events.publish_status_change(response.data[0], status_update.status)
         return
 
     except Exception as e:
@@ -292,8 +357,6 @@ async def stream_flight_updates(request: Request):
 
     return EventSourceResponse(mock_event_generator())
 
-logger = logging.getLogger(__name__)
-
 @router.get("/track/{booking_id}")
 async def track_flight_status(booking_id: str, request: Request, current_user: dict = Depends(get_current_user)):
     """
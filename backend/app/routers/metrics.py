@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+from typing import Dict, Any
+from app.services.auth import jwks_cache
+from app.services.booking import booking_pipeline
+from app.services.booking_cache import booking_cache
+from app.services.flight_index import flight_index
+from app.services.idempotency import idempotency_store
+from app.services.principal_cache import principal_cache
+from app.services.reference_data import reference_data
+from app.services.route_graph import route_graph
+from app.services.search_cache import search_cache
+
+router = APIRouter()
+
+
+@router.get("/caches", response_model=Dict[str, Any])
+async def get_cache_metrics():
+    """
+    Report size, hit/miss and eviction counters for the in-process caches,
+    and batch sizes of the booking group-commit pipeline
+    """
+    return {
+        "search_results": search_cache.stats(),
+        "reference_data": reference_data.stats(),
+        "search_index": flight_index.stats(),
+        "route_graph": route_graph.stats(),
+        "booking_details": booking_cache.stats(),
+        "idempotency": idempotency_store.stats(),
+        "signing_keys": jwks_cache.stats(),
+        "principals": principal_cache.stats(),
+        "booking_pipeline": booking_pipeline.stats(),
+    }
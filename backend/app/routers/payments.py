@@ -1,60 +1,84 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Response
+from typing import Optional
 from app.schemas.payment import PaymentCreate, PaymentResponse, PaymentDetailResponse
 from app.services.auth import get_current_user
 from app.database.init_db import get_supabase_client
+from app.services import seat_holds
+from app.services.idempotency import run_idempotent
 
 router = APIRouter()
 
 
 @router.post("", response_model=PaymentResponse)
-async def process_payment(payment_data: PaymentCreate, current_user: dict = Depends(get_current_user)):
+async def process_payment(
+    payment_data: PaymentCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: dict = Depends(get_current_user),
+):
     """
     Process a payment for a booking
+
+    Retries that send the same `Idempotency-Key` get the first response back
+    (marked with `Idempotent-Replayed: true`) instead of charging again.
     """
-    supabase = get_supabase_client()
+    async def pay():
+        supabase = get_supabase_client()
     
-    # Verify the booking belongs to the user
-    booking_response = supabase.table("bookings") \
-        .select("id") \
-        .eq("id", payment_data.booking_id) \
-        .eq("user_id", current_user["id"]) \
-        .execute()
+        # Verify the booking belongs to the user
+        booking_response = supabase.table("bookings") \
+            .select("id") \
+            .eq("id", payment_data.booking_id) \
+            .eq("user_id", current_user["id"]) \
+            .execute()
     
-    if hasattr(booking_response, "error") or len(booking_response.data) == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found or does not belong to you"
-        )
+        if hasattr(booking_response, "error") or len(booking_response.data) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Booking not found or does not belong to you"
+            )
     
-    # In a real system, we would integrate with a payment processor here
-    # For now, we'll simulate a successful payment
+        # In a real system, we would integrate with a payment processor here
+        # For now, we'll simulate a successful payment
     
-    # Create payment record
-    payment = {
-        "booking_id": payment_data.booking_id,
-        "amount": payment_data.amount,
-        "currency": payment_data.currency,
-        "status": "completed",  # In a real system, this would initially be "pending"
-        "payment_method": payment_data.payment_method,
-        "payment_details": payment_data.payment_details  # In production, sensitive data should be encrypted
-    }
+        # Create payment record
+        payment = {
+            "booking_id": payment_data.booking_id,
+            "amount": payment_data.amount,
+            "currency": payment_data.currency,
+            "status": "completed",  # In a real system, this would initially be "pending"
+            "payment_method": payment_data.payment_method,
+            "payment_details": payment_data.payment_details  # In production, sensitive data should be encrypted
+        }
     
-    # Insert payment into database
-    payment_response = supabase.table("payments").insert(payment).execute()
+        # Insert payment into database
+        payment_response = supabase.table("payments").insert(payment).execute()
     
-    if hasattr(payment_response, "error") and payment_response.error:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to process payment: {payment_response.error}"
-        )
+        if hasattr(payment_response, "error") and payment_response.error:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to process payment: {payment_response.error}"
+            )
     
-    # In a real system, we would update the booking status after payment confirmation
-    supabase.table("bookings") \
-        .update({"status": "confirmed"}) \
-        .eq("id", payment_data.booking_id) \
-        .execute()
+        # Convert the seat hold into a confirmed booking
+        try:
+            await seat_holds.convert_hold(payment_data.booking_id)
+        except HTTPException:
+            # The seats have gone back on sale, so the payment is refunded
+            supabase.table("payments") \
+                .update({"status": "refunded"}) \
+                .eq("id", payment_response.data[0]["id"]) \
+                .execute()
+            raise
     
-    return payment_response.data[0]
+        return payment_response.data[0]
+
+    replayed, payment = await run_idempotent(
+        idempotency_key, f"payments:{current_user['id']}", payment_data.dict(), pay
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return payment
 
 
 @router.get("/{payment_id}", response_model=PaymentDetailResponse)
@@ -1,17 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from typing import List
 from app.schemas.user import UserProfileResponse, UserProfileUpdate
 from app.schemas.booking import BookingResponse
-from app.services.auth import get_current_user
+from app.services.auth import get_current_user, get_current_user_remote
 from app.database.init_db import get_supabase_client
+from app.services.booking import list_user_bookings, DEFAULT_BOOKING_PAGE_SIZE, MAX_BOOKING_PAGE_SIZE
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserProfileResponse)
-async def get_current_user_profile(current_user: dict = Depends(get_current_user)):
+async def get_current_user_profile(current_user: dict = Depends(get_current_user_remote)):
     """
     Get the profile of the currently authenticated user
+    
+    Checked with Supabase: the profile needs fields the access token does not carry.
     """
     supabase = get_supabase_client()
     
@@ -49,7 +52,7 @@ async def get_current_user_profile(current_user: dict = Depends(get_current_user
 
 
 @router.put("/me", response_model=UserProfileResponse)
-async def update_user_profile(profile_data: UserProfileUpdate, current_user: dict = Depends(get_current_user)):
+async def update_user_profile(profile_data: UserProfileUpdate, current_user: dict = Depends(get_current_user_remote)):
     """
     Update the profile of the currently authenticated user
     """
@@ -88,23 +91,24 @@ async def update_user_profile(profile_data: UserProfileUpdate, current_user: dic
 
 
 @router.get("/me/bookings", response_model=List[BookingResponse])
-async def get_user_bookings(current_user: dict = Depends(get_current_user)):
+async def get_user_bookings(
+    response: Response,
+    limit: int = Query(DEFAULT_BOOKING_PAGE_SIZE, ge=1, le=MAX_BOOKING_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    status_filter: str = Query(None, alias="status", pattern="^(confirmed|cancelled|pending)$"),
+    when: str = Query(None, pattern="^(upcoming|past)$"),
+    trip_type: str = Query(None, pattern="^(one-way|round-trip)$"),
+    current_user: dict = Depends(get_current_user),
+):
     """
-    Get all bookings for the currently authenticated user
+    Get bookings for the currently authenticated user, newest first
+
+    Same paging and filters as GET /bookings, without flights and passengers.
     """
-    supabase = get_supabase_client()
-    
-    # Get user bookings from database
-    bookings_response = supabase.table("bookings") \
-        .select("*") \
-        .eq("user_id", current_user["id"]) \
-        .order("created_at", desc=True) \
-        .execute()
-    
-    if hasattr(bookings_response, "error") and bookings_response.error:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to retrieve bookings: {bookings_response.error}"
-        )
-    
-    return bookings_response.data
+    page = await list_user_bookings(
+        current_user["id"], limit=limit, cursor=cursor, status_filter=status_filter,
+        when=when, trip_type=trip_type, details=False,
+    )
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.bookings
@@ -35,7 +35,8 @@ class PassengerUpdate(BaseModel):
 
 
 class BookingUpdate(BaseModel):
-    status: Optional[Literal['confirmed', 'cancelled']] = None
+    # Bookings are confirmed by paying for their seat hold, never by an update
+    status: Optional[Literal['cancelled']] = None
     passengers: Optional[List[PassengerUpdate]] = None
 
 
@@ -61,6 +62,7 @@ class BookingResponse(BaseModel):
     trip_type: str
     total_amount: float
     status: str
+    hold_expires_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Literal
-from datetime import datetime
+from datetime import date, datetime
 
 
 class AirportBase(BaseModel):
@@ -67,6 +67,30 @@ class FlightResponse(BaseModel):
     airline: AirlineResponse
     origin_airport: AirportResponse
     destination_airport: AirportResponse
+    is_return: Optional[bool] = None
+
+
+class ConnectionItinerary(BaseModel):
+    segments: List[FlightResponse]
+    stops: int
+    total_price: float
+    total_duration_minutes: int
+    departure_time: datetime
+    arrival_time: datetime
+
+
+class RoundTripPair(BaseModel):
+    outbound_flight: FlightResponse
+    return_flight: FlightResponse
+    total_price: float
+    total_duration_minutes: int
+    score: float
+
+
+class FareCalendarDay(BaseModel):
+    departure_date: date
+    cheapest_price: Optional[float] = None
+    flight_count: int = 0
 
 
 class FlightDetailResponse(FlightResponse):
@@ -88,6 +112,26 @@ class FlightAvailabilityResponse(BaseModel):
     updated_at: datetime
 
 
+class SeatStripesUpdate(BaseModel):
+    stripes: int = Field(..., ge=0, le=64, description="Seat counters per cabin; 0 returns to a single row")
+
+
+class SeatStripesResponse(BaseModel):
+    flight_id: str
+    seat_stripes: int
+    economy_available: Optional[int] = None
+    premium_economy_available: Optional[int] = None
+    business_available: Optional[int] = None
+    first_available: Optional[int] = None
+
+
+class FlightCancellationResponse(BaseModel):
+    flight_id: str
+    status: str
+    bookings_cancelled: int
+    seats_returned: int
+
+
 class FlightStatusUpdate(BaseModel):
     status: Literal['scheduled', 'delayed', 'boarding', 'departed', 'in_air', 'landed', 'arrived', 'cancelled']
     delay_minutes: Optional[int] = None
@@ -1,11 +1,15 @@
+import asyncio
 import os
+import time
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 from app.database.init_db import get_supabase_client
+from app.services.principal_cache import principal_cache
 import logging
 
 
@@ -19,6 +23,20 @@ JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
+# Supabase access token verification: "local" checks signature and expiry in
+# process, "remote" asks Supabase Auth about every token
+AUTH_VERIFICATION = os.getenv("AUTH_VERIFICATION", "local").lower()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL") or (
+    f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None
+)
+JWKS_CACHE_TTL_SECONDS = int(os.getenv("JWKS_CACHE_TTL_SECONDS", "600"))
+# An unknown key id triggers a refetch, but no more often than this
+JWKS_MIN_REFRESH_SECONDS = 30
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -44,17 +62,186 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     }
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """
-    Validate the access token using Supabase and return the current user.
-    This is the correct way to validate a Supabase JWT from a secure backend.
-    """
-    credentials_exception = HTTPException(
+class SigningKeyUnavailable(Exception):
+    """The key a token was signed with cannot be resolved locally"""
+
+
+class JwksCache:
+    """The project's public signing keys, refetched after a TTL or when an unknown key id shows up"""
+
+    def __init__(
+        self,
+        url: Optional[str],
+        ttl_seconds: int = JWKS_CACHE_TTL_SECONDS,
+        fetch: Optional[Callable[[str], Awaitable[List[Dict[str, Any]]]]] = None,
+    ):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self._fetch = fetch or self._fetch_keys
+        self._keys: Dict[Optional[str], Dict[str, Any]] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.fetches = 0
+        self.failures = 0
+
+    @staticmethod
+    async def _fetch_keys(url: str) -> List[Dict[str, Any]]:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(url)
+            response.raise_for_status()
+            return response.json().get("keys", [])
+
+    def _age(self) -> float:
+        return float("inf") if self._fetched_at is None else time.monotonic() - self._fetched_at
+
+    async def get_key(self, kid: Optional[str]) -> Dict[str, Any]:
+        if kid in self._keys and self._age() < self.ttl_seconds:
+            self.hits += 1
+            return self._keys[kid]
+        if not self.url:
+            raise SigningKeyUnavailable("No JWKS URL is configured")
+        async with self._lock:
+            # Requests that waited on the lock find the keys the first one fetched
+            if self._age() >= self.ttl_seconds or (kid not in self._keys and self._age() >= JWKS_MIN_REFRESH_SECONDS):
+                await self._refresh()
+        if kid not in self._keys:
+            raise SigningKeyUnavailable(f"Unknown signing key {kid!r}")
+        return self._keys[kid]
+
+    async def _refresh(self):
+        try:
+            keys = await self._fetch(self.url)
+        except Exception as e:
+            # Keep serving the keys we have; try again after the minimum refresh interval
+            self.failures += 1
+            logger.warning(f"Could not fetch signing keys from {self.url}: {e}")
+            self._fetched_at = time.monotonic() - max(self.ttl_seconds - JWKS_MIN_REFRESH_SECONDS, 0)
+            return
+        self.fetches += 1
+        self._keys = {key.get("kid"): key for key in keys}
+        self._fetched_at = time.monotonic()
+
+    def clear(self):
+        self._keys = {}
+        self._fetched_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._keys),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# Process-wide signing key cache used by get_current_user
+jwks_cache = JwksCache(SUPABASE_JWKS_URL)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+
+def user_from_claims(claims: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The user dict Supabase would return, built from a verified token's claims
+
+    Fields only the auth server knows (created_at, confirmation timestamps,
+    identities) are not in the token; routes that need them use
+    get_current_user_remote.
+    """
+    return {
+        "id": claims["sub"],
+        "aud": claims.get("aud"),
+        "role": claims.get("role"),
+        "email": claims.get("email"),
+        "phone": claims.get("phone"),
+        "app_metadata": claims.get("app_metadata") or {},
+        "user_metadata": claims.get("user_metadata") or {},
+        "is_anonymous": claims.get("is_anonymous", False),
+    }
+
+
+async def verify_token_claims(token: str) -> Dict[str, Any]:
+    """
+    Check a Supabase access token's signature, expiry and audience in process
+    and return its claims
+
+    HS256 tokens are checked against SUPABASE_JWT_SECRET, asymmetric ones
+    against the cached JWKS. Raises PyJWTError for a bad token and
+    SigningKeyUnavailable when its key cannot be resolved here.
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    if algorithm == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            raise SigningKeyUnavailable("SUPABASE_JWT_SECRET is not set")
+        key = SUPABASE_JWT_SECRET
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        key = jwt.PyJWK(await jwks_cache.get_key(header.get("kid")), algorithm).key
+    else:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm {algorithm}")
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+async def verify_token_locally(token: str) -> Dict[str, Any]:
+    return user_from_claims(await verify_token_claims(token))
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    Validate the access token and return the current user.
+
+    With AUTH_VERIFICATION=local (the default) the token is verified in
+    process, without a round trip to Supabase Auth; a token whose signing key
+    cannot be resolved is checked remotely instead. A signed-out session stays
+    valid here until its token expires, so routes that must see revocations
+    depend on get_current_user_remote.
+
+    Locally verified principals are cached until the token expires.
+    """
+    if AUTH_VERIFICATION == "remote":
+        return await get_current_user_remote(token)
+    user = principal_cache.get(token, scope="services")
+    if user is not None:
+        return user
+    try:
+        claims = await verify_token_claims(token)
+    except SigningKeyUnavailable as e:
+        logger.warning(f"Cannot verify token locally ({e}); asking Supabase")
+        return await get_current_user_remote(token)
+    except jwt.PyJWTError as e:
+        logger.info(f"Rejected access token: {e}")
+        raise _credentials_exception()
+    user = user_from_claims(claims)
+    principal_cache.set(token, user, claims["exp"], scope="services")
+    return user
+
+
+async def get_current_user_remote(token: str = Depends(oauth2_scheme)):
+    """
+    Validate the access token using Supabase and return the current user.
+
+    Costs a round trip to Supabase Auth, but sees sessions revoked before
+    their token expires and returns the full user record.
+    """
+    return await verify_token_remotely(token)
+
+
+async def verify_token_remotely(token: str) -> Dict[str, Any]:
+    credentials_exception = _credentials_exception()
     supabase = get_supabase_client()
     try:
         logger.info("Attempting to validate token with Supabase...")
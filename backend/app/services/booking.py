@@ -1,144 +1,275 @@
+import base64
+import json
 import uuid
 import logging
-from typing import Dict, Any, List, Tuple
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import column as sql_column, func, insert, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import AsyncSessionLocal
 from app.database.init_db import get_supabase_client
+from app.models import Booking, BookingFlight, Flight, Passenger
+from app.models.base import model_to_dict
 from app.services.email import EmailNotificationService
+from app.services.reference_data import reference_data
+from app.services.booking_cache import booking_cache
+from app.services.booking_pipeline import BOOKING_PIPELINE_ENABLED, GroupCommitPipeline
+from app.services.booking_reference import booking_references
+from app.services import seat_holds, seat_inventory
+from app.services.seat_inventory import SeatRequest
 from fastapi import HTTPException, status
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-def generate_booking_reference() -> str:
+# Bookings per page when the client does not ask for a size
+DEFAULT_BOOKING_PAGE_SIZE = 50
+MAX_BOOKING_PAGE_SIZE = 200
+
+async def generate_booking_reference() -> str:
     """
     Generate a unique booking reference code
-    Format: SBJ-XXXXXX (where X is alphanumeric)
+    Format: SBJ-XXXXXXX (seven Crockford base32 characters)
     """
-    unique_id = uuid.uuid4().hex[:6].upper()
-    return f"SBJ-{unique_id}"
+    return await booking_references.allocate()
+
+
+def _as_date(value):
+    """Passenger dates arrive as ISO strings from the API schema"""
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def _booking_flight_rows(booking_id: uuid.UUID, booking_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "booking_id": booking_id,
+            "flight_id": uuid.UUID(str(flight_item["flight_id"])),
+            "is_return_flight": flight_item.get("is_return_flight", False),
+        }
+        for flight_item in booking_data.get("flights", [])
+    ]
 
 
-async def validate_flight_availability(flight_items: List[Dict[str, Any]]) -> Tuple[bool, str, List[Dict[str, Any]]]:
+def _passenger_rows(booking_id: uuid.UUID, booking_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "booking_id": booking_id,
+            "type": passenger["type"],
+            "first_name": passenger["first_name"],
+            "last_name": passenger["last_name"],
+            "date_of_birth": _as_date(passenger.get("date_of_birth")),
+            "passport_number": passenger.get("passport_number"),
+            "nationality": passenger.get("nationality"),
+            "cabin_class": passenger["cabin_class"],
+        }
+        for passenger in booking_data.get("passengers", [])
+    ]
+
+
+async def insert_booking_rows(
+    session: AsyncSession,
+    user_id: str,
+    booking_data: Dict[str, Any],
+    booking_reference: str,
+    hold_expires_at=None,
+) -> uuid.UUID:
     """
-    Validate seat availability for all flights in a booking (both outbound and return)
-    
-    Args:
-        flight_items: List of flight items with flight_id, cabin_class, num_passengers, and is_return_flight
-        
+    Insert the booking, its booking_flights and its passengers on the caller's session
+
+    The booking row is written with RETURNING to get its id; the child rows are
+    each sent as one bulk insert. With a hold deadline the booking stays
+    pending until it is paid for.
+    """
+    booking_id = (await session.execute(
+        insert(Booking)
+        .values(
+            user_id=uuid.UUID(str(user_id)),
+            booking_reference=booking_reference,
+            trip_type=booking_data.get("trip_type"),
+            total_amount=booking_data["total_amount"],
+            status="pending" if hold_expires_at is not None else "confirmed",
+            hold_expires_at=hold_expires_at,
+        )
+        .returning(Booking.id)
+    )).scalar_one()
+
+    booking_flights = _booking_flight_rows(booking_id, booking_data)
+    if booking_flights:
+        await session.execute(insert(BookingFlight), booking_flights)
+
+    passengers = _passenger_rows(booking_id, booking_data)
+    if passengers:
+        await session.execute(insert(Passenger), passengers)
+
+    return booking_id
+
+
+async def write_booking(
+    user_id: str,
+    booking_data: Dict[str, Any],
+    seat_requests: List[SeatRequest],
+    session_factory=AsyncSessionLocal,
+) -> str:
+    """
+    Take the seats and write the booking rows in a single transaction
+
+    Any failure rolls back the seat decrements together with the inserted rows,
+    so there is nothing to compensate for afterwards. The seats are held for
+    SEAT_HOLD_TTL_SECONDS until process_payment converts the hold.
+
     Returns:
-        Tuple containing:
-        - Boolean indicating if all flights have available seats
-        - Error message if any flight doesn't have enough seats
-        - List of flights that need to be updated if all validations pass
+        The new booking id
     """
-    supabase = get_supabase_client()
-    flights_to_update = []
-    
-    for flight_item in flight_items:
-        flight_id = flight_item["flight_id"]
-        cabin_class = flight_item["cabin_class"]
-        num_passengers = flight_item["num_passengers"]
-        is_return = flight_item.get("is_return_flight", False)
-        
-        # Determine which seat availability field to check based on cabin class
-        availability_field = f"{cabin_class.replace('-', '_')}_available"
-        
-        # Get current flight details
-        flight_response = supabase.table("flights").select(f"id, {availability_field}, flight_number").eq("id", flight_id).single().execute()
-        
-        if hasattr(flight_response, "error") or not flight_response.data:
-            return False, f"Flight with ID {flight_id} not found", []
-        
-        flight = flight_response.data
-        available_seats = flight.get(availability_field, 0)
-        
-        # Check if enough seats are available
-        if available_seats < num_passengers:
-            flight_type = "return" if is_return else "outbound"
-            return False, f"Not enough {cabin_class} seats available for {flight_type} flight {flight['flight_number']}. Available: {available_seats}, Requested: {num_passengers}", []
-        
-        # Add to list of flights to update
-        flights_to_update.append({
-            "flight_id": flight_id,
-            "cabin_class": cabin_class,
-            "num_passengers": num_passengers,
-            "is_return": is_return,
-            "available_seats": available_seats
-        })
-    
-    return True, "", flights_to_update
+    # Taken before any row is locked; it only reaches the database when a block runs out
+    booking_reference = await generate_booking_reference()
+    async with session_factory() as session:
+        async with session.begin():
+            reservations = await seat_inventory.reserve_seats(session, seat_requests)
+            booking_id = await insert_booking_rows(
+                session, user_id, booking_data, booking_reference, hold_expires_at=seat_holds.hold_deadline()
+            )
 
+    # Caches only hear about seats that were committed
+    seat_inventory.publish_seat_changes(reservations)
+    booking_cache.invalidate([booking_id])
+    for reservation in reservations:
+        logger.info(
+            f"Deducted {reservation.request.seats} {reservation.request.cabin_class} seats for flight "
+            f"{reservation.flight['id']}. New availability: {reservation.remaining}"
+        )
+    return str(booking_id)
 
-async def update_seat_availability(flights_to_update: List[Dict[str, Any]], deduct: bool = True) -> List[Dict[str, Any]]:
+
+class BookingWrite(NamedTuple):
+    """One booking waiting in the group-commit pipeline"""
+    user_id: str
+    booking_data: Dict[str, Any]
+    seat_requests: List[SeatRequest]
+    booking_reference: str
+
+
+def combine_seat_requests(requests: Iterable[SeatRequest]) -> List[SeatRequest]:
+    """Sum seat requests per flight and cabin so a batch takes each cabin's seats once"""
+    combined: Dict[Any, SeatRequest] = {}
+    for request in requests:
+        key = (str(request.flight_id), request.cabin_class)
+        if key in combined:
+            request = combined[key]._replace(seats=combined[key].seats + request.seats)
+        combined[key] = request
+    return list(combined.values())
+
+
+async def insert_booking_batch(
+    session: AsyncSession, writes: List[BookingWrite], hold_expires_at=None
+) -> List[uuid.UUID]:
     """
-    Update seat availability for multiple flights
-    
-    Args:
-        flights_to_update: List of flight details with flight_id, cabin_class, num_passengers, etc.
-        deduct: If True, deduct seats; if False, add seats back (for rollback)
-        
+    Insert several bookings with their flights and passengers: three statements for the whole batch
+
     Returns:
-        List of updated flights with their new availability counts
+        The new booking ids, in the order of `writes`
     """
-    supabase = get_supabase_client()
-    updated_flights = []
-    
-    for flight in flights_to_update:
-        flight_id = flight["flight_id"]
-        cabin_class = flight["cabin_class"]
-        num_passengers = flight["num_passengers"]
-        
-        # Determine which seat availability field to update
-        availability_field = f"{cabin_class.replace('-', '_')}_available"
-        
-        # Calculate new seat count
-        current_seats = flight["available_seats"]
-        new_seats = current_seats - num_passengers if deduct else current_seats + num_passengers
-        
-        # Ensure we don't go below zero or above capacity
-        new_seats = max(0, new_seats)
-        
-        # Update the flight
-        update_data = {availability_field: new_seats}
-        update_response = supabase.table("flights").update(update_data).eq("id", flight_id).execute()
-        
-        if hasattr(update_response, "error") or not update_response.data:
-            logger.error(f"Failed to update seat availability for flight {flight_id}: {getattr(update_response, 'error', 'Unknown error')}")
-            continue
-        
-        # Add to list of updated flights
-        updated_flight = flight.copy()
-        updated_flight["new_available_seats"] = new_seats
-        updated_flights.append(updated_flight)
-        
-        action = "Deducted" if deduct else "Restored"
-        logger.info(f"{action} {num_passengers} {cabin_class} seats for flight {flight_id}. New availability: {new_seats}")
-    
-    return updated_flights
+    result = await session.execute(
+        insert(Booking)
+        .values([
+            {
+                "user_id": uuid.UUID(str(write.user_id)),
+                "booking_reference": write.booking_reference,
+                "trip_type": write.booking_data.get("trip_type"),
+                "total_amount": write.booking_data["total_amount"],
+                "status": "pending" if hold_expires_at is not None else "confirmed",
+                "hold_expires_at": hold_expires_at,
+            }
+            for write in writes
+        ])
+        .returning(Booking.id, Booking.booking_reference)
+    )
+    ids_by_reference = {reference: booking_id for booking_id, reference in result.all()}
+    booking_ids = [ids_by_reference[write.booking_reference] for write in writes]
 
+    booking_flights, passengers = [], []
+    for booking_id, write in zip(booking_ids, writes):
+        booking_flights += _booking_flight_rows(booking_id, write.booking_data)
+        passengers += _passenger_rows(booking_id, write.booking_data)
+    if booking_flights:
+        await session.execute(insert(BookingFlight), booking_flights)
+    if passengers:
+        await session.execute(insert(Passenger), passengers)
+    return booking_ids
 
-async def rollback_seat_deductions(flights_updated: List[Dict[str, Any]]):
+
+async def write_booking_batch(writes: List[BookingWrite], session_factory=AsyncSessionLocal) -> List[Any]:
     """
-    Rollback seat deductions in case of booking failure
-    
-    Args:
-        flights_updated: List of flights that had seats deducted
+    Commit a batch of bookings in one transaction
+
+    The seats of the whole batch are taken with one decrement per flight and
+    cabin. If that comes up short, bookings take their seats one at a time in
+    arrival order, each in a savepoint, so only the ones that do not fit fail.
+
+    Returns:
+        For each write, in order, the new booking id or the HTTPException it failed with
     """
-    if not flights_updated:
-        return
-        
-    try:
-        await update_seat_availability(flights_updated, deduct=False)
-        logger.info(f"Successfully rolled back seat deductions for {len(flights_updated)} flights")
-    except Exception as e:
-        logger.error(f"Failed to rollback seat deductions: {e}", exc_info=True)
+    outcomes: List[Any] = [None] * len(writes)
+    async with session_factory() as session:
+        async with session.begin():
+            try:
+                async with session.begin_nested():
+                    reservations = await seat_inventory.reserve_seats(
+                        session, combine_seat_requests(request for write in writes for request in write.seat_requests)
+                    )
+                accepted = list(range(len(writes)))
+            except HTTPException:
+                reservations, accepted = [], []
+                for index, write in enumerate(writes):
+                    try:
+                        async with session.begin_nested():
+                            reservations += await seat_inventory.reserve_seats(session, write.seat_requests)
+                        accepted.append(index)
+                    except HTTPException as e:
+                        outcomes[index] = e
 
-async def create_booking(user_id: str, booking_data: Dict[str, Any]) -> Dict[str, Any]:
+            if accepted:
+                booking_ids = await insert_booking_batch(
+                    session, [writes[index] for index in accepted], hold_expires_at=seat_holds.hold_deadline()
+                )
+                for index, booking_id in zip(accepted, booking_ids):
+                    outcomes[index] = str(booking_id)
+
+    seat_inventory.publish_seat_changes(reservations)
+    booking_cache.invalidate(outcome for outcome in outcomes if isinstance(outcome, str))
+    logger.info(f"Committed {len(accepted)} of {len(writes)} bookings in one batch")
+    return outcomes
+
+
+async def cancel_abandoned_booking(write: BookingWrite, booking_id: str):
+    """Cancel a pipelined booking whose request went away while its batch was committed"""
+    logger.warning(f"Booking {booking_id} was committed after its request went away; cancelling it")
+    await seat_holds.cancel_booking(booking_id)
+
+
+# Queues bookings per outbound flight when BOOKING_PIPELINE_ENABLED is set
+booking_pipeline = GroupCommitPipeline(write_booking_batch, abandon=cancel_abandoned_booking)
+
+
+async def submit_booking(user_id: str, booking_data: Dict[str, Any], seat_requests: List[SeatRequest]) -> str:
+    """Write a booking through the group-commit pipeline and return its id"""
+    write = BookingWrite(user_id, booking_data, seat_requests, await generate_booking_reference())
+    return await booking_pipeline.submit(str(seat_requests[0].flight_id), write)
+
+
+async def place_booking(user_id: str, booking_data: Dict[str, Any], pipeline: Optional[bool] = None) -> str:
     """
-    Create a new booking with flight associations and passengers
+    Validate a booking, take its seats and write its rows; returns the new booking id
+
+    This is the transactional half of create_booking, without the read-back
+    and the confirmation email. `pipeline` overrides BOOKING_PIPELINE_ENABLED.
     """
-    supabase = get_supabase_client()
-    updated_flights = []
-    
+    if pipeline is None:
+        pipeline = BOOKING_PIPELINE_ENABLED
     try:
         # Validate trip type and prepare flight items for validation
         trip_type = booking_data.get("trip_type")
@@ -164,115 +295,48 @@ async def create_booking(user_id: str, booking_data: Dict[str, Any]) -> Dict[str
                 detail="Booking must have at least one passenger"
             )
             
-        # Extract cabin class from passengers (assuming all passengers have the same cabin class)
-        cabin_class = None
-        if booking_data.get("passengers") and len(booking_data["passengers"]) > 0:
-            cabin_class = booking_data["passengers"][0].get("cabin_class")
-            if not cabin_class:
+        # Count seats per cabin class so cancellations can return exactly what was taken
+        seats_by_cabin = Counter()
+        for passenger in booking_data["passengers"]:
+            if not passenger.get("cabin_class"):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Cabin class must be specified for at least one passenger"
+                    detail="Cabin class must be specified for every passenger"
                 )
+            seats_by_cabin[passenger["cabin_class"]] += 1
         
-        # Add passenger count and cabin class to each flight item
-        for flight_item in flight_items:
-            flight_item["num_passengers"] = passenger_count
-            flight_item["cabin_class"] = cabin_class
-        
-        # Validate seat availability for all flights
-        is_valid, error_message, flights_to_update = await validate_flight_availability(flight_items)
-        if not is_valid:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=error_message
+        seat_requests = [
+            SeatRequest(
+                flight_id=flight_item["flight_id"],
+                cabin_class=cabin_class,
+                seats=seats,
+                is_return=flight_item.get("is_return_flight", False),
             )
+            for flight_item in flight_items
+            for cabin_class, seats in seats_by_cabin.items()
+        ]
         
-        # Update seat availability for all flights
-        updated_flights = await update_seat_availability(flights_to_update)
-        
-        # Generate booking reference
-        booking_reference = generate_booking_reference()
-        
-        # Create booking record
-        booking = {
-            "user_id": user_id,
-            "booking_reference": booking_reference,
-            "trip_type": trip_type,
-            "total_amount": booking_data["total_amount"],
-            "status": "confirmed"
-        }
-        
-        # Insert booking into database
-        booking_response = supabase.table("bookings").insert(booking).execute()
-        
-        if hasattr(booking_response, "error") and booking_response.error:
-            # Rollback seat deductions if booking creation fails
-            await rollback_seat_deductions(updated_flights)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to create booking: {booking_response.error}"
-            )
-        
-        booking_id = booking_response.data[0]["id"]
-        
-        # Create booking-flight relationships
-        booking_flights = []
-        for flight_item in flight_items:
-            booking_flights.append({
-                "booking_id": booking_id,
-                "flight_id": flight_item["flight_id"],
-                "is_return_flight": flight_item.get("is_return_flight", False)
-            })
-        
-        if booking_flights:
-            flight_response = supabase.table("booking_flights").insert(booking_flights).execute()
-            
-            if hasattr(flight_response, "error") and flight_response.error:
-                # Rollback booking and seat deductions if flight association fails
-                supabase.table("bookings").delete().eq("id", booking_id).execute()
-                await rollback_seat_deductions(updated_flights)
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Failed to associate flights with booking: {flight_response.error}"
-                )
-        
-        # Create passengers
-        passengers = []
-        for passenger in booking_data.get("passengers", []):
-            passengers.append({
-                "booking_id": booking_id,
-                "type": passenger["type"],
-                "first_name": passenger["first_name"],
-                "last_name": passenger["last_name"],
-                "date_of_birth": passenger["date_of_birth"],
-                "passport_number": passenger.get("passport_number"),
-                "nationality": passenger.get("nationality"),
-                "cabin_class": passenger["cabin_class"]
-            })
-        
-        if passengers:
-            passenger_response = supabase.table("passengers").insert(passengers).execute()
-            
-            if hasattr(passenger_response, "error") and passenger_response.error:
-                # Rollback booking, flights, and seat deductions if passenger creation fails
-                supabase.table("booking_flights").delete().eq("booking_id", booking_id).execute()
-                supabase.table("bookings").delete().eq("id", booking_id).execute()
-                await rollback_seat_deductions(updated_flights)
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Failed to create passengers: {passenger_response.error}"
-                )
+        # Seats, booking, booking flights and passengers commit together or not at all
+        if pipeline:
+            return await submit_booking(user_id, booking_data, seat_requests)
+        return await write_booking(user_id, booking_data, seat_requests)
     except HTTPException as e:
         # Re-raise HTTP exceptions
         raise e
     except Exception as e:
-        # Rollback seat deductions for any other exceptions
-        await rollback_seat_deductions(updated_flights)
         logger.error(f"Unexpected error during booking creation: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected error occurred: {str(e)}"
         )
+
+
+async def create_booking(user_id: str, booking_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create a new booking with flight associations and passengers
+    """
+    supabase = get_supabase_client()
+    booking_id = await place_booking(user_id, booking_data)
     
     # Get complete booking details, ensuring it matches the user who created it
     booking_details = await get_booking_details_by_id(booking_id, user_id=user_id)
@@ -296,74 +360,277 @@ async def create_booking(user_id: str, booking_data: Dict[str, Any]) -> Dict[str
     
     return booking_details
 
-async def get_all_booking_details_for_user(user_id: str) -> List[Dict[str, Any]]:
+async def attach_flight_reference_data(booking_flights: List[Dict[str, Any]]):
+    """Attach airline and airport records to the flight nested in each booking_flights row"""
+    flights = [bf["flight"] for bf in booking_flights if bf.get("flight")]
+    if not flights:
+        return
+    await reference_data.ensure_loaded()
+    await reference_data.refresh_missing(flights)
+    for flight in flights:
+        reference_data.attach(flight)
+
+
+def _passenger_document(passenger: Passenger) -> Dict[str, Any]:
+    document = model_to_dict(passenger)
+    # The API has always returned dates of birth as ISO strings
+    if isinstance(document.get("date_of_birth"), date):
+        document["date_of_birth"] = document["date_of_birth"].isoformat()
+    return document
+
+
+async def load_booking_documents(session: AsyncSession, bookings: List[Booking]) -> List[Dict[str, Any]]:
     """
-    Get all booking details for a specific user, including flights and passengers.
+    Turn bookings into booking documents with their flights and passengers
+
+    Flights and passengers for all bookings are fetched with one query each,
+    and airline and airport records come from the reference data registry, so
+    the number of queries does not grow with the number of bookings.
     """
-    supabase = get_supabase_client()
+    documents = {}
+    for booking in bookings:
+        document = model_to_dict(booking)
+        document["flights"] = []
+        document["passengers"] = []
+        documents[booking.id] = document
+    if not documents:
+        return []
 
-    # 1. Get all booking IDs for the user
-    bookings_response = supabase.table("bookings").select("id").eq("user_id", user_id).order("created_at", desc=True).execute()
-    if hasattr(bookings_response, "error") and bookings_response.error:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to retrieve bookings: {bookings_response.error}")
+    booking_ids = list(documents)
+    flight_rows = await session.execute(
+        select(BookingFlight, Flight)
+        .join(Flight, Flight.id == BookingFlight.flight_id)
+        .where(BookingFlight.booking_id.in_(booking_ids))
+        .order_by(BookingFlight.booking_id, BookingFlight.is_return_flight)
+    )
+    for booking_flight, flight in flight_rows.all():
+        booking_flight_document = model_to_dict(booking_flight)
+        booking_flight_document["flight"] = model_to_dict(flight)
+        documents[booking_flight.booking_id]["flights"].append(booking_flight_document)
 
-    user_bookings = bookings_response.data
-    if not user_bookings:
-        return []
+    passengers = await session.execute(
+        select(Passenger)
+        .where(Passenger.booking_id.in_(booking_ids))
+        .order_by(Passenger.booking_id, Passenger.created_at)
+    )
+    for passenger in passengers.scalars().all():
+        documents[passenger.booking_id]["passengers"].append(_passenger_document(passenger))
+
+    await attach_flight_reference_data([bf for document in documents.values() for bf in document["flights"]])
+    return [documents[booking.id] for booking in bookings]
+
+
+class BookingPage(NamedTuple):
+    """One keyset page of a user's bookings, newest first"""
+    bookings: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+def encode_booking_cursor(created_at: datetime, booking_id) -> str:
+    """Encode a (created_at, id) keyset position as an opaque URL-safe cursor"""
+    payload = {"after": [created_at.isoformat(), str(booking_id)]}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_booking_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        created_at, booking_id = payload["after"]
+        return datetime.fromisoformat(created_at), uuid.UUID(booking_id)
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid bookings cursor")
+
+
+def user_bookings_query(
+    user_id: str,
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = None,
+    when: Optional[str] = None,
+    trip_type: Optional[str] = None,
+):
+    """
+    Select a user's bookings newest first, ordered by (created_at, id) so the
+    ix_bookings_user_id_created_at index serves both the filter and the sort
+    """
+    query = select(Booking).where(Booking.user_id == uuid.UUID(str(user_id)))
+    if cursor:
+        created_at, booking_id = decode_booking_cursor(cursor)
+        query = query.where(tuple_(Booking.created_at, Booking.id) < tuple_(created_at, booking_id))
+    if status_filter:
+        query = query.where(Booking.status == status_filter)
+    if trip_type:
+        query = query.where(Booking.trip_type == trip_type)
+    if when:
+        # A booking is upcoming while any of its flights has yet to depart
+        departs_later = (
+            select(BookingFlight.id)
+            .join(Flight, Flight.id == BookingFlight.flight_id)
+            .where(BookingFlight.booking_id == Booking.id, Flight.departure_time > func.now())
+            .exists()
+        )
+        query = query.where(departs_later if when == "upcoming" else ~departs_later)
+    return query.order_by(Booking.created_at.desc(), Booking.id.desc())
 
-    # 2. Fetch detailed information for each booking
-    detailed_bookings = []
-    for b in user_bookings:
-        try:
-            # Pass user_id to ensure we only fetch details for the user's own bookings
-            booking_details = await get_booking_details_by_id(b['id'], user_id=user_id)
-            detailed_bookings.append(booking_details)
-        except HTTPException:
-            # If a single booking fails, we can choose to skip it or log it.
-            # For now, we'll skip it to not fail the entire request.
-            continue
-            
-    return detailed_bookings
 
+async def list_user_bookings(
+    user_id: str,
+    limit: int = DEFAULT_BOOKING_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = None,
+    when: Optional[str] = None,
+    trip_type: Optional[str] = None,
+    details: bool = True,
+    session_factory=AsyncSessionLocal,
+) -> BookingPage:
+    """
+    Get one page of a user's bookings
 
-async def get_booking_details_by_id(booking_id: str, user_id: str = None) -> Dict[str, Any]:
+    With `details` each booking carries its flights and passengers (loaded
+    in batch); without, only the booking rows are returned.
+    """
+    query = user_bookings_query(user_id, cursor, status_filter, when, trip_type).limit(limit + 1)
+    async with session_factory() as session:
+        bookings = list((await session.execute(query)).scalars().all())
+        next_cursor = None
+        if len(bookings) > limit:
+            bookings = bookings[:limit]
+            next_cursor = encode_booking_cursor(bookings[-1].created_at, bookings[-1].id)
+        if details:
+            documents = await load_booking_documents(session, bookings)
+        else:
+            documents = [model_to_dict(booking) for booking in bookings]
+    return BookingPage(documents, next_cursor)
+
+
+async def get_booking_details_by_id(
+    booking_id: str, user_id: str = None, session_factory=AsyncSessionLocal
+) -> Dict[str, Any]:
     """
     Get detailed information about a specific booking including flights and passengers.
     If user_id is provided, it also ensures the booking belongs to that user.
     """
-    supabase = get_supabase_client()
-    
-    # Base query for getting a booking
-    query = supabase.table("bookings").select("*").eq("id", booking_id)
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Booking with ID {booking_id} not found"
+    )
+    try:
+        query = select(Booking).where(Booking.id == uuid.UUID(str(booking_id)))
+        # If a user_id is provided, add it to the query to enforce ownership
+        if user_id:
+            query = query.where(Booking.user_id == uuid.UUID(str(user_id)))
+    except ValueError:
+        raise not_found
 
-    # If a user_id is provided, add it to the query to enforce ownership
-    if user_id:
-        query = query.eq("user_id", user_id)
+    cached = booking_cache.get(booking_id)
+    if cached is not None:
+        if user_id and cached["user_id"] != str(user_id):
+            raise not_found
+        return cached
 
-    booking_response = query.single().execute()
-    
-    if hasattr(booking_response, "error") and booking_response.error:
+    generation = booking_cache.generation()
+    async with session_factory() as session:
+        booking = (await session.execute(query)).scalar_one_or_none()
+        if booking is None:
+            raise not_found
+        document = (await load_booking_documents(session, [booking]))[0]
+    booking_cache.set(document, generation)
+    return document
+
+
+def passenger_update_statements(booking_id: uuid.UUID, passenger_updates: List[Dict[str, Any]]):
+    """
+    Set-based UPDATE ... FROM (VALUES ...) statements for passenger edits
+
+    Passengers changing the same set of fields share one statement, so an
+    edit that touches the same fields for the whole party is one round trip.
+    Passengers that are not on the booking are left alone.
+    """
+    groups = defaultdict(list)
+    for passenger_update in passenger_updates:
+        fields = tuple(sorted(field for field in passenger_update if field != "id"))
+        if not fields:
+            continue
+        try:
+            row = [uuid.UUID(str(passenger_update["id"]))]
+            row += [
+                _as_date(passenger_update[field]) if field == "date_of_birth" else passenger_update[field]
+                for field in fields
+            ]
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid update for passenger {passenger_update['id']}"
+            )
+        groups[fields].append(tuple(row))
+
+    statements = []
+    for fields, rows in sorted(groups.items()):
+        changes = values(
+            sql_column("id", UUID(as_uuid=True)),
+            *[sql_column(field, Passenger.__table__.c[field].type) for field in fields],
+            name="passenger_changes",
+        ).data(rows)
+        statements.append(
+            update(Passenger)
+            .where(Passenger.id == changes.c.id, Passenger.booking_id == booking_id)
+            .values({field: changes.c[field] for field in fields})
+            .execution_options(synchronize_session=False)
+        )
+    return statements
+
+
+async def update_booking_details(
+    booking_id: str,
+    user_id: str,
+    changes: Dict[str, Any],
+    session_factory=AsyncSessionLocal,
+) -> Dict[str, Any]:
+    """
+    Apply a status change and passenger edits to a user's booking in one transaction
+
+    Cancelling returns the booking's seats in the same transaction. It is the
+    only status change allowed: confirmation happens when the seat hold is
+    paid for (seat_holds.convert_hold).
+
+    Returns:
+        The updated booking document
+    """
+    new_status = changes.get("status")
+    if new_status not in (None, "cancelled"):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Booking with ID {booking_id} not found"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Only cancellation can be requested; bookings are confirmed by payment"
         )
-    
-    booking = booking_response.data
-    
-    # Get booking flights with details
-    flights_response = supabase.table("booking_flights") \
-        .select("*, flight:flights(*, airline:airlines(*), origin_airport:airports!origin_airport_id(*), destination_airport:airports!destination_airport_id(*))") \
-        .eq("booking_id", booking_id) \
-        .execute()
-    
-    # Get passengers
-    passengers_response = supabase.table("passengers") \
-        .select("*") \
-        .eq("booking_id", booking_id) \
-        .execute()
-    
-    # Combine all data
-    booking["flights"] = flights_response.data if not hasattr(flights_response, "error") else []
-    booking["passengers"] = passengers_response.data if not hasattr(passengers_response, "error") else []
-    
-    return booking
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Booking with ID {booking_id} not found or does not belong to you"
+    )
+    try:
+        query = (
+            select(Booking)
+            .where(Booking.id == uuid.UUID(str(booking_id)), Booking.user_id == uuid.UUID(str(user_id)))
+            .with_for_update()
+        )
+    except ValueError:
+        raise not_found
+
+    released = []
+    async with session_factory() as session:
+        async with session.begin():
+            booking = (await session.execute(query)).scalar_one_or_none()
+            if booking is None:
+                raise not_found
+
+            if new_status == "cancelled":
+                _, released = await seat_holds.cancel_bookings(session, Booking.id == booking.id)
+                set_committed_value(booking, "status", "cancelled")
+                set_committed_value(booking, "hold_expires_at", None)
+
+            for statement in passenger_update_statements(booking.id, changes.get("passengers") or []):
+                await session.execute(statement)
+
+            document = (await load_booking_documents(session, [booking]))[0]
+
+    booking_cache.invalidate([booking_id])
+    seat_inventory.publish_seat_changes(released)
+    return document
@@ -0,0 +1,176 @@
+"""
+Read-through cache for booking documents.
+
+`get_booking_details_by_id` assembles a booking with its flights and
+passengers from three queries; the result is kept here keyed by booking id,
+with an LRU bound on the approximate serialized size of the cached documents.
+
+Writers invalidate the booking after their transaction commits: booking
+creation, updates, cancellation (including expired holds) and hold
+conversion on payment. Flight status changes arrive through
+inventory_events and drop every cached booking on that flight. Seat count
+changes are ignored, since a booking document's own seats never change
+with them.
+
+A reader takes a `generation()` before querying and passes it to `set`; if
+any invalidation happened in between, the possibly stale document is not
+stored.
+"""
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from app.services import inventory_events
+from app.services.inventory_events import FlightChange
+
+logger = logging.getLogger(__name__)
+
+BOOKING_CACHE_MAX_BYTES = int(os.getenv("BOOKING_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+BOOKING_CACHE_TTL_SECONDS = float(os.getenv("BOOKING_CACHE_TTL_SECONDS", "300"))
+
+
+def document_size(document: Dict[str, Any]) -> int:
+    """Approximate memory cost of a document, measured as its JSON length"""
+    return len(json.dumps(document, default=str))
+
+
+class BookingDocumentCache:
+    """Memory-bounded, TTL-limited cache of booking documents"""
+
+    def __init__(self, max_bytes: int = BOOKING_CACHE_MAX_BYTES, ttl_seconds: float = BOOKING_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any], int]]" = OrderedDict()
+        self._bookings_by_flight: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    def get(self, booking_id: Hashable) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached document, or None on a miss"""
+        booking_id = str(booking_id)
+        with self._lock:
+            entry = self._entries.get(booking_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, document, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(booking_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(booking_id)
+            self.hits += 1
+        # Callers decorate documents for emails and responses
+        return copy.deepcopy(document)
+
+    def generation(self) -> int:
+        """Invalidation counter to read before loading a document from the database"""
+        return self._generation
+
+    def set(self, document: Dict[str, Any], generation: Optional[int] = None):
+        """Store a booking document, evicting the least recently used ones past the byte budget"""
+        if not self.enabled:
+            return
+        size = document_size(document)
+        if size > self.max_bytes:
+            return
+        booking_id = str(document["id"])
+        document = copy.deepcopy(document)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if booking_id in self._entries:
+                self._remove(booking_id)
+            self._entries[booking_id] = (time.monotonic() + self.ttl_seconds, document, size)
+            self._bytes += size
+            for flight_id in self._flight_ids(document):
+                self._bookings_by_flight.setdefault(flight_id, set()).add(booking_id)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    @staticmethod
+    def _flight_ids(document: Dict[str, Any]) -> Set[str]:
+        return {str(leg["flight_id"]) for leg in document.get("flights") or [] if leg.get("flight_id")}
+
+    def _remove(self, booking_id: str):
+        _, document, size = self._entries.pop(booking_id)
+        self._bytes -= size
+        for flight_id in self._flight_ids(document):
+            bookings = self._bookings_by_flight.get(flight_id)
+            if bookings is not None:
+                bookings.discard(booking_id)
+                if not bookings:
+                    del self._bookings_by_flight[flight_id]
+
+    def invalidate(self, booking_ids: Iterable[Hashable]) -> int:
+        """Drop the given bookings; returns the number that were cached"""
+        dropped = 0
+        with self._lock:
+            self._generation += 1
+            for booking_id in {str(booking_id) for booking_id in booking_ids}:
+                if booking_id in self._entries:
+                    self._remove(booking_id)
+                    dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def invalidate_flight(self, flight_id: Hashable) -> int:
+        """Drop every cached booking that includes the flight"""
+        with self._lock:
+            booking_ids = set(self._bookings_by_flight.get(str(flight_id), set()))
+        dropped = self.invalidate(booking_ids)
+        if dropped:
+            logger.debug(f"Invalidated {dropped} cached bookings for flight {flight_id}")
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bookings_by_flight.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# Process-wide cache used by the booking service
+booking_cache = BookingDocumentCache()
+
+
+def _on_flight_change(change: FlightChange):
+    if change.status is not None:
+        booking_cache.invalidate_flight(change.flight_id)
+
+
+inventory_events.subscribe(_on_flight_change)
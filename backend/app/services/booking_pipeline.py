@@ -0,0 +1,157 @@
+"""
+Group commit for bursts of bookings.
+
+With BOOKING_PIPELINE_ENABLED, `create_booking` does not open a transaction
+per request. Requests are queued per (outbound) flight instead, and a
+batcher per flight waits up to BOOKING_PIPELINE_MAX_WAIT_MS for up to
+BOOKING_PIPELINE_MAX_BATCH of them. It then hands the whole batch to a
+writer that commits them in one transaction, and resolves each request's
+future with its own result or error. A few milliseconds of latency buy one
+commit, and one seat decrement per cabin, for a whole batch.
+
+A request that goes away (client disconnect, timeout) cancels its future.
+If that happens while it is queued, the item is dropped before the batch is
+written; if it happens during the write, the item's result is handed to the
+pipeline's `abandon` callback so the caller can undo what was committed.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BOOKING_PIPELINE_ENABLED = os.getenv("BOOKING_PIPELINE_ENABLED", "false").lower() == "true"
+BOOKING_PIPELINE_MAX_BATCH = int(os.getenv("BOOKING_PIPELINE_MAX_BATCH", "64"))
+BOOKING_PIPELINE_MAX_WAIT_MS = float(os.getenv("BOOKING_PIPELINE_MAX_WAIT_MS", "5"))
+
+# Receives a batch of items and returns, in the same order, a result or an exception for each
+BatchWriter = Callable[[List[Any]], Awaitable[List[Any]]]
+# Receives an item written for a request that went away, and the result it was written with
+AbandonHandler = Callable[[Any, Any], Awaitable[None]]
+
+
+def _fail(entries: List[Tuple[Any, asyncio.Future]]):
+    for _, future in entries:
+        if not future.done():
+            future.set_exception(RuntimeError("Booking pipeline stopped"))
+
+
+class GroupCommitPipeline:
+    """Per-key queues drained in batches by one batcher task per busy key"""
+
+    def __init__(
+        self,
+        writer: BatchWriter,
+        max_batch: int = BOOKING_PIPELINE_MAX_BATCH,
+        max_wait_ms: float = BOOKING_PIPELINE_MAX_WAIT_MS,
+        abandon: Optional[AbandonHandler] = None,
+    ):
+        self._writer = writer
+        self._abandon = abandon
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queues: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._full: Dict[Hashable, asyncio.Event] = {}
+        self._batchers: Dict[Hashable, asyncio.Task] = {}
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.dropped = 0
+        self.abandoned = 0
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """Queue an item behind `key` and wait for its own result"""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(key, [])
+        queue.append((item, future))
+        if len(queue) >= self.max_batch and key in self._full:
+            self._full[key].set()
+        if key not in self._batchers:
+            self._full[key] = asyncio.Event()
+            self._batchers[key] = asyncio.create_task(self._drain(key))
+        return await future
+
+    async def _drain(self, key: Hashable):
+        queue = self._queues[key]
+        full = self._full[key]
+        try:
+            while queue:
+                if len(queue) < self.max_batch and self.max_wait:
+                    # Give the rest of the burst a moment to join this batch
+                    try:
+                        await asyncio.wait_for(full.wait(), self.max_wait)
+                    except asyncio.TimeoutError:
+                        pass
+                full.clear()
+                # Requests that went away while queued never reach the writer
+                live = [entry for entry in queue if not entry[1].done()]
+                self.dropped += len(queue) - len(live)
+                queue[:] = live
+                batch = queue[:self.max_batch]
+                del queue[:self.max_batch]
+                if batch:
+                    await self._flush(batch)
+        finally:
+            # No await between the empty check and here, so nothing can be left behind
+            del self._batchers[key]
+            del self._full[key]
+            del self._queues[key]
+            _fail(queue)
+
+    async def _flush(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            outcomes = await self._writer([item for item, _ in batch])
+        except asyncio.CancelledError:
+            _fail(batch)
+            raise
+        except Exception as e:
+            logger.error(f"Booking batch of {len(batch)} failed: {e}", exc_info=True)
+            outcomes = [e] * len(batch)
+        for (item, future), outcome in zip(batch, outcomes):
+            if future.done():
+                # The request went away while its batch was being written
+                if not isinstance(outcome, BaseException):
+                    await self._release(item, outcome)
+                continue
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def _release(self, item: Any, outcome: Any):
+        self.abandoned += 1
+        if self._abandon is None:
+            return
+        try:
+            await self._abandon(item, outcome)
+        except Exception as e:
+            logger.error(f"Could not undo abandoned pipeline write {outcome!r}: {e}", exc_info=True)
+
+    async def stop(self):
+        """Cancel the batchers; requests still queued fail"""
+        tasks = list(self._batchers.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "busy_keys": len(self._batchers),
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "dropped": self.dropped,
+            "abandoned": self.abandoned,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
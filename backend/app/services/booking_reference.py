@@ -0,0 +1,190 @@
+"""
+Collision-free booking references.
+
+Each worker leases a block of ids from the `booking_reference_seq` database
+sequence (the sequence's increment is the block size) and hands them out from
+memory, leasing the next block in the background before the current one runs
+out. Ids are unique across workers, so a reference can never collide and
+inserting it never needs a retry.
+
+An id is turned into a reference by a keyed Feistel permutation over 36 bits
+(cycle-walked into the 35-bit space of seven characters) and written in
+Crockford base32, which has no I, L, O or U. Consecutive ids give unrelated
+looking references, and `decode_reference` maps a reference back to its id.
+New references have seven characters, so they can never clash with the
+six-character random references issued before.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+from app.database.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_PREFIX = "SBJ-"
+REFERENCE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+REFERENCE_LENGTH = 7
+REFERENCE_SPACE = len(REFERENCE_ALPHABET) ** REFERENCE_LENGTH  # 2**35
+
+# Never change these: references already issued are decoded with them
+_HALF_BITS = 18
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+_PERMUTATION_KEY = b"skybound-booking-reference-v1"
+
+# Lease the next block once fewer than this share of the current one is left
+REFILL_THRESHOLD = 0.25
+
+
+def _round(value: int, round_number: int) -> int:
+    digest = hashlib.blake2b(
+        value.to_bytes(3, "big"), digest_size=3, key=_PERMUTATION_KEY, salt=bytes([round_number]) * 16
+    ).digest()
+    return int.from_bytes(digest, "big") & _HALF_MASK
+
+
+def _feistel(value: int) -> int:
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_number in range(_ROUNDS):
+        left, right = right, left ^ _round(right, round_number)
+    return (left << _HALF_BITS) | right
+
+
+def _feistel_inverse(value: int) -> int:
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_number in reversed(range(_ROUNDS)):
+        left, right = right ^ _round(left, round_number), left
+    return (left << _HALF_BITS) | right
+
+
+def permute(booking_number: int) -> int:
+    """Bijection on [0, REFERENCE_SPACE): walk the 36-bit permutation until it lands inside"""
+    if not 0 <= booking_number < REFERENCE_SPACE:
+        raise ValueError(f"Booking number {booking_number} is out of range")
+    value = _feistel(booking_number)
+    while value >= REFERENCE_SPACE:
+        value = _feistel(value)
+    return value
+
+
+def unpermute(value: int) -> int:
+    value = _feistel_inverse(value)
+    while value >= REFERENCE_SPACE:
+        value = _feistel_inverse(value)
+    return value
+
+
+def encode_reference(booking_number: int) -> str:
+    value = permute(booking_number)
+    characters = []
+    for _ in range(REFERENCE_LENGTH):
+        value, digit = divmod(value, len(REFERENCE_ALPHABET))
+        characters.append(REFERENCE_ALPHABET[digit])
+    return REFERENCE_PREFIX + "".join(reversed(characters))
+
+
+def decode_reference(reference: str) -> int:
+    """Booking number behind a reference; lenient about case and look-alike characters"""
+    code = reference.upper()
+    if code.startswith(REFERENCE_PREFIX):
+        code = code[len(REFERENCE_PREFIX):]
+    code = code.replace("O", "0").replace("I", "1").replace("L", "1")
+    if len(code) != REFERENCE_LENGTH:
+        raise ValueError(f"Invalid booking reference {reference!r}")
+    value = 0
+    for character in code:
+        digit = REFERENCE_ALPHABET.find(character)
+        if digit < 0:
+            raise ValueError(f"Invalid booking reference {reference!r}")
+        value = value * len(REFERENCE_ALPHABET) + digit
+    return unpermute(value)
+
+
+class BookingReferenceAllocator:
+    """Hands out references from sequence blocks leased by this worker"""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._next = 0
+        self._end = 0
+        self._block_size = 0
+        self._spare: Optional[Tuple[int, int]] = None
+        self._lease_lock = asyncio.Lock()
+        self._refill_task: Optional[asyncio.Task] = None
+        self.leases = 0
+
+    async def _lease(self) -> Tuple[int, int]:
+        """Reserve the next block of ids: one round trip for a whole block"""
+        async with self._session_factory() as session:
+            row = (await session.execute(text(
+                "SELECT nextval('booking_reference_seq'), "
+                "(SELECT increment_by FROM pg_sequences WHERE sequencename = 'booking_reference_seq')"
+            ))).one()
+        start, block_size = int(row[0]), int(row[1])
+        self.leases += 1
+        logger.debug(f"Leased booking numbers {start}-{start + block_size - 1}")
+        return start, start + block_size
+
+    async def _refill(self, exhausted: bool = False):
+        async with self._lease_lock:
+            # Callers that queued behind a lease for an exhausted block may find one installed by now
+            if self._spare is None and not (exhausted and self._next < self._end):
+                self._spare = await self._lease()
+
+    def _refill_in_background(self):
+        if self._spare is None and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+            self._refill_task.add_done_callback(self._log_refill_failure)
+
+    @staticmethod
+    def _log_refill_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Could not lease booking numbers ahead of time: {task.exception()}")
+
+    async def next_number(self) -> int:
+        """Next booking number; only waits on the database if no block is in hand"""
+        while self._next >= self._end:
+            if self._spare is None:
+                await self._refill(exhausted=True)
+            # Only install the spare if no other caller installed a block while this one waited
+            if self._next >= self._end and self._spare is not None:
+                (self._next, self._end), self._spare = self._spare, None
+                self._block_size = self._end - self._next
+        number = self._next
+        self._next += 1
+        if self._end - self._next < self._block_size * REFILL_THRESHOLD:
+            self._refill_in_background()
+        return number
+
+    async def allocate(self) -> str:
+        """A new booking reference, e.g. SBJ-7K3M9QX"""
+        return encode_reference(await self.next_number())
+
+    async def start(self):
+        """Lease the first block so the first booking does not wait for it"""
+        await self._refill()
+
+    async def stop(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._refill_task = None
+
+    def stats(self):
+        return {
+            "remaining_in_block": max(self._end - self._next, 0),
+            "block_size": self._block_size,
+            "spare_block": self._spare is not None,
+            "leases": self.leases,
+        }
+
+
+# Process-wide allocator used by the booking service
+booking_references = BookingReferenceAllocator()
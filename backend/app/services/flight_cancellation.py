@@ -0,0 +1,114 @@
+"""
+Cancelling a flight together with every booking on it.
+
+The flight's status, the bookings and the seats on their other legs change
+in one transaction made of a fixed handful of set-based statements, so a
+full widebody costs the same number of round trips as a single booking.
+Re-running the operation is harmless: bookings that are already cancelled
+are skipped and give nothing back twice.
+"""
+import logging
+import uuid
+from typing import Any, Dict, List, NamedTuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+
+from app.database.database import AsyncSessionLocal
+from app.models import Booking, BookingFlight, Flight, Profile
+from app.models.base import model_to_dict
+from app.services import inventory_events
+from app.services.booking_cache import booking_cache
+from app.services.email import EmailNotificationService
+from app.services.seat_holds import cancel_bookings
+from app.services.seat_inventory import SeatReservation, publish_seat_changes
+
+logger = logging.getLogger(__name__)
+
+
+class FlightCancellation(NamedTuple):
+    """Outcome of cancelling a flight"""
+    flight: Dict[str, Any]
+    bookings: List[Dict[str, Any]]
+    released: List[SeatReservation]
+    emails: Dict[str, str]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "flight_id": self.flight["id"],
+            "status": self.flight["status"],
+            "bookings_cancelled": len(self.bookings),
+            "seats_returned": sum(reservation.request.seats for reservation in self.released),
+        }
+
+
+async def cancel_flight(flight_id: str, session_factory=AsyncSessionLocal) -> FlightCancellation:
+    """
+    Mark a flight cancelled and cancel every booking that includes it
+
+    Seats of the cancelled bookings go back to their other legs, so the other
+    flights of a round trip can be sold again; the cancelled flight's own
+    counts are left as they are.
+
+    Raises:
+        HTTPException 404 if the flight does not exist
+    """
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Flight with ID {flight_id} not found"
+    )
+    try:
+        flight_uuid = uuid.UUID(str(flight_id))
+    except ValueError:
+        raise not_found
+
+    async with session_factory() as session:
+        async with session.begin():
+            flight = (await session.execute(
+                update(Flight)
+                .where(Flight.id == flight_uuid)
+                .values(status="cancelled")
+                .returning(Flight)
+                .execution_options(synchronize_session=False)
+            )).scalar_one_or_none()
+            if flight is None:
+                raise not_found
+            flight = model_to_dict(flight)
+
+            bookings, released = await cancel_bookings(
+                session,
+                Booking.id.in_(
+                    select(BookingFlight.booking_id).where(BookingFlight.flight_id == flight_uuid).scalar_subquery()
+                ),
+                exclude_flights=[flight_uuid],
+            )
+
+            emails = {}
+            if bookings:
+                user_ids = {uuid.UUID(booking["user_id"]) for booking in bookings}
+                result = await session.execute(
+                    select(Profile.user_id, Profile.email).where(Profile.user_id.in_(user_ids), Profile.email.isnot(None))
+                )
+                emails = {str(user_id): email for user_id, email in result.all()}
+
+    booking_cache.invalidate(booking["id"] for booking in bookings)
+    publish_seat_changes(released)
+    inventory_events.publish_status_change(flight, "cancelled")
+    logger.info(f"Cancelled flight {flight_id} and {len(bookings)} bookings on it")
+    return FlightCancellation(flight, bookings, released, emails)
+
+
+async def notify_cancelled_bookings(cancellation: FlightCancellation):
+    """Email the owner of every cancelled booking; meant to run after the response is sent"""
+    for booking in cancellation.bookings:
+        email = cancellation.emails.get(booking["user_id"])
+        if not email:
+            continue
+        try:
+            await EmailNotificationService.send_booking_update(
+                email_to=[email],
+                booking_details={**booking, "flights": [{"flight_id": cancellation.flight["id"], "flight": cancellation.flight}]},
+                update_type="cancelled",
+            )
+        except Exception as e:
+            logger.error(f"Failed to send cancellation email for booking {booking['id']}: {e}")
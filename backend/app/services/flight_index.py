@@ -0,0 +1,312 @@
+"""
+Optional columnar in-memory flight index for search.
+
+When SEARCH_BACKEND=columnar, the flights table is held in memory as NumPy
+column arrays partitioned by (origin_airport_id, destination_airport_id,
+departure day). A search leg then touches exactly one partition: filters are
+vectorized boolean masks and sorting is an argsort, so no database round trip
+is needed. Only the columns a search result shows are kept. Seat and status
+changes published through inventory_events are applied to the arrays in
+place, and the whole index is reloaded periodically to pick up new flights
+and writes made by other worker processes.
+
+NumPy is an optional dependency (`pip install .[inventory]`); without it the
+index stays disabled and searches use the SQL path.
+"""
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.database.database import AsyncSessionLocal
+from app.models import Flight
+from app.models.base import model_to_dict
+from app.services import inventory_events
+from app.services.inventory_events import FlightChange
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without the optional extra
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 'sql' (default) or 'columnar'
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "sql").lower()
+FLIGHT_INDEX_RELOAD_SECONDS = int(os.getenv("FLIGHT_INDEX_RELOAD_SECONDS", "300"))
+
+CABINS = ("economy", "premium_economy", "business", "first")
+
+PartitionKey = Tuple[str, str, date]
+
+
+def departure_day(value: datetime) -> date:
+    """UTC calendar day of a departure, matching the SQL search day bounds"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+class FlightPartition:
+    """Column arrays for all flights on one route and departure day"""
+
+    def __init__(
+        self,
+        key: PartitionKey,
+        rows: List[Dict[str, Any]],
+        airline_codes: Dict[str, int],
+        status_codes: Dict[str, int],
+    ):
+        self.origin_airport_id, self.destination_airport_id, _ = key
+        # Rows are ordered by id so stable sorts break ties the same way as ORDER BY <key>, id
+        rows = sorted(rows, key=lambda row: row["id"])
+        self.ids = [row["id"] for row in rows]
+        self.flight_numbers = [row["flight_number"] for row in rows]
+        self.position_by_id = {flight_id: i for i, flight_id in enumerate(self.ids)}
+        self.departure = np.array([row["departure_time"].timestamp() for row in rows], dtype=np.int64)
+        self.arrival = np.array([row["arrival_time"].timestamp() for row in rows], dtype=np.int64)
+        self.duration = np.array([row["duration_minutes"] for row in rows], dtype=np.int32)
+        self.airline = np.array([airline_codes[row["airline_id"]] for row in rows], dtype=np.int32)
+        self.status = np.array([status_codes[row["status"]] for row in rows], dtype=np.int16)
+        self.price = {}
+        self.available = {}
+        for cabin in CABINS:
+            self.price[cabin] = np.array(
+                [np.nan if row[f"{cabin}_price"] is None else row[f"{cabin}_price"] for row in rows], dtype=np.float64
+            )
+            self.available[cabin] = np.array(
+                [row[f"{cabin}_available"] or 0 for row in rows], dtype=np.int32
+            )
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class ColumnarFlightIndex:
+    """Partitioned NumPy column store answering search legs without the database"""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._partitions: Dict[PartitionKey, FlightPartition] = {}
+        self._location_by_flight: Dict[str, PartitionKey] = {}
+        self._airline_codes: Dict[str, int] = {}
+        self._airline_ids: List[str] = []
+        self._status_codes: Dict[str, int] = {}
+        self._status_names: List[str] = []
+        self._reload_task: Optional[asyncio.Task] = None
+        self._load_lock = asyncio.Lock()
+        # Changes published while a load is scanning the table, replayed onto its partitions
+        self._changes_during_load: Optional[List[FlightChange]] = None
+        self.loaded_at: Optional[datetime] = None
+        self.deltas_applied = 0
+        self.deltas_replayed = 0
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    @property
+    def is_loading(self) -> bool:
+        return self._changes_during_load is not None
+
+    def _status_code(self, status: str) -> int:
+        if status not in self._status_codes:
+            self._status_codes[status] = len(self._status_names)
+            self._status_names.append(status)
+        return self._status_codes[status]
+
+    def _airline_code(self, airline_id: str) -> int:
+        if airline_id not in self._airline_codes:
+            self._airline_codes[airline_id] = len(self._airline_ids)
+            self._airline_ids.append(airline_id)
+        return self._airline_codes[airline_id]
+
+    def build(self, rows: List[Dict[str, Any]]):
+        """Replace the index contents with the given flight rows"""
+        grouped: Dict[PartitionKey, List[Dict[str, Any]]] = {}
+        for row in rows:
+            key = (row["origin_airport_id"], row["destination_airport_id"], departure_day(row["departure_time"]))
+            grouped.setdefault(key, []).append(row)
+            self._airline_code(row["airline_id"])
+            self._status_code(row["status"])
+
+        partitions = {
+            key: FlightPartition(key, group, self._airline_codes, self._status_codes)
+            for key, group in grouped.items()
+        }
+        locations = {row["id"]: key for key, group in grouped.items() for row in group}
+
+        self._partitions = partitions
+        self._location_by_flight = locations
+        self.loaded_at = datetime.utcnow()
+
+    async def load(self):
+        """
+        Read the whole flights table and rebuild the index.
+
+        The scan runs across many awaits, so rows it read early can be older
+        than changes published before it finishes. Those changes are recorded
+        and replayed onto the new partitions before they are swapped in.
+        """
+        if not self.available:
+            raise RuntimeError("The columnar search index requires numpy (pip install .[inventory])")
+        async with self._load_lock:
+            self._changes_during_load = []
+            try:
+                rows = []
+                async with self._session_factory() as session:
+                    result = await session.stream_scalars(select(Flight).execution_options(yield_per=5000))
+                    async for flight in result:
+                        rows.append(model_to_dict(flight))
+                self.build(rows)
+                for change in self._changes_during_load:
+                    self.deltas_replayed += self._apply(change)
+            finally:
+                self._changes_during_load = None
+        logger.info(f"Columnar flight index loaded: {len(rows)} flights in {len(self._partitions)} partitions")
+
+    def search(
+        self,
+        origin_airport_id: str,
+        destination_airport_id: str,
+        departure_date: date,
+        cabin_class: str,
+        total_passengers: int,
+        sort_by: Optional[str] = None,
+        sort_order: str = "asc",
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        airline_id: Optional[str] = None,
+        max_duration: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Evaluate one search leg with the same filters and sorts as the SQL engine"""
+        partition = self._partitions.get((str(origin_airport_id), str(destination_airport_id), departure_date))
+        if partition is None or not len(partition):
+            return []
+
+        cabin = cabin_class.replace("-", "_")
+        price = partition.price[cabin]
+        mask = np.ones(len(partition), dtype=bool)
+        if total_passengers > 0:
+            mask &= partition.available[cabin] >= total_passengers
+        # NaN prices compare False, matching SQL's NULL semantics for price filters
+        if min_price is not None:
+            mask &= price >= min_price
+        if max_price is not None:
+            mask &= price <= max_price
+        if max_duration is not None:
+            mask &= partition.duration <= max_duration
+        if airline_id:
+            airline_code = self._airline_codes.get(str(airline_id))
+            if airline_code is None:
+                return []
+            mask &= partition.airline == airline_code
+
+        positions = np.flatnonzero(mask)
+        if sort_by and len(positions) > 1:
+            keys = {
+                "price": price,
+                "duration": partition.duration,
+                "departure_time": partition.departure,
+                "arrival_time": partition.arrival,
+            }[sort_by][positions].astype(np.float64)
+            if sort_order == "desc":
+                # PostgreSQL sorts NULLs first when descending
+                keys = np.where(np.isnan(keys), -np.inf, -keys)
+            positions = positions[np.argsort(keys, kind="stable")]
+
+        return [self._render(partition, i) for i in positions]
+
+    def _render(self, partition: FlightPartition, position: int) -> Dict[str, Any]:
+        """Build the search row for one flight from the partition's columns"""
+        row = {
+            "id": partition.ids[position],
+            "flight_number": partition.flight_numbers[position],
+            "airline_id": self._airline_ids[partition.airline[position]],
+            "origin_airport_id": partition.origin_airport_id,
+            "destination_airport_id": partition.destination_airport_id,
+            "departure_time": datetime.fromtimestamp(int(partition.departure[position]), timezone.utc),
+            "arrival_time": datetime.fromtimestamp(int(partition.arrival[position]), timezone.utc),
+            "duration_minutes": int(partition.duration[position]),
+            "status": self._status_names[partition.status[position]],
+        }
+        for cabin in CABINS:
+            price = partition.price[cabin][position]
+            row[f"{cabin}_price"] = None if np.isnan(price) else float(price)
+            row[f"{cabin}_available"] = int(partition.available[cabin][position])
+        return row
+
+    def apply_change(self, change: FlightChange):
+        """Apply a published seat/status change to the arrays in place"""
+        if self._changes_during_load is not None:
+            self._changes_during_load.append(change)
+        self.deltas_applied += self._apply(change)
+
+    def _apply(self, change: FlightChange) -> bool:
+        key = self._location_by_flight.get(change.flight_id)
+        if key is None:
+            return False  # Not indexed yet; the next reload picks it up
+        partition = self._partitions[key]
+        position = partition.position_by_id[change.flight_id]
+        for field, value in (change.available or {}).items():
+            cabin = field[: -len("_available")]
+            if cabin in partition.available:
+                partition.available[cabin][position] = value
+        if change.status:
+            partition.status[position] = self._status_code(change.status)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": SEARCH_BACKEND,
+            "loaded_at": self.loaded_at,
+            "partitions": len(self._partitions),
+            "flights": len(self._location_by_flight),
+            "deltas_applied": self.deltas_applied,
+            "deltas_replayed": self.deltas_replayed,
+        }
+
+    async def _reload_loop(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.warning(f"Columnar flight index reload failed: {e}")
+
+    def start_periodic_reload(self, interval: int = FLIGHT_INDEX_RELOAD_SECONDS):
+        if interval <= 0 or (self._reload_task and not self._reload_task.done()):
+            return
+        self._reload_task = asyncio.create_task(self._reload_loop(interval))
+
+    async def stop_periodic_reload(self):
+        if self._reload_task:
+            self._reload_task.cancel()
+            try:
+                await self._reload_task
+            except asyncio.CancelledError:
+                pass
+            self._reload_task = None
+
+
+# Process-wide index; only populated when SEARCH_BACKEND=columnar
+flight_index = ColumnarFlightIndex()
+
+
+def columnar_search_enabled() -> bool:
+    return SEARCH_BACKEND == "columnar" and flight_index.is_loaded
+
+
+def _on_flight_change(change: FlightChange):
+    if flight_index.is_loaded or flight_index.is_loading:
+        flight_index.apply_change(change)
+
+
+inventory_events.subscribe(_on_flight_change)
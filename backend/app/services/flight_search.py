@@ -0,0 +1,679 @@
+"""
+Flight search engine backed by async SQLAlchemy.
+
+Each search leg is a single SELECT over the flights table. Airport and airline
+codes are resolved to ids through the in-process reference data registry, and
+the same registry attaches the airline and airport records to the returned
+rows, so the database only ever returns flight rows.
+"""
+import asyncio
+import base64
+import heapq
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import AsyncSessionLocal
+from app.models import Flight
+from app.models.base import model_to_dict
+from app.schemas.flight import FlightSearchParams
+from app.services.flight_index import columnar_search_enabled, flight_index
+from app.services.reference_data import reference_data
+from app.services.route_graph import ItineraryRequest, find_itineraries
+from app.services.search_cache import route_tag, search_cache
+
+logger = logging.getLogger(__name__)
+
+# Per-leg deadline for round-trip searches before the leg is reported as missing
+SEARCH_LEG_TIMEOUT_SECONDS = float(os.getenv("SEARCH_LEG_TIMEOUT_SECONDS", "10"))
+
+# Weight of price (vs. duration) in the composite round-trip pair score
+PAIR_SCORE_PRICE_WEIGHT = float(os.getenv("PAIR_SCORE_PRICE_WEIGHT", "0.7"))
+
+# Largest +/- day window accepted by the fare calendar
+FARE_CALENDAR_MAX_DAYS = 15
+
+# Sort keys accepted by /flights/search that map directly onto flight columns
+SORTABLE_COLUMNS = {
+    "duration": Flight.duration_minutes,
+    "departure_time": Flight.departure_time,
+    "arrival_time": Flight.arrival_time,
+}
+
+
+def cabin_column(cabin_class: str, suffix: str):
+    """
+    Return the Flight column for a cabin class, e.g. ('premium-economy', 'price')
+    -> Flight.premium_economy_price
+    """
+    return getattr(Flight, f"{cabin_class.replace('-', '_')}_{suffix}")
+
+
+def parse_search_date(value: str) -> date:
+    """Parse a YYYY-MM-DD search date, raising a 400 for anything else"""
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid date '{value}', expected YYYY-MM-DD"
+        )
+
+
+def day_bounds(day: date):
+    """Return the [start, end) UTC datetimes covering a calendar day"""
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def serialize_flight(flight: Flight) -> Dict[str, Any]:
+    """Convert a Flight row into a response dict with reference data attached"""
+    return reference_data.attach(model_to_dict(flight))
+
+
+def build_leg_query(
+    origin_airport_id: str,
+    destination_airport_id: str,
+    departure_date: date,
+    cabin_class: str,
+    total_passengers: int,
+    sort_by: Optional[str] = None,
+    sort_order: str = "asc",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    airline_id: Optional[str] = None,
+    max_duration: Optional[int] = None,
+    after: Optional[Tuple[Any, str]] = None,
+    limit: Optional[int] = None,
+):
+    """
+    Build the SELECT for one direction of a search.
+
+    `after` is a (sort value, flight id) keyset position from a cursor and
+    `limit` caps the rows returned; both require `sort_by`.
+    """
+    price_column = cabin_column(cabin_class, "price")
+    availability_column = cabin_column(cabin_class, "available")
+    start, end = day_bounds(departure_date)
+
+    query = select(Flight).where(
+        Flight.origin_airport_id == origin_airport_id,
+        Flight.destination_airport_id == destination_airport_id,
+        Flight.departure_time >= start,
+        Flight.departure_time < end,
+    )
+
+    if total_passengers > 0:
+        query = query.where(availability_column >= total_passengers)
+    if min_price is not None:
+        query = query.where(price_column >= min_price)
+    if max_price is not None:
+        query = query.where(price_column <= max_price)
+    if max_duration is not None:
+        query = query.where(Flight.duration_minutes <= max_duration)
+    if airline_id:
+        query = query.where(Flight.airline_id == airline_id)
+
+    if sort_by:
+        column = price_column if sort_by == "price" else SORTABLE_COLUMNS[sort_by]
+        if after is not None or limit is not None:
+            # Keyset positions cannot address NULL sort values
+            query = query.where(column.is_not(None))
+        if after is not None:
+            value, flight_id = after
+            beyond = column < value if sort_order == "desc" else column > value
+            query = query.where(or_(beyond, and_(column == value, Flight.id > flight_id)))
+        ordered = column.desc() if sort_order == "desc" else column.asc()
+        query = query.order_by(ordered, Flight.id)
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    return query
+
+
+async def fetch_leg(db: AsyncSession, query) -> List[Dict[str, Any]]:
+    """Execute a leg query and attach reference data to the rows"""
+    result = await db.execute(query)
+    flights = [model_to_dict(f) for f in result.scalars()]
+    await reference_data.refresh_missing(flights)
+    return [reference_data.attach(f) for f in flights]
+
+
+async def search_leg(
+    db: AsyncSession,
+    origin_airport_id: str,
+    destination_airport_id: str,
+    departure_date: date,
+    **filters,
+) -> List[Dict[str, Any]]:
+    """
+    Return the flights for one direction of a search.
+
+    With SEARCH_BACKEND=columnar the leg is answered from the in-memory index;
+    otherwise it is served from the result cache when an identical leg was
+    searched recently, falling back to SQL.
+    """
+    if columnar_search_enabled():
+        rows = flight_index.search(origin_airport_id, destination_airport_id, departure_date, **filters)
+        await reference_data.refresh_missing(rows)
+        return [reference_data.attach(row) for row in rows]
+
+    # The registry version is part of the key so reloaded airline/airport records are never mixed with stale ones
+    cache_key = (
+        reference_data.version, origin_airport_id, destination_airport_id, departure_date.isoformat()
+    ) + tuple(sorted(filters.items()))
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    query = build_leg_query(origin_airport_id, destination_airport_id, departure_date, **filters)
+    flights = await fetch_leg(db, query)
+    search_cache.set(cache_key, flights, [route_tag(origin_airport_id, destination_airport_id, departure_date)])
+    return flights
+
+
+class SearchPlan(NamedTuple):
+    """Resolved legs of a search and the normalized filters applied to each"""
+    legs: List[Tuple[str, str, str, date]]  # (leg name, origin id, destination id, day)
+    filters: Dict[str, Any]
+
+
+async def plan_search(
+    params: FlightSearchParams,
+    sort_by: Optional[str] = None,
+    sort_order: str = "asc",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    airline_code: Optional[str] = None,
+    max_duration: Optional[int] = None,
+) -> Optional[SearchPlan]:
+    """Resolve codes and dates for a search; returns None when nothing can match"""
+    await reference_data.ensure_loaded()
+    origin_airport_id = reference_data.airport_id(params.from_code)
+    destination_airport_id = reference_data.airport_id(params.to_code)
+    if not origin_airport_id or not destination_airport_id:
+        return None
+
+    airline_id = None
+    if airline_code:
+        airline_id = reference_data.airline_id(airline_code)
+        if not airline_id:
+            return None
+
+    total_passengers = params.passengers.adults + params.passengers.children
+    # Normalized filters: together with the route and day they form the cache key
+    filters = dict(
+        cabin_class=params.cabin_class,
+        total_passengers=total_passengers,
+        sort_by=sort_by,
+        sort_order=sort_order if sort_by else "asc",
+        min_price=float(min_price) if min_price is not None else None,
+        max_price=float(max_price) if max_price is not None else None,
+        airline_id=airline_id,
+        max_duration=max_duration,
+    )
+
+    legs = [("outbound", origin_airport_id, destination_airport_id, parse_search_date(params.departure_date))]
+    if params.trip_type == "round-trip" and params.return_date:
+        legs.append(("return", destination_airport_id, origin_airport_id, parse_search_date(params.return_date)))
+    return SearchPlan(legs, filters)
+
+
+SORT_VALUE_FIELDS = {
+    "duration": "duration_minutes",
+    "departure_time": "departure_time",
+    "arrival_time": "arrival_time",
+}
+
+
+def sort_value(flight: Dict[str, Any], sort_by: str, cabin_class: str):
+    """Value of the active sort key for a flight row"""
+    if sort_by == "price":
+        return flight[f"{cabin_class.replace('-', '_')}_price"]
+    return flight[SORT_VALUE_FIELDS[sort_by]]
+
+
+def encode_cursor(leg: str, sort_by: str, sort_order: str, after: Optional[Tuple[Any, str]] = None) -> str:
+    """Encode a keyset position as an opaque URL-safe cursor"""
+    payload = {"leg": leg, "sort": [sort_by, sort_order]}
+    if after is not None:
+        value, flight_id = after
+        payload["after"] = [value.isoformat() if isinstance(value, datetime) else value, str(flight_id)]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[str, Optional[Tuple[Any, str]]]:
+    """Decode a cursor into (leg, keyset position), rejecting cursors from another sort"""
+    invalid = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid search cursor")
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        leg = payload["leg"]
+        after = payload.get("after")
+        if payload.get("sort") != [sort_by, sort_order] or leg not in ("outbound", "return"):
+            raise invalid
+        if after is None:
+            return leg, None
+        if not isinstance(after, list) or len(after) != 2 or not isinstance(after[1], str):
+            raise invalid
+        value, flight_id = after
+        if sort_by in ("departure_time", "arrival_time"):
+            value = datetime.fromisoformat(value)
+            if value.tzinfo is None:
+                raise invalid
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise invalid
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise invalid
+    return leg, (value, flight_id)
+
+
+def after_keyset(rows: List[Dict[str, Any]], after: Optional[Tuple[Any, str]], sort_by: str, sort_order: str, cabin_class: str):
+    """In-memory equivalent of the SQL keyset predicate for pre-sorted rows"""
+    rows = [row for row in rows if sort_value(row, sort_by, cabin_class) is not None]
+    if after is None:
+        return rows
+    value, flight_id = after
+
+    def is_after(row):
+        row_value = sort_value(row, sort_by, cabin_class)
+        beyond = row_value < value if sort_order == "desc" else row_value > value
+        return beyond or (row_value == value and str(row["id"]) > flight_id)
+
+    return [row for row in rows if is_after(row)]
+
+
+class FlightSearchResult(NamedTuple):
+    """Flights found by a search and the legs that could not be fetched"""
+    flights: List[Dict[str, Any]]
+    failed_legs: Tuple[str, ...] = ()
+    next_cursor: Optional[str] = None
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.failed_legs)
+
+
+async def search_leg_in_new_session(*args, **kwargs) -> List[Dict[str, Any]]:
+    """Run search_leg on its own session so it can overlap with another leg"""
+    async with AsyncSessionLocal() as session:
+        return await search_leg(session, *args, **kwargs)
+
+
+async def search_flight_inventory(
+    db: AsyncSession,
+    params: FlightSearchParams,
+    sort_by: Optional[str] = None,
+    sort_order: str = "asc",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    airline_code: Optional[str] = None,
+    max_duration: Optional[int] = None,
+) -> FlightSearchResult:
+    """
+    Run a one-way or round-trip search.
+
+    One-way searches return the outbound flights; round trips return the
+    outbound flights followed by the return flights, each tagged with
+    `is_return`. The two legs of a round trip are fetched concurrently; if
+    one of them fails or exceeds SEARCH_LEG_TIMEOUT_SECONDS the other is
+    still returned and the failed leg is listed in `failed_legs`. When both
+    fail the search raises 504 if they both timed out and 503 otherwise.
+    """
+    plan = await plan_search(params, sort_by, sort_order, min_price, max_price, airline_code, max_duration)
+    if plan is None:
+        return FlightSearchResult([])  # Unknown airport or airline
+
+    if len(plan.legs) == 1:
+        _, *outbound = plan.legs[0]
+        return FlightSearchResult(await search_leg(db, *outbound, **plan.filters))
+
+    (_, *outbound), (_, *inbound) = plan.legs
+    legs = {
+        "outbound": search_leg(db, *outbound, **plan.filters),
+        "return": search_leg_in_new_session(*inbound, **plan.filters),
+    }
+    results = await asyncio.gather(
+        *(asyncio.wait_for(leg, timeout=SEARCH_LEG_TIMEOUT_SECONDS) for leg in legs.values()),
+        return_exceptions=True,
+    )
+
+    flights_by_leg = {}
+    failed_legs = []
+    for leg_name, result in zip(legs, results):
+        if isinstance(result, BaseException):
+            logger.warning(f"Round-trip search {leg_name} leg failed: {result!r}")
+            failed_legs.append(leg_name)
+            flights_by_leg[leg_name] = []
+        else:
+            flights_by_leg[leg_name] = result
+
+    if len(failed_legs) == len(legs):
+        timed_out = all(isinstance(result, (asyncio.TimeoutError, TimeoutError)) for result in results)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT if timed_out else status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Flight search failed for the {' and '.join(failed_legs)} legs",
+        ) from results[0]
+
+    for flight in flights_by_leg["outbound"]:
+        flight["is_return"] = False
+    for flight in flights_by_leg["return"]:
+        flight["is_return"] = True
+
+    return FlightSearchResult(flights_by_leg["outbound"] + flights_by_leg["return"], tuple(failed_legs))
+
+
+def rank_round_trip_pairs(
+    outbound: List[Dict[str, Any]],
+    inbound: List[Dict[str, Any]],
+    rank_by: str,
+    cabin_class: str,
+    top_k: int,
+) -> List[Dict[str, Any]]:
+    """
+    Return the top_k outbound/return combinations by total price, total
+    duration or composite score without building the cross product.
+
+    Every ranking is a sum of one value per flight, so after sorting each
+    leg the k best sums are found with the classic heap merge: start from
+    (0, 0) and on each pop push the two neighbouring index pairs. The
+    composite score is the weighted sum of total price and total duration,
+    each normalized by the best possible total, which keeps it additive.
+    Pairs whose return departs before the outbound arrives are skipped.
+    """
+    price_field = f"{cabin_class.replace('-', '_')}_price"
+    outbound = [f for f in outbound if f.get(price_field) is not None]
+    inbound = [f for f in inbound if f.get(price_field) is not None]
+    if not outbound or not inbound or top_k <= 0:
+        return []
+
+    if rank_by == "price":
+        value = lambda f: f[price_field]
+    elif rank_by == "duration":
+        value = lambda f: f["duration_minutes"]
+    else:
+        best_price = min(f[price_field] for f in outbound) + min(f[price_field] for f in inbound)
+        best_duration = min(f["duration_minutes"] for f in outbound) + min(f["duration_minutes"] for f in inbound)
+        value = lambda f: (
+            PAIR_SCORE_PRICE_WEIGHT * f[price_field] / (best_price or 1)
+            + (1 - PAIR_SCORE_PRICE_WEIGHT) * f["duration_minutes"] / (best_duration or 1)
+        )
+
+    outbound = sorted(outbound, key=value)
+    inbound = sorted(inbound, key=value)
+    outbound_values = [value(f) for f in outbound]
+    inbound_values = [value(f) for f in inbound]
+
+    pairs = []
+    heap = [(outbound_values[0] + inbound_values[0], 0, 0)]
+    seen = {(0, 0)}
+    while heap and len(pairs) < top_k:
+        total, i, j = heapq.heappop(heap)
+        out_flight, return_flight = outbound[i], inbound[j]
+        if return_flight["departure_time"] > out_flight["arrival_time"]:
+            pairs.append({
+                "outbound_flight": out_flight,
+                "return_flight": return_flight,
+                "total_price": round(out_flight[price_field] + return_flight[price_field], 2),
+                "total_duration_minutes": out_flight["duration_minutes"] + return_flight["duration_minutes"],
+                "score": round(total, 6),
+            })
+        for next_i, next_j in ((i + 1, j), (i, j + 1)):
+            if next_i < len(outbound) and next_j < len(inbound) and (next_i, next_j) not in seen:
+                seen.add((next_i, next_j))
+                heapq.heappush(heap, (outbound_values[next_i] + inbound_values[next_j], next_i, next_j))
+    return pairs
+
+
+async def search_round_trip_pairs(
+    db: AsyncSession,
+    params: FlightSearchParams,
+    rank_by: str = "price",
+    top_k: int = 20,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    airline_code: Optional[str] = None,
+    max_duration: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Tuple[str, ...]]:
+    """
+    Run a round-trip search and rank outbound/return combinations server-side.
+
+    Returns (pairs, failed_legs); when a leg failed there is nothing to pair.
+    """
+    result = await search_flight_inventory(
+        db, params, min_price=min_price, max_price=max_price, airline_code=airline_code, max_duration=max_duration
+    )
+    outbound = [f for f in result.flights if not f.get("is_return")]
+    inbound = [f for f in result.flights if f.get("is_return")]
+    pairs = rank_round_trip_pairs(outbound, inbound, rank_by, params.cabin_class, top_k)
+    return pairs, result.failed_legs
+
+
+async def search_flight_page(
+    db: AsyncSession,
+    params: FlightSearchParams,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: str = "asc",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    airline_code: Optional[str] = None,
+    max_duration: Optional[int] = None,
+) -> FlightSearchResult:
+    """
+    Return one keyset page of a search.
+
+    Pages walk the outbound leg and then the return leg; a page never mixes
+    the two. Results are ordered by the active sort key (departure time when
+    none is given) with the flight id as tie-breaker, and `next_cursor` is
+    None on the last page.
+    """
+    sort_by = sort_by or "departure_time"
+    plan = await plan_search(params, sort_by, sort_order, min_price, max_price, airline_code, max_duration)
+    if plan is None:
+        return FlightSearchResult([])
+
+    leg_names = [leg[0] for leg in plan.legs]
+    leg_name, after = decode_cursor(cursor, sort_by, sort_order) if cursor else ("outbound", None)
+    if leg_name not in leg_names:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid search cursor")
+    _, origin_airport_id, destination_airport_id, day = plan.legs[leg_names.index(leg_name)]
+    cabin_class = plan.filters["cabin_class"]
+
+    if columnar_search_enabled():
+        rows = flight_index.search(origin_airport_id, destination_airport_id, day, **plan.filters)
+        rows = after_keyset(rows, after, sort_by, sort_order, cabin_class)[: limit + 1]
+        await reference_data.refresh_missing(rows)
+        rows = [reference_data.attach(row) for row in rows]
+    else:
+        query = build_leg_query(
+            origin_airport_id, destination_airport_id, day, after=after, limit=limit + 1, **plan.filters
+        )
+        rows = await fetch_leg(db, query)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(leg_name, sort_by, sort_order, (sort_value(last, sort_by, cabin_class), last["id"]))
+    elif leg_names.index(leg_name) + 1 < len(leg_names):
+        next_cursor = encode_cursor(leg_names[leg_names.index(leg_name) + 1], sort_by, sort_order)
+
+    if len(leg_names) > 1:
+        for row in rows:
+            row["is_return"] = leg_name == "return"
+    return FlightSearchResult(rows, next_cursor=next_cursor)
+
+
+async def stream_flight_search(plan: Optional[SearchPlan]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield the flights of a planned search one at a time as they are read from
+    a server-side cursor, outbound leg first.
+
+    The plan comes from plan_search, called before the response starts so
+    that invalid parameters still get their 400. Opens its own session
+    because a streamed response outlives the request dependencies.
+    """
+    if plan is None:
+        return
+    round_trip = len(plan.legs) > 1
+
+    async with AsyncSessionLocal() as session:
+        for leg_name, *leg in plan.legs:
+            async for row in _stream_leg_rows(session, *leg, **plan.filters):
+                await reference_data.refresh_missing([row])
+                reference_data.attach(row)
+                if round_trip:
+                    row["is_return"] = leg_name == "return"
+                yield row
+
+
+async def _stream_leg_rows(session: AsyncSession, origin_airport_id, destination_airport_id, day, **filters):
+    if columnar_search_enabled():
+        for row in flight_index.search(origin_airport_id, destination_airport_id, day, **filters):
+            yield row
+        return
+    query = build_leg_query(origin_airport_id, destination_airport_id, day, **filters)
+    result = await session.stream_scalars(query.execution_options(yield_per=500))
+    async for flight in result:
+        yield model_to_dict(flight)
+
+
+def build_fare_calendar_query(
+    origin_airport_id: str,
+    destination_airport_id: str,
+    first_day: date,
+    last_day: date,
+    cabin_class: str,
+    total_passengers: int,
+):
+    """
+    Build the grouped aggregate behind the fare calendar: one row per UTC
+    departure day with the cheapest fare and number of bookable flights.
+
+    The WHERE clause is an equality on the route plus a range on
+    departure_time, so it is served by ix_flights_origin_dest_departure.
+    """
+    price_column = cabin_column(cabin_class, "price")
+    availability_column = cabin_column(cabin_class, "available")
+    start, _ = day_bounds(first_day)
+    _, end = day_bounds(last_day)
+    # Inline literal so the SELECT and GROUP BY expressions are textually identical
+    departure_day = func.date(func.timezone(literal_column("'UTC'"), Flight.departure_time)).label("departure_day")
+
+    query = (
+        select(
+            departure_day,
+            func.min(price_column).label("cheapest_price"),
+            func.count(Flight.id).label("flight_count"),
+        )
+        .where(
+            Flight.origin_airport_id == origin_airport_id,
+            Flight.destination_airport_id == destination_airport_id,
+            Flight.departure_time >= start,
+            Flight.departure_time < end,
+            price_column.is_not(None),
+        )
+        .group_by(departure_day)
+        .order_by(departure_day)
+    )
+    if total_passengers > 0:
+        query = query.where(availability_column >= total_passengers)
+    return query
+
+
+async def fare_calendar(
+    db: AsyncSession,
+    from_code: str,
+    to_code: str,
+    departure_date: str,
+    days: int,
+    cabin_class: str = "economy",
+    total_passengers: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Cheapest fare and flight count for every day within +/- `days` of
+    departure_date. Days without a bookable flight are included with a
+    count of 0 so the client can render a continuous strip.
+    """
+    center = parse_search_date(departure_date)
+    first_day, last_day = center - timedelta(days=days), center + timedelta(days=days)
+    calendar = {
+        first_day + timedelta(days=offset): {"cheapest_price": None, "flight_count": 0}
+        for offset in range(2 * days + 1)
+    }
+
+    await reference_data.ensure_loaded()
+    origin_airport_id = reference_data.airport_id(from_code)
+    destination_airport_id = reference_data.airport_id(to_code)
+    if origin_airport_id and destination_airport_id:
+        query = build_fare_calendar_query(
+            origin_airport_id, destination_airport_id, first_day, last_day, cabin_class, total_passengers
+        )
+        result = await db.execute(query)
+        for day, cheapest_price, flight_count in result.all():
+            if day in calendar:
+                calendar[day] = {
+                    "cheapest_price": float(cheapest_price) if cheapest_price is not None else None,
+                    "flight_count": flight_count,
+                }
+
+    return [{"departure_date": day, **entry} for day, entry in calendar.items()]
+
+
+async def search_connections(
+    db: AsyncSession,
+    params: FlightSearchParams,
+    max_stops: int = 2,
+    sort_by: str = "price",
+    min_connection_minutes: Optional[int] = None,
+    max_connection_minutes: Optional[int] = None,
+    max_duration: Optional[int] = None,
+    max_price: Optional[float] = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Nonstop and connecting itineraries (up to max_stops hubs) for the
+    outbound leg of a search, best `limit` first by total price or duration.
+    """
+    await reference_data.ensure_loaded()
+    origin_airport_id = reference_data.airport_id(params.from_code)
+    destination_airport_id = reference_data.airport_id(params.to_code)
+    if not origin_airport_id or not destination_airport_id:
+        return []
+
+    request = ItineraryRequest(
+        departure_date=parse_search_date(params.departure_date),
+        cabin_class=params.cabin_class,
+        sort_by=sort_by,
+        max_price=float(max_price) if max_price is not None else None,
+        limit=limit,
+    )
+    overrides = {
+        "min_connection": min_connection_minutes,
+        "max_connection": max_connection_minutes,
+        "max_duration": max_duration,
+    }
+    request = request._replace(**{key: value for key, value in overrides.items() if value is not None})
+    if request.min_connection > request.max_connection:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_connection_minutes cannot exceed max_connection_minutes"
+        )
+
+    total_passengers = params.passengers.adults + params.passengers.children
+    itineraries = await find_itineraries(
+        db, origin_airport_id, destination_airport_id, request, total_passengers, max_stops
+    )
+    segments = [flight for itinerary in itineraries for flight in itinerary["segments"]]
+    await reference_data.refresh_missing(segments)
+    for flight in segments:
+        reference_data.attach(flight)
+    return itineraries
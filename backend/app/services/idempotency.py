@@ -0,0 +1,227 @@
+"""
+Idempotency-Key support for non-repeatable POST endpoints.
+
+A client sends the same `Idempotency-Key` header on every retry of one
+logical request. The first request runs; its response is kept for
+IDEMPOTENCY_TTL_SECONDS and replayed to later retries. A retry that arrives
+while the first request is still running waits for it instead of running the
+work a second time.
+
+Errors are only kept when retrying cannot change them: 400/422 validation
+errors about the request body. Errors that depend on the current state, such
+as sold-out seats (marked with `transient`), an expired hold (409) or a
+server error, are not kept, so a retry with the same key runs for real.
+
+Keys are scoped per user and endpoint, and a key reused with a different
+request body is rejected.
+
+Outcomes live in this process's memory, so a retry is only deduplicated
+when it reaches the worker that ran the first request. With several
+workers a retry landing elsewhere would book or charge a second time, so
+startup refuses to run when WEB_CONCURRENCY (the worker count read by
+uvicorn and gunicorn) is above 1.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# Client errors about the request itself; the same body always gets the same answer
+REPLAYABLE_ERROR_STATUSES = (status.HTTP_400_BAD_REQUEST, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+def ensure_single_worker():
+    """Refuse to start when the server runs several workers the store cannot span"""
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={workers}, but Idempotency-Key outcomes are kept in process memory and "
+            "only deduplicate retries within one worker; run a single worker"
+        )
+
+
+def transient(error: HTTPException) -> HTTPException:
+    """Mark a client error that depends on current state (e.g. seats left) so it is never replayed"""
+    error.transient = True
+    return error
+
+
+def replayable(error: HTTPException) -> bool:
+    return error.status_code in REPLAYABLE_ERROR_STATUSES and not getattr(error, "transient", False)
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable digest of a request body, to spot a key reused for another request"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class StoredOutcome(NamedTuple):
+    """What the first execution produced: a result, or a validation error to raise again"""
+    fingerprint: str
+    result: Any = None
+    error: Optional[HTTPException] = None
+
+    def replay(self) -> Any:
+        if self.error is not None:
+            raise HTTPException(status_code=self.error.status_code, detail=self.error.detail, headers=self.error.headers)
+        return copy.deepcopy(self.result)
+
+
+class IdempotencyStore:
+    """Bounded, TTL-evicted store of first responses, with waiting for in-flight duplicates"""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_MAX_ENTRIES, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, StoredOutcome]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.replays = 0
+        self.waits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _stored(self, key: str) -> Optional[StoredOutcome]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, outcome = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return outcome
+
+    def _store(self, key: str, outcome: StoredOutcome):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, outcome)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _check_fingerprint(key: str, expected: str, fingerprint: str):
+        if expected != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+
+    async def run(self, key: str, fingerprint: str, operation: Callable[[], Awaitable[Any]]) -> Tuple[bool, Any]:
+        """
+        Run `operation` once per key
+
+        Returns:
+            (replayed, result): replayed is True when the result comes from an
+            earlier execution of the same request
+        """
+        while True:
+            outcome = self._stored(key)
+            if outcome is not None:
+                self._check_fingerprint(key, outcome.fingerprint, fingerprint)
+                self.replays += 1
+                return True, outcome.replay()
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            self._check_fingerprint(key, in_flight[0], fingerprint)
+            self.waits += 1
+            try:
+                await asyncio.shield(in_flight[1])
+            except asyncio.CancelledError:
+                if not in_flight[1].cancelled():
+                    raise
+                # The first request was abandoned; try again, possibly running it ourselves
+            except Exception:
+                pass
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        self.executions += 1
+        try:
+            result = await operation()
+        except HTTPException as e:
+            if replayable(e):
+                self._store(key, StoredOutcome(fingerprint, error=e))
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody is waiting
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            self._store(key, StoredOutcome(fingerprint, result=copy.deepcopy(result)))
+            future.set_result(None)
+            return False, result
+        finally:
+            self._in_flight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.executions + self.replays
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "replays": self.replays,
+            "waits": self.waits,
+            "replay_ratio": round(self.replays / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Process-wide store used by the booking and payment endpoints
+idempotency_store = IdempotencyStore()
+
+
+async def run_idempotent(
+    idempotency_key: Optional[str],
+    scope: str,
+    payload: Any,
+    operation: Callable[[], Awaitable[Any]],
+) -> Tuple[bool, Any]:
+    """
+    Run a request handler under an optional Idempotency-Key
+
+    `scope` names the caller and endpoint (e.g. "bookings:<user id>") so keys
+    never collide across users or routes. Without a key the operation just runs.
+    """
+    if not idempotency_key:
+        return False, await operation()
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+        )
+    replayed, result = await idempotency_store.run(f"{scope}:{idempotency_key}", request_fingerprint(payload), operation)
+    if replayed:
+        logger.info(f"Replayed {scope} response for Idempotency-Key {idempotency_key}")
+    return replayed, result
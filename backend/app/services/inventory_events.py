@@ -0,0 +1,54 @@
+"""
+In-process notifications for flight inventory changes.
+
+Services that write seat counts or flight status publish a FlightChange;
+in-memory structures derived from the flights table (the search result
+cache, the columnar search index, ...) subscribe to keep themselves current.
+"""
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FlightChange(NamedTuple):
+    """
+    A change to one flight.
+
+    `flight` carries at least the flight id and, where known, its route and
+    departure_time. `available` maps availability columns (e.g.
+    'economy_available') to their new values.
+    """
+    flight: Dict[str, Any]
+    available: Optional[Dict[str, int]] = None
+    status: Optional[str] = None
+
+    @property
+    def flight_id(self) -> str:
+        return str(self.flight.get("id") or self.flight.get("flight_id"))
+
+
+_listeners: List[Callable[[FlightChange], None]] = []
+
+
+def subscribe(listener: Callable[[FlightChange], None]):
+    """Register a callback invoked synchronously for every published change"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def publish(change: FlightChange):
+    """Deliver a change to every listener; a failing listener never blocks the writer"""
+    for listener in list(_listeners):
+        try:
+            listener(change)
+        except Exception as e:
+            logger.error(f"Inventory listener {listener!r} failed for flight {change.flight_id}: {e}", exc_info=True)
+
+
+def publish_seat_change(flight: Dict[str, Any], availability_field: str, new_available: int):
+    publish(FlightChange(flight=flight, available={availability_field: new_available}))
+
+
+def publish_status_change(flight: Dict[str, Any], new_status: str):
+    publish(FlightChange(flight=flight, status=new_status))
@@ -0,0 +1,122 @@
+"""
+Cache of verified access tokens.
+
+Clients that poll or hold SSE streams present the same bearer token on every
+request, so the principal resolved for a token is kept here until the
+token's own `exp`. Keys are SHA-256 digests of the token, never the token
+itself. Entries are evicted least recently used past a byte budget, and the
+logout endpoint drops the token it signs out.
+
+Only locally verified tokens are cached: a principal from a Supabase round
+trip is fetched precisely to see revocations, so keeping it would defeat
+the point.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.booking_cache import document_size
+
+PRINCIPAL_CACHE_MAX_BYTES = int(os.getenv("PRINCIPAL_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+# Digest, key tuple and bookkeeping on top of the principal itself
+ENTRY_OVERHEAD_BYTES = 200
+SCOPES = ("middleware", "services")
+
+Key = Tuple[str, bytes]
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class PrincipalCache:
+    """Memory-bounded LRU of principals, each expiring with its token"""
+
+    def __init__(self, max_bytes: int = PRINCIPAL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Key, Tuple[float, Dict[str, Any], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, token: str, scope: str) -> Optional[Dict[str, Any]]:
+        """The principal cached for the token by `scope`'s verifier, or None"""
+        key = (scope, token_digest(token))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, principal, _ = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(principal)
+
+    def set(self, token: str, principal: Dict[str, Any], expires_at: Optional[float], scope: str):
+        """Keep a verified principal until `expires_at` (the token's exp, epoch seconds)"""
+        if self.max_bytes <= 0 or expires_at is None or expires_at <= time.time():
+            return
+        size = document_size(principal) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        key = (scope, token_digest(token))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (float(expires_at), dict(principal), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, token: str) -> int:
+        """Forget the token under every scope; returns the number of entries dropped"""
+        digest = token_digest(token)
+        dropped = 0
+        with self._lock:
+            for scope in SCOPES:
+                if (scope, digest) in self._entries:
+                    self._remove((scope, digest))
+                    dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# Process-wide cache shared by both get_current_user dependencies
+principal_cache = PrincipalCache()
@@ -0,0 +1,192 @@
+"""
+In-process registry of reference data (airports and airlines).
+
+Airports and airlines change rarely but are needed by every search and every
+booking document. The registry loads both tables once at startup, answers
+code -> id and id -> record lookups from dictionaries, and swaps in a new
+snapshot when an admin triggers a reload or the periodic check notices that
+either table changed.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import func, select
+
+from app.database.database import AsyncSessionLocal
+from app.models import Airline, Airport
+from app.models.base import model_to_dict
+
+logger = logging.getLogger(__name__)
+
+# Seconds between change checks; 0 disables the background refresh
+REFERENCE_DATA_REFRESH_SECONDS = int(os.getenv("REFERENCE_DATA_REFRESH_SECONDS", "300"))
+
+
+class ReferenceSnapshot(NamedTuple):
+    """Immutable view of the reference tables at one version"""
+    version: int
+    fingerprint: Any
+    loaded_at: Optional[datetime]
+    airports_by_id: Dict[str, Dict[str, Any]]
+    airport_ids_by_code: Dict[str, str]
+    airlines_by_id: Dict[str, Dict[str, Any]]
+    airline_ids_by_code: Dict[str, str]
+
+
+EMPTY_SNAPSHOT = ReferenceSnapshot(0, None, None, {}, {}, {}, {})
+
+
+async def _fetch_fingerprint(session):
+    """Cheap change detector: row counts and latest updated_at of both tables"""
+    query = select(
+        select(func.count(Airport.id)).scalar_subquery(),
+        select(func.max(Airport.updated_at)).scalar_subquery(),
+        select(func.count(Airline.id)).scalar_subquery(),
+        select(func.max(Airline.updated_at)).scalar_subquery(),
+    )
+    result = await session.execute(query)
+    return tuple(result.one())
+
+
+class ReferenceDataRegistry:
+    """Versioned airport/airline lookup tables held in memory"""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._snapshot = EMPTY_SNAPSHOT
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._snapshot.version > 0
+
+    async def load(self) -> int:
+        """Load both tables and publish them as a new version"""
+        async with self._lock:
+            async with self._session_factory() as session:
+                fingerprint = await _fetch_fingerprint(session)
+                airports = (await session.execute(select(Airport))).scalars().all()
+                airlines = (await session.execute(select(Airline))).scalars().all()
+            self._publish(fingerprint, airports, airlines)
+        logger.info(
+            f"Reference data v{self.version} loaded: "
+            f"{len(self._snapshot.airports_by_id)} airports, {len(self._snapshot.airlines_by_id)} airlines"
+        )
+        return self.version
+
+    def _publish(self, fingerprint, airports: Iterable[Airport], airlines: Iterable[Airline]):
+        airports_by_id = {}
+        airport_ids_by_code = {}
+        for airport in airports:
+            record = model_to_dict(airport)
+            airports_by_id[record["id"]] = record
+            airport_ids_by_code[record["iata_code"].upper()] = record["id"]
+
+        airlines_by_id = {}
+        airline_ids_by_code = {}
+        for airline in airlines:
+            record = model_to_dict(airline)
+            airlines_by_id[record["id"]] = record
+            airline_ids_by_code[record["code"].upper()] = record["id"]
+
+        # Readers always see a complete snapshot because the swap is a single assignment
+        self._snapshot = ReferenceSnapshot(
+            version=self._snapshot.version + 1,
+            fingerprint=fingerprint,
+            loaded_at=datetime.utcnow(),
+            airports_by_id=airports_by_id,
+            airport_ids_by_code=airport_ids_by_code,
+            airlines_by_id=airlines_by_id,
+            airline_ids_by_code=airline_ids_by_code,
+        )
+
+    async def ensure_loaded(self):
+        """Load on first use if startup did not (e.g. in scripts or tests)"""
+        if not self.is_loaded:
+            await self.load()
+
+    async def reload_if_changed(self) -> bool:
+        """Reload only when the table fingerprint differs from the current version"""
+        async with self._session_factory() as session:
+            fingerprint = await _fetch_fingerprint(session)
+        if fingerprint == self._snapshot.fingerprint:
+            return False
+        await self.load()
+        return True
+
+    async def refresh_missing(self, flights: Iterable[Dict[str, Any]]) -> bool:
+        """Reload once if any flight references an airport or airline we have not seen"""
+        snapshot = self._snapshot
+        for flight in flights:
+            if (
+                str(flight["airline_id"]) not in snapshot.airlines_by_id
+                or str(flight["origin_airport_id"]) not in snapshot.airports_by_id
+                or str(flight["destination_airport_id"]) not in snapshot.airports_by_id
+            ):
+                await self.load()
+                return True
+        return False
+
+    def airport_id(self, iata_code: str) -> Optional[str]:
+        return self._snapshot.airport_ids_by_code.get(iata_code.upper())
+
+    def airport(self, airport_id) -> Optional[Dict[str, Any]]:
+        return self._snapshot.airports_by_id.get(str(airport_id))
+
+    def airline_id(self, code: str) -> Optional[str]:
+        return self._snapshot.airline_ids_by_code.get(code.upper())
+
+    def airline(self, airline_id) -> Optional[Dict[str, Any]]:
+        return self._snapshot.airlines_by_id.get(str(airline_id))
+
+    def attach(self, flight: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach airline, origin_airport and destination_airport records to a flight row"""
+        flight["airline"] = self.airline(flight["airline_id"])
+        flight["origin_airport"] = self.airport(flight["origin_airport_id"])
+        flight["destination_airport"] = self.airport(flight["destination_airport_id"])
+        return flight
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at,
+            "airports": len(snapshot.airports_by_id),
+            "airlines": len(snapshot.airlines_by_id),
+        }
+
+    async def _refresh_loop(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await self.reload_if_changed():
+                    logger.info(f"Reference data changed, now at v{self.version}")
+            except Exception as e:
+                logger.warning(f"Reference data refresh check failed: {e}")
+
+    def start_periodic_refresh(self, interval: int = REFERENCE_DATA_REFRESH_SECONDS):
+        """Start the background change check (no-op if disabled or already running)"""
+        if interval <= 0 or (self._refresh_task and not self._refresh_task.done()):
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def stop_periodic_refresh(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+# Process-wide registry used by routers and services
+reference_data = ReferenceDataRegistry()
@@ -0,0 +1,344 @@
+"""
+Connecting itinerary search over a cached route graph.
+
+The graph holds one edge per (origin, destination) pair that has an upcoming
+flight, weighted by the shortest scheduled duration on that route. A
+connection search first enumerates candidate airport paths (nonstop, one and
+two stops) from the graph, pruned by a duration lower bound, then loads the
+flights on just those edges with a single query and assembles itineraries
+with a bounded best-first search that enforces minimum and maximum
+connection times at each hub.
+
+The graph is refreshed incrementally from flights updated since the last
+refresh, and rebuilt from scratch periodically so routes that no longer
+have upcoming flights drop out.
+"""
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import AsyncSessionLocal
+from app.models import Flight
+from app.models.base import model_to_dict
+
+logger = logging.getLogger(__name__)
+
+# Age after which the graph picks up changed flights, and after which it is rebuilt from scratch
+ROUTE_GRAPH_REFRESH_SECONDS = int(os.getenv("ROUTE_GRAPH_REFRESH_SECONDS", "60"))
+ROUTE_GRAPH_REBUILD_SECONDS = int(os.getenv("ROUTE_GRAPH_REBUILD_SECONDS", "3600"))
+
+MIN_CONNECTION_MINUTES = int(os.getenv("MIN_CONNECTION_MINUTES", "45"))
+MAX_CONNECTION_MINUTES = int(os.getenv("MAX_CONNECTION_MINUTES", "360"))
+# Upper bound on door-to-door time when the caller does not give one
+MAX_ITINERARY_MINUTES = int(os.getenv("MAX_ITINERARY_MINUTES", str(36 * 60)))
+
+# Search bounds: candidate airport paths considered and partial itineraries expanded
+MAX_ROUTE_PATHS = int(os.getenv("MAX_ROUTE_PATHS", "40"))
+MAX_ITINERARY_EXPANSIONS = int(os.getenv("MAX_ITINERARY_EXPANSIONS", "20000"))
+
+Edge = Tuple[str, str]
+
+
+class RouteGraph:
+    """Adjacency of routes with upcoming flights, weighted by the shortest duration"""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._adjacency: Dict[str, Dict[str, int]] = {}
+        self._watermark: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self.built_at: Optional[datetime] = None
+        self.refreshed_at: Optional[datetime] = None
+        self.rebuilds = 0
+        self.incremental_refreshes = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.built_at is not None
+
+    def neighbours(self, airport_id: str) -> Dict[str, int]:
+        return self._adjacency.get(str(airport_id), {})
+
+    def add_routes(self, routes: Iterable[Tuple[Any, Any, int]]):
+        """Merge (origin, destination, duration) rows into the graph"""
+        for origin, destination, duration in routes:
+            edges = self._adjacency.setdefault(str(origin), {})
+            destination = str(destination)
+            if destination not in edges or duration < edges[destination]:
+                edges[destination] = duration
+
+    def _routes_query(self, since: Optional[datetime] = None):
+        query = (
+            select(
+                Flight.origin_airport_id,
+                Flight.destination_airport_id,
+                func.min(Flight.duration_minutes),
+                func.max(Flight.updated_at),
+            )
+            .where(Flight.departure_time >= func.now())
+            .group_by(Flight.origin_airport_id, Flight.destination_airport_id)
+        )
+        if since is not None:
+            query = query.where(Flight.updated_at > since)
+        return query
+
+    async def _load(self, since: Optional[datetime] = None):
+        async with self._session_factory() as session:
+            rows = (await session.execute(self._routes_query(since))).all()
+        if since is None:
+            self._adjacency = {}
+        self.add_routes((origin, destination, duration) for origin, destination, duration, _ in rows)
+        latest = max((updated_at for *_, updated_at in rows if updated_at is not None), default=None)
+        if latest is not None and (self._watermark is None or latest > self._watermark):
+            self._watermark = latest
+        return len(rows)
+
+    async def rebuild(self):
+        """Rebuild the whole graph from the flights table"""
+        async with self._lock:
+            self._watermark = None
+            routes = await self._load()
+            self.built_at = self.refreshed_at = datetime.utcnow()
+            self.rebuilds += 1
+        logger.info(f"Route graph rebuilt: {routes} routes from {len(self._adjacency)} airports")
+
+    async def refresh(self):
+        """Merge routes of flights updated since the last build or refresh"""
+        async with self._lock:
+            await self._load(since=self._watermark)
+            self.refreshed_at = datetime.utcnow()
+            self.incremental_refreshes += 1
+
+    async def ensure_fresh(self):
+        """Rebuild or incrementally refresh the graph when it is older than configured"""
+        now = datetime.utcnow()
+        if not self.is_loaded or (now - self.built_at).total_seconds() >= ROUTE_GRAPH_REBUILD_SECONDS:
+            await self.rebuild()
+        elif (now - self.refreshed_at).total_seconds() >= ROUTE_GRAPH_REFRESH_SECONDS:
+            await self.refresh()
+
+    def paths(
+        self,
+        origin_airport_id: str,
+        destination_airport_id: str,
+        max_stops: int = 2,
+        max_duration: Optional[int] = None,
+        min_connection: int = MIN_CONNECTION_MINUTES,
+        limit: int = MAX_ROUTE_PATHS,
+    ) -> List[Tuple[str, ...]]:
+        """
+        Airport sequences from origin to destination with at most max_stops
+        hubs, shortest lower-bound travel time first.
+
+        The lower bound is the sum of the fastest flight on each edge plus the
+        minimum connection time at each hub; paths whose bound exceeds
+        max_duration are never returned.
+        """
+        origin, destination = str(origin_airport_id), str(destination_airport_id)
+        found = []
+        heap = [(0, (origin,))]
+        while heap and len(found) < limit:
+            bound, path = heapq.heappop(heap)
+            if path[-1] == destination:
+                found.append(path)
+                continue
+            if len(path) > max_stops + 1:
+                continue
+            for hub, duration in self.neighbours(path[-1]).items():
+                if hub in path:
+                    continue
+                # Only the destination may be appended once the stop budget is used
+                if hub != destination and len(path) == max_stops + 1:
+                    continue
+                next_bound = bound + duration + (min_connection if len(path) > 1 else 0)
+                if max_duration is not None and next_bound > max_duration:
+                    continue
+                heapq.heappush(heap, (next_bound, path + (hub,)))
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "built_at": self.built_at,
+            "refreshed_at": self.refreshed_at,
+            "airports": len(self._adjacency),
+            "routes": sum(len(edges) for edges in self._adjacency.values()),
+            "rebuilds": self.rebuilds,
+            "incremental_refreshes": self.incremental_refreshes,
+        }
+
+
+# Process-wide graph used by connection searches
+route_graph = RouteGraph()
+
+
+class ItineraryRequest(NamedTuple):
+    """Constraints for assembling itineraries from candidate flights"""
+    departure_date: date
+    cabin_class: str = "economy"
+    sort_by: str = "price"
+    min_connection: int = MIN_CONNECTION_MINUTES
+    max_connection: int = MAX_CONNECTION_MINUTES
+    max_duration: int = MAX_ITINERARY_MINUTES
+    max_price: Optional[float] = None
+    limit: int = 20
+
+
+def _departure_day(value: datetime) -> date:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def build_itineraries(
+    paths: List[Tuple[str, ...]],
+    flights: Iterable[Dict[str, Any]],
+    request: ItineraryRequest,
+) -> List[Dict[str, Any]]:
+    """
+    Assemble the best `request.limit` itineraries along the given airport paths.
+
+    Best-first search over partial itineraries ordered by accumulated price
+    or elapsed time. Both only grow as segments are added, so completed
+    itineraries come off the heap already ranked and the search stops as soon
+    as `limit` of them are found. Partial itineraries over max_price or
+    max_duration are pruned, and at most MAX_ITINERARY_EXPANSIONS are expanded.
+    """
+    price_field = f"{request.cabin_class.replace('-', '_')}_price"
+    # Which airports may follow a given prefix of airports
+    next_hops: Dict[Tuple[str, ...], Set[str]] = {}
+    for path in paths:
+        for i in range(1, len(path)):
+            next_hops.setdefault(path[:i], set()).add(path[i])
+
+    by_edge: Dict[Edge, List[Dict[str, Any]]] = {}
+    for flight in flights:
+        if flight.get(price_field) is None:
+            continue
+        by_edge.setdefault((str(flight["origin_airport_id"]), str(flight["destination_airport_id"])), []).append(flight)
+    departures: Dict[Edge, List[datetime]] = {}
+    for edge, edge_flights in by_edge.items():
+        edge_flights.sort(key=lambda f: f["departure_time"])
+        departures[edge] = [f["departure_time"] for f in edge_flights]
+
+    min_gap = timedelta(minutes=request.min_connection)
+    max_gap = timedelta(minutes=request.max_connection)
+    max_elapsed = timedelta(minutes=request.max_duration)
+    ranked_by_price = request.sort_by == "price"
+    counter = itertools.count()
+
+    def cost(price: float, segments: Tuple[Dict[str, Any], ...]):
+        elapsed = (segments[-1]["arrival_time"] - segments[0]["departure_time"]).total_seconds()
+        return (price, elapsed) if ranked_by_price else (elapsed, price)
+
+    if not paths:
+        return []
+    origin, destination = paths[0][0], paths[0][-1]
+    heap = []
+    for hub in next_hops.get((origin,), ()):
+        for flight in by_edge.get((origin, hub), ()):
+            if _departure_day(flight["departure_time"]) != request.departure_date:
+                continue
+            price = flight[price_field]
+            segments = (flight,)
+            heapq.heappush(heap, (cost(price, segments), next(counter), price, (origin, hub), segments))
+
+    itineraries = []
+    expansions = 0
+    while heap and len(itineraries) < request.limit and expansions < MAX_ITINERARY_EXPANSIONS:
+        _, _, price, airports, segments = heapq.heappop(heap)
+        if request.max_price is not None and price > request.max_price:
+            continue
+        if segments[-1]["arrival_time"] - segments[0]["departure_time"] > max_elapsed:
+            continue
+        if airports[-1] == destination:
+            itineraries.append(_itinerary(segments, price))
+            continue
+
+        expansions += 1
+        arrival = segments[-1]["arrival_time"]
+        for hub in next_hops.get(airports, ()):
+            edge = (airports[-1], hub)
+            times = departures.get(edge)
+            if not times:
+                continue
+            start = bisect.bisect_left(times, arrival + min_gap)
+            end = bisect.bisect_right(times, arrival + max_gap)
+            for flight in by_edge[edge][start:end]:
+                next_price = price + flight[price_field]
+                next_segments = segments + (flight,)
+                heapq.heappush(
+                    heap, (cost(next_price, next_segments), next(counter), next_price, airports + (hub,), next_segments)
+                )
+    return itineraries
+
+
+def _itinerary(segments: Tuple[Dict[str, Any], ...], price: float) -> Dict[str, Any]:
+    departure, arrival = segments[0]["departure_time"], segments[-1]["arrival_time"]
+    return {
+        "segments": list(segments),
+        "stops": len(segments) - 1,
+        "total_price": round(price, 2),
+        "total_duration_minutes": int((arrival - departure).total_seconds() // 60),
+        "departure_time": departure,
+        "arrival_time": arrival,
+    }
+
+
+def build_connection_flights_query(
+    edges: Iterable[Edge],
+    departure_date: date,
+    cabin_class: str,
+    total_passengers: int,
+    max_duration: int = MAX_ITINERARY_MINUTES,
+):
+    """
+    Load every bookable flight on the candidate edges that can be part of an
+    itinerary leaving on departure_date, in one query.
+    """
+    price_column = getattr(Flight, f"{cabin_class.replace('-', '_')}_price")
+    availability_column = getattr(Flight, f"{cabin_class.replace('-', '_')}_available")
+    start = datetime.combine(departure_date, datetime.min.time(), tzinfo=timezone.utc)
+    end = start + timedelta(days=1, minutes=max_duration)
+
+    query = select(Flight).where(
+        tuple_(Flight.origin_airport_id, Flight.destination_airport_id).in_(sorted(edges)),
+        Flight.departure_time >= start,
+        Flight.departure_time < end,
+        Flight.status != "cancelled",
+        price_column.is_not(None),
+    )
+    if total_passengers > 0:
+        query = query.where(availability_column >= total_passengers)
+    return query
+
+
+async def find_itineraries(
+    db: AsyncSession,
+    origin_airport_id: str,
+    destination_airport_id: str,
+    request: ItineraryRequest,
+    total_passengers: int,
+    max_stops: int = 2,
+) -> List[Dict[str, Any]]:
+    """Candidate paths from the route graph, one flights query, then best-first assembly"""
+    await route_graph.ensure_fresh()
+    paths = route_graph.paths(
+        origin_airport_id, destination_airport_id, max_stops, request.max_duration, request.min_connection
+    )
+    if not paths:
+        return []
+    edges = {(path[i], path[i + 1]) for path in paths for i in range(len(path) - 1)}
+    query = build_connection_flights_query(
+        edges, request.departure_date, request.cabin_class, total_passengers, request.max_duration
+    )
+    result = await db.execute(query)
+    flights = [model_to_dict(f) for f in result.scalars()]
+    return build_itineraries(paths, flights, request)
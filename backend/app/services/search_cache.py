@@ -0,0 +1,172 @@
+"""
+TTL + LRU cache for flight search results.
+
+Entries are stored per search leg, keyed on the normalized leg parameters
+(resolved airport/airline ids, day, cabin, passenger count, filters and sort)
+and tagged with the (origin_airport_id, destination_airport_id, day) they
+cover. Seat and status changes invalidate only the tags of the flights they
+touch instead of flushing the whole cache.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from app.services import inventory_events
+from app.services.inventory_events import FlightChange
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "60"))
+
+Tag = Tuple[str, str, str]
+
+
+def route_tag(origin_airport_id, destination_airport_id, departure) -> Tag:
+    """Build the (origin, destination, YYYY-MM-DD) tag for a route and day"""
+    if isinstance(departure, str):
+        departure = datetime.fromisoformat(departure.replace("Z", "+00:00"))
+    if isinstance(departure, datetime):
+        if departure.tzinfo is not None:
+            departure = departure.astimezone(timezone.utc)
+        departure = departure.date()
+    return (str(origin_airport_id), str(destination_airport_id), departure.isoformat())
+
+
+class SearchResultCache:
+    """Bounded, tag-invalidated cache of search leg results"""
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Dict[str, Any]], Set[Tag]]]" = OrderedDict()
+        self._keys_by_tag: Dict[Tag, Set[Hashable]] = {}
+        self._keys_by_flight: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[List[Dict[str, Any]]]:
+        """Return a copy of the cached rows for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, rows, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers annotate rows (e.g. is_return), so hand out shallow copies
+        return [dict(row) for row in rows]
+
+    def set(self, key: Hashable, rows: List[Dict[str, Any]], tags: Iterable[Tag]):
+        """Store rows under key, evicting the least recently used entries when full"""
+        if not self.enabled:
+            return
+        tags = set(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, [dict(row) for row in rows], tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            for row in rows:
+                self._keys_by_flight.setdefault(str(row["id"]), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, rows, tags = self._entries.pop(key)
+        for index, bucket in ((self._keys_by_tag, tags), (self._keys_by_flight, [str(row["id"]) for row in rows])):
+            for name in bucket:
+                keys = index.get(name)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[name]
+
+    def _invalidate_keys(self, keys: Iterable[Hashable]) -> int:
+        dropped = 0
+        for key in list(keys):
+            if key in self._entries:
+                self._remove(key)
+                dropped += 1
+        self.invalidations += dropped
+        return dropped
+
+    def invalidate_tags(self, tags: Iterable[Tag]) -> int:
+        """Drop every entry carrying any of the given tags; returns the number dropped"""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._keys_by_tag.get(tag, set())
+            return self._invalidate_keys(keys)
+
+    def invalidate_flight(self, flight: Dict[str, Any]) -> int:
+        """
+        Invalidate the searches a flight can appear in.
+
+        Uses the flight's route and departure day when the row carries them, so
+        searches that filtered the flight out are refreshed too; entries that
+        contain the flight are always dropped.
+        """
+        flight_id = str(flight.get("id") or flight.get("flight_id"))
+        with self._lock:
+            keys = set(self._keys_by_flight.get(flight_id, set()))
+            if flight.get("origin_airport_id") and flight.get("destination_airport_id") and flight.get("departure_time"):
+                tag = route_tag(flight["origin_airport_id"], flight["destination_airport_id"], flight["departure_time"])
+                keys |= self._keys_by_tag.get(tag, set())
+            dropped = self._invalidate_keys(keys)
+        if dropped:
+            logger.debug(f"Invalidated {dropped} cached searches for flight {flight_id}")
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._keys_by_flight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# Process-wide cache used by the search engine
+search_cache = SearchResultCache()
+
+
+def _on_flight_change(change: FlightChange):
+    search_cache.invalidate_flight(change.flight)
+
+
+inventory_events.subscribe(_on_flight_change)
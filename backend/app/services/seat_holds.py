@@ -0,0 +1,236 @@
+"""
+Time-limited seat holds.
+
+A new booking takes its seats straight away but stays `pending` until it is
+paid for, with `hold_expires_at` as the deadline. A successful payment
+converts the hold (the booking becomes `confirmed`); a hold that runs out, or
+a booking that is cancelled, gives its seats back to the flights.
+
+Expired holds are returned by a background reaper in batches. Each batch is a
+fixed handful of set-based statements however many bookings it covers, and
+the bookings are claimed with FOR UPDATE SKIP LOCKED so several workers can
+reap at once without returning the same seats twice.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import AsyncSessionLocal
+from app.models import Booking, BookingFlight, Passenger
+from app.models.base import model_to_dict
+from app.services.booking_cache import booking_cache
+from app.services.seat_inventory import SeatRequest, SeatReservation, publish_seat_changes, release_seats
+
+logger = logging.getLogger(__name__)
+
+# How long a pending booking keeps its seats; 0 confirms bookings immediately
+SEAT_HOLD_TTL_SECONDS = int(os.getenv("SEAT_HOLD_TTL_SECONDS", "900"))
+# Seconds between reaper passes; 0 disables the background reaper
+SEAT_HOLD_REAPER_INTERVAL_SECONDS = int(os.getenv("SEAT_HOLD_REAPER_INTERVAL_SECONDS", "30"))
+# Bookings released per reaper transaction
+SEAT_HOLD_REAPER_BATCH_SIZE = int(os.getenv("SEAT_HOLD_REAPER_BATCH_SIZE", "500"))
+
+
+def hold_deadline(ttl_seconds: int = SEAT_HOLD_TTL_SECONDS):
+    """SQL expression for the expiry of a hold taken now, or None when holds are disabled"""
+    if ttl_seconds <= 0:
+        return None
+    return func.now() + timedelta(seconds=ttl_seconds)
+
+
+async def booked_seats(
+    session: AsyncSession,
+    booking_ids: Iterable[uuid.UUID],
+    exclude_flights: Iterable[uuid.UUID] = (),
+) -> List[SeatRequest]:
+    """Seats taken by the given bookings, summed per flight and cabin class, leaving out `exclude_flights`"""
+    query = (
+        select(BookingFlight.flight_id, Passenger.cabin_class, func.count(Passenger.id))
+        .join(Passenger, Passenger.booking_id == BookingFlight.booking_id)
+        .where(BookingFlight.booking_id.in_(list(booking_ids)))
+        .group_by(BookingFlight.flight_id, Passenger.cabin_class)
+    )
+    exclude_flights = list(exclude_flights)
+    if exclude_flights:
+        query = query.where(BookingFlight.flight_id.notin_(exclude_flights))
+    result = await session.execute(query)
+    return [SeatRequest(str(flight_id), cabin_class, seats) for flight_id, cabin_class, seats in result.all()]
+
+
+async def cancel_bookings(
+    session: AsyncSession,
+    condition,
+    limit: Optional[int] = None,
+    skip_locked: bool = False,
+    exclude_flights: Iterable[uuid.UUID] = (),
+) -> Tuple[List[Dict[str, Any]], List[SeatReservation]]:
+    """
+    Cancel the bookings matching `condition` and return their seats, inside
+    the caller's transaction
+
+    Only bookings that still hold seats (anything not already cancelled) are
+    touched, so a booking can never give its seats back twice. Seats on
+    `exclude_flights` are not returned.
+
+    Returns:
+        The cancelled bookings and the seats returned to each flight
+    """
+    targets = (
+        select(Booking.id)
+        .where(and_(Booking.status != "cancelled", condition))
+        .with_for_update(skip_locked=skip_locked)
+    )
+    if limit:
+        targets = targets.order_by(Booking.hold_expires_at).limit(limit)
+
+    result = await session.execute(
+        update(Booking)
+        .where(Booking.id.in_(targets.scalar_subquery()))
+        .values(status="cancelled", hold_expires_at=None)
+        .returning(Booking)
+        .execution_options(synchronize_session=False)
+    )
+    bookings = [model_to_dict(booking) for booking in result.scalars().all()]
+    if not bookings:
+        return [], []
+
+    seats = await booked_seats(session, [uuid.UUID(booking["id"]) for booking in bookings], exclude_flights)
+    return bookings, await release_seats(session, seats)
+
+
+async def cancel_booking(
+    booking_id: str,
+    user_id: Optional[str] = None,
+    session_factory=AsyncSessionLocal,
+) -> Optional[Dict[str, Any]]:
+    """
+    Cancel one booking and return its seats in a single transaction
+
+    Returns:
+        The cancelled booking, or None if it does not exist, belongs to another
+        user or was already cancelled
+    """
+    conditions = [Booking.id == uuid.UUID(str(booking_id))]
+    if user_id:
+        conditions.append(Booking.user_id == uuid.UUID(str(user_id)))
+
+    async with session_factory() as session:
+        async with session.begin():
+            bookings, released = await cancel_bookings(session, and_(*conditions))
+    booking_cache.invalidate(booking["id"] for booking in bookings)
+    publish_seat_changes(released)
+    return bookings[0] if bookings else None
+
+
+async def convert_hold(booking_id: str, session_factory=AsyncSessionLocal) -> bool:
+    """
+    Turn a pending booking's hold into a confirmed booking
+
+    Returns:
+        True if the hold was converted, False if the booking was already confirmed
+
+    Raises:
+        HTTPException 409 if the hold expired or the booking was cancelled
+    """
+    booking_uuid = uuid.UUID(str(booking_id))
+    async with session_factory() as session:
+        async with session.begin():
+            result = await session.execute(
+                update(Booking)
+                .where(
+                    Booking.id == booking_uuid,
+                    Booking.status == "pending",
+                    or_(Booking.hold_expires_at.is_(None), Booking.hold_expires_at > func.now()),
+                )
+                .values(status="confirmed", hold_expires_at=None)
+                .returning(Booking.id)
+                .execution_options(synchronize_session=False)
+            )
+            converted = result.first() is not None
+            if not converted:
+                current_status = (await session.execute(
+                    select(Booking.status).where(Booking.id == booking_uuid)
+                )).scalar_one_or_none()
+
+    if converted:
+        booking_cache.invalidate([booking_id])
+        return True
+    if current_status == "confirmed":
+        return False
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"The seat hold for booking {booking_id} has expired; please book again",
+    )
+
+
+async def reap_expired_holds(
+    batch_size: int = SEAT_HOLD_REAPER_BATCH_SIZE,
+    session_factory=AsyncSessionLocal,
+) -> int:
+    """Cancel one batch of pending bookings whose hold expired and return their seats"""
+    async with session_factory() as session:
+        async with session.begin():
+            bookings, released = await cancel_bookings(
+                session,
+                and_(Booking.status == "pending", Booking.hold_expires_at <= func.now()),
+                limit=batch_size,
+                skip_locked=True,
+            )
+    booking_cache.invalidate(booking["id"] for booking in bookings)
+    publish_seat_changes(released)
+    return len(bookings)
+
+
+class SeatHoldReaper:
+    """Background task that keeps returning expired holds"""
+
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size: int = SEAT_HOLD_REAPER_BATCH_SIZE):
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Reap batches until a batch comes back short; returns the bookings released"""
+        total = 0
+        while True:
+            reaped = await reap_expired_holds(self._batch_size, self._session_factory)
+            total += reaped
+            if reaped < self._batch_size:
+                break
+        if total:
+            logger.info(f"Released seats of {total} bookings whose hold expired")
+        return total
+
+    async def _loop(self, interval: int):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"Seat hold reaper pass failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: int = SEAT_HOLD_REAPER_INTERVAL_SECONDS):
+        """Start the reaper (no-op if disabled or already running)"""
+        if interval <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Process-wide reaper started with the application
+seat_hold_reaper = SeatHoldReaper()
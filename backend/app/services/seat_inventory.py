@@ -0,0 +1,278 @@
+"""
+Atomic seat inventory.
+
+Seats are taken with one conditional statement per flight leg:
+
+    UPDATE flights SET economy_available = economy_available - :n
+    WHERE id = :flight_id AND economy_available >= :n
+    RETURNING ...
+
+The check and the write are a single row update, so concurrent bookings can
+never oversell, and every leg of a booking is reserved inside the same
+transaction: if any leg is short of seats the transaction is rolled back and
+no other leg keeps a deduction. Legs are always locked in flight id order so
+two multi-leg bookings cannot deadlock on each other.
+
+Returning seats cannot fail for lack of inventory, so it is set-based: one
+UPDATE ... FROM (VALUES ...) per cabin class covers any number of flights.
+
+Hot flights can be switched to striped counters (see seat_stripes); their
+legs are taken from and returned to the stripes instead of the flights row.
+"""
+import logging
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, column as sql_column, select, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import AsyncSessionLocal
+from app.models import Flight
+from app.services import inventory_events, seat_stripes
+from app.services.idempotency import transient
+from app.services.seat_stripes import striped_flight
+
+logger = logging.getLogger(__name__)
+
+
+class SeatRequest(NamedTuple):
+    """Seats wanted on one flight leg"""
+    flight_id: str
+    cabin_class: str
+    seats: int
+    is_return: bool = False
+
+    @property
+    def availability_field(self) -> str:
+        return f"{self.cabin_class.replace('-', '_')}_available"
+
+
+class SeatReservation(NamedTuple):
+    """A leg whose seats were taken (or returned), with the resulting availability"""
+    request: SeatRequest
+    flight: Dict[str, Any]
+    remaining: int
+
+
+def _flight_uuid(flight_id: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(str(flight_id))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Flight with ID {flight_id} not found")
+
+
+def seat_adjustment_statement(request: SeatRequest, delta: int):
+    """
+    UPDATE ... SET <cabin>_available = <cabin>_available + delta RETURNING.
+    Negative deltas only match rows that still have enough seats.
+    """
+    column = getattr(Flight, request.availability_field)
+    # Striped flights keep their counts in flight_seat_stripes instead
+    query = update(Flight).where(Flight.id == _flight_uuid(request.flight_id), Flight.seat_stripes == 0)
+    if delta < 0:
+        query = query.where(column >= -delta)
+    return (
+        query.values({request.availability_field: column + delta})
+        .returning(
+            Flight.id,
+            Flight.flight_number,
+            Flight.origin_airport_id,
+            Flight.destination_airport_id,
+            Flight.departure_time,
+            column,
+        )
+        # Nothing in the session needs refreshing; skip the ORM bookkeeping
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _row_to_flight(row) -> Dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "flight_number": row.flight_number,
+        "origin_airport_id": str(row.origin_airport_id),
+        "destination_airport_id": str(row.destination_airport_id),
+        "departure_time": row.departure_time,
+    }
+
+
+def _shortage_error(request: SeatRequest, flight_number: str, available: int) -> HTTPException:
+    flight_type = "return" if request.is_return else "outbound"
+    # Seats may free up, so a retry must not be answered from the idempotency store
+    return transient(HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=(
+            f"Not enough {request.cabin_class} seats available for {flight_type} flight {flight_number}. "
+            f"Available: {available or 0}, Requested: {request.seats}"
+        ),
+    ))
+
+
+async def _reserve_striped(
+    session: AsyncSession, request: SeatRequest, flight: Dict[str, Any]
+) -> Tuple[Optional[SeatReservation], int]:
+    """Take the leg's seats from the flight's stripes; returns the reservation (or None) and availability"""
+    take = await seat_stripes.take_seats(
+        session, _flight_uuid(request.flight_id), request.availability_field, request.seats, flight["seat_stripes"]
+    )
+    if not take.taken:
+        return None, take.available
+    route = {key: value for key, value in flight.items() if key != "seat_stripes"}
+    return SeatReservation(request, route, take.available), take.available
+
+
+async def _reserve_after_miss(session: AsyncSession, request: SeatRequest) -> SeatReservation:
+    """
+    Work out why the single-row decrement matched nothing: a missing flight,
+    a striped flight (then take from its stripes) or a genuine shortage
+    """
+    column = getattr(Flight, request.availability_field)
+    row = (await session.execute(
+        select(
+            Flight.id,
+            Flight.flight_number,
+            Flight.origin_airport_id,
+            Flight.destination_airport_id,
+            Flight.departure_time,
+            Flight.seat_stripes,
+            column,
+        ).where(Flight.id == _flight_uuid(request.flight_id))
+    )).first()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Flight with ID {request.flight_id} not found"
+        )
+
+    flight = _row_to_flight(row)
+    seat_stripes.remember_striped(flight, row.seat_stripes)
+    if not row.seat_stripes:
+        raise _shortage_error(request, row.flight_number, row[-1])
+
+    reservation, available = await _reserve_striped(session, request, striped_flight(flight["id"]))
+    if reservation is None:
+        raise _shortage_error(request, row.flight_number, available)
+    return reservation
+
+
+async def reserve_seats(session: AsyncSession, requests: Iterable[SeatRequest]) -> List[SeatReservation]:
+    """
+    Take seats for every leg inside the caller's transaction.
+
+    Raises a 400 HTTPException as soon as one leg cannot be satisfied; the
+    caller must then roll back so earlier legs are released with it.
+    """
+    reservations = []
+    for request in sorted(requests, key=lambda r: str(r.flight_id)):
+        # Flights already known to be striped go straight to their stripes
+        striped = striped_flight(request.flight_id)
+        if striped:
+            reservation, _ = await _reserve_striped(session, request, striped)
+            if reservation:
+                reservations.append(reservation)
+                continue
+
+        result = await session.execute(seat_adjustment_statement(request, -request.seats))
+        row = result.first()
+        if row is None:
+            reservations.append(await _reserve_after_miss(session, request))
+            continue
+        flight = _row_to_flight(row)
+        if striped:
+            # The flight has been switched back to single-row counters
+            seat_stripes.remember_striped(flight, 0)
+        reservations.append(SeatReservation(request, flight, row[-1]))
+    return reservations
+
+
+def seat_return_statement(availability_field: str, seats_by_flight: Dict[str, int]):
+    """
+    Set-based UPDATE ... FROM (VALUES ...) RETURNING that adds seats back to
+    every listed flight in one statement
+    """
+    column = getattr(Flight, availability_field)
+    returned = values(
+        sql_column("flight_id", UUID(as_uuid=True)), sql_column("seats", Integer), name="returned_seats"
+    ).data([(_flight_uuid(flight_id), seats) for flight_id, seats in sorted(seats_by_flight.items())])
+    return (
+        update(Flight)
+        .where(Flight.id == returned.c.flight_id, Flight.seat_stripes == 0)
+        .values({availability_field: column + returned.c.seats})
+        .returning(
+            Flight.id,
+            Flight.flight_number,
+            Flight.origin_airport_id,
+            Flight.destination_airport_id,
+            Flight.departure_time,
+            column,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def release_seats(session: AsyncSession, requests: Iterable[SeatRequest]) -> List[SeatReservation]:
+    """
+    Return seats for every leg inside the caller's transaction; unknown flights are skipped
+
+    Legs are summed per flight and cabin, and each cabin class is returned with
+    a single statement however many flights are involved.
+    """
+    by_field: Dict[str, Dict[str, SeatRequest]] = defaultdict(dict)
+    for request in requests:
+        legs = by_field[request.availability_field]
+        flight_id = str(_flight_uuid(request.flight_id))
+        if flight_id in legs:
+            request = legs[flight_id]._replace(seats=legs[flight_id].seats + request.seats)
+        legs[flight_id] = request
+
+    released = []
+    for availability_field, legs in sorted(by_field.items()):
+        seats_by_flight = {flight_id: request.seats for flight_id, request in legs.items()}
+        result = await session.execute(seat_return_statement(availability_field, seats_by_flight))
+        for row in result.all():
+            flight = _row_to_flight(row)
+            released.append(SeatReservation(legs.pop(flight["id"]), flight, row[-1]))
+        if legs:
+            # Whatever is left is either striped or gone
+            result = await session.execute(seat_stripes.stripe_return_statement(
+                availability_field, {uuid.UUID(flight_id): request.seats for flight_id, request in legs.items()}
+            ))
+            for row in result.all():
+                flight = _row_to_flight(row)
+                released.append(SeatReservation(legs.pop(flight["id"]), flight, row[-1]))
+        for flight_id in legs:
+            logger.warning(f"Cannot return seats to missing flight {flight_id}")
+    return released
+
+
+def publish_seat_changes(reservations: Iterable[SeatReservation]):
+    """Notify caches of new availability; call only after the transaction committed"""
+    for reservation in reservations:
+        inventory_events.publish_seat_change(
+            reservation.flight, reservation.request.availability_field, reservation.remaining
+        )
+
+
+async def reserve(requests: Iterable[SeatRequest], session_factory=AsyncSessionLocal) -> List[SeatReservation]:
+    """Reserve all legs in a transaction of their own and commit"""
+    async with session_factory() as session:
+        async with session.begin():
+            reservations = await reserve_seats(session, requests)
+    publish_seat_changes(reservations)
+    for reservation in reservations:
+        logger.info(
+            f"Reserved {reservation.request.seats} {reservation.request.cabin_class} seats on flight "
+            f"{reservation.flight['id']}. New availability: {reservation.remaining}"
+        )
+    return reservations
+
+
+async def release(requests: Iterable[SeatRequest], session_factory=AsyncSessionLocal) -> List[SeatReservation]:
+    """Return seats for all legs in a transaction of their own and commit"""
+    async with session_factory() as session:
+        async with session.begin():
+            released = await release_seats(session, requests)
+    publish_seat_changes(released)
+    return released
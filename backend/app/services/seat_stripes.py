@@ -0,0 +1,352 @@
+"""
+Striped seat counters for hot flights.
+
+Normally a flight's availability lives in its `*_available` columns and every
+booking decrements that one row, so concurrent bookings on the same flight
+queue up on its row lock. A striped flight instead splits each cabin's
+availability across `seat_stripes` rows of flight_seat_stripes. A booking
+decrements one randomly chosen stripe (skipping stripes that other
+transactions hold locked) and spills over to the others when that stripe
+runs short, so up to K bookings proceed in parallel.
+
+The stripes are authoritative while a flight is striped. Direct availability
+reads sum them, and a background task folds the totals back into the flights
+columns every STRIPED_SEATS_SYNC_SECONDS so search and the caches stay close.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, column as sql_column, delete, func, insert, select, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.database.database import AsyncSessionLocal
+from app.models import Flight, FlightSeatStripe
+from app.services import inventory_events
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_FIELDS = ("economy_available", "premium_economy_available", "business_available", "first_available")
+MAX_SEAT_STRIPES = 64
+
+# Seconds between folding stripe totals into flights; 0 disables the background sync
+STRIPED_SEATS_SYNC_SECONDS = float(os.getenv("STRIPED_SEATS_SYNC_SECONDS", "2"))
+
+# Route details of flights this process has seen striped, so bookings on them
+# go to the stripes first. A stale entry only costs one extra statement.
+_striped_flights: Dict[str, Dict[str, Any]] = {}
+
+
+class StripeTake(NamedTuple):
+    """Outcome of taking seats from a striped cabin"""
+    taken: bool
+    # Seats left after the take, or seats available when it failed
+    available: int
+
+
+def striped_flight(flight_id: str) -> Optional[Dict[str, Any]]:
+    """Route details and stripe count of a flight known to be striped, if any"""
+    return _striped_flights.get(str(flight_id))
+
+
+def remember_striped(flight: Dict[str, Any], stripes: int):
+    if stripes > 0:
+        _striped_flights[str(flight["id"])] = {**flight, "seat_stripes": stripes}
+    else:
+        _striped_flights.pop(str(flight["id"]), None)
+
+
+def split_seats(total: int, stripes: int) -> List[int]:
+    """Spread `total` seats as evenly as possible over `stripes` counters"""
+    base, extra = divmod(total, stripes)
+    return [base + (1 if index < extra else 0) for index in range(stripes)]
+
+
+def _stripes_of(flight_uuid: uuid.UUID, availability_field: str, table=FlightSeatStripe):
+    return (table.flight_id == flight_uuid, table.availability_field == availability_field)
+
+
+def stripe_decrement_statement(flight_uuid: uuid.UUID, availability_field: str, seats: int, start: int):
+    """
+    Take seats from the first stripe at or after `start` (wrapping around)
+    that has enough of them and is not locked by another booking
+    """
+    # Aliased so the subqueries scan the stripes rather than correlate to the updated row
+    other = aliased(FlightSeatStripe)
+    candidate = (
+        select(other.stripe)
+        .where(*_stripes_of(flight_uuid, availability_field, other), other.available >= seats)
+        .order_by((other.stripe >= start).desc(), other.stripe)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    # Evaluated against the snapshot before this update, so it is the pre-take total
+    total = (
+        select(func.sum(other.available))
+        .where(*_stripes_of(flight_uuid, availability_field, other))
+        .scalar_subquery()
+    )
+    return (
+        update(FlightSeatStripe)
+        .where(
+            *_stripes_of(flight_uuid, availability_field),
+            FlightSeatStripe.stripe == candidate,
+            FlightSeatStripe.available >= seats,
+        )
+        .values(available=FlightSeatStripe.available - seats)
+        .returning(FlightSeatStripe.stripe, total)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def take_seats(
+    session: AsyncSession, flight_uuid: uuid.UUID, availability_field: str, seats: int, stripes: int
+) -> StripeTake:
+    """
+    Take seats from a striped cabin inside the caller's transaction
+
+    The common case is one statement touching one stripe. Only when no single
+    unlocked stripe can cover the request are all stripes locked and the seats
+    gathered across them.
+    """
+    start = random.randrange(max(stripes, 1))
+    row = (await session.execute(
+        stripe_decrement_statement(flight_uuid, availability_field, seats, start)
+    )).first()
+    if row is not None:
+        return StripeTake(True, row[1] - seats)
+
+    # Spill over: lock every stripe of the cabin and take from as many as needed
+    rows = (await session.execute(
+        select(FlightSeatStripe.stripe, FlightSeatStripe.available)
+        .where(*_stripes_of(flight_uuid, availability_field))
+        .order_by(FlightSeatStripe.stripe)
+        .with_for_update()
+    )).all()
+    total = sum(available for _, available in rows)
+    if total < seats:
+        return StripeTake(False, total)
+
+    needed = seats
+    for stripe, available in rows:
+        taken = min(available, needed)
+        if taken:
+            await session.execute(
+                update(FlightSeatStripe)
+                .where(*_stripes_of(flight_uuid, availability_field), FlightSeatStripe.stripe == stripe)
+                .values(available=FlightSeatStripe.available - taken)
+                .execution_options(synchronize_session=False)
+            )
+            needed -= taken
+        if not needed:
+            break
+    return StripeTake(True, total - seats)
+
+
+def stripe_return_statement(availability_field: str, seats_by_flight: Dict[uuid.UUID, int]):
+    """
+    Set-based return of seats to stripe 0 of every listed striped flight,
+    returning the flight's route and its new total
+    """
+    returned = values(
+        sql_column("flight_id", UUID(as_uuid=True)), sql_column("seats", Integer), name="returned_seats"
+    ).data(sorted(seats_by_flight.items()))
+    other = aliased(FlightSeatStripe)
+    total = (
+        select(func.sum(other.available))
+        .where(other.flight_id == returned.c.flight_id, other.availability_field == availability_field)
+        .correlate(returned)
+        .scalar_subquery()
+    )
+    return (
+        update(FlightSeatStripe)
+        .where(
+            FlightSeatStripe.flight_id == returned.c.flight_id,
+            FlightSeatStripe.availability_field == availability_field,
+            FlightSeatStripe.stripe == 0,
+            Flight.id == FlightSeatStripe.flight_id,
+        )
+        .values(available=FlightSeatStripe.available + returned.c.seats)
+        .returning(
+            Flight.id,
+            Flight.flight_number,
+            Flight.origin_airport_id,
+            Flight.destination_airport_id,
+            Flight.departure_time,
+            total + returned.c.seats,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def set_stripes(flight_id: str, stripes: int, session_factory=AsyncSessionLocal) -> Dict[str, Any]:
+    """
+    Switch a flight into striped mode with `stripes` counters per cabin, or
+    back to single-row counters with 0
+
+    The current availability (from the row or from existing stripes) is
+    redistributed, so switching never changes how many seats are for sale.
+    """
+    if not 0 <= stripes <= MAX_SEAT_STRIPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"stripes must be between 0 and {MAX_SEAT_STRIPES}",
+        )
+    try:
+        flight_uuid = uuid.UUID(str(flight_id))
+    except ValueError:
+        flight_uuid = None
+
+    async with session_factory() as session:
+        async with session.begin():
+            flight = None
+            if flight_uuid:
+                flight = (await session.execute(
+                    select(Flight).where(Flight.id == flight_uuid).with_for_update()
+                )).scalar_one_or_none()
+            if flight is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Flight with ID {flight_id} not found")
+
+            # Bookings in flight on the stripes finish before we redistribute them
+            existing = (await session.execute(
+                select(FlightSeatStripe).where(FlightSeatStripe.flight_id == flight_uuid).with_for_update()
+            )).scalars().all()
+            totals = {field: getattr(flight, field) for field in AVAILABILITY_FIELDS}
+            if existing:
+                totals.update({field: 0 for field in {stripe.availability_field for stripe in existing}})
+                for stripe in existing:
+                    totals[stripe.availability_field] += stripe.available
+
+            await session.execute(delete(FlightSeatStripe).where(FlightSeatStripe.flight_id == flight_uuid))
+            if stripes:
+                await session.execute(insert(FlightSeatStripe), [
+                    {"flight_id": flight_uuid, "availability_field": field, "stripe": index, "available": seats}
+                    for field, total in totals.items() if total is not None
+                    for index, seats in enumerate(split_seats(total, stripes))
+                ])
+            await session.execute(
+                update(Flight)
+                .where(Flight.id == flight_uuid)
+                .values(seat_stripes=stripes, **totals)
+                .execution_options(synchronize_session=False)
+            )
+            flight_info = {
+                "id": str(flight.id),
+                "flight_number": flight.flight_number,
+                "origin_airport_id": str(flight.origin_airport_id),
+                "destination_airport_id": str(flight.destination_airport_id),
+                "departure_time": flight.departure_time,
+            }
+
+    remember_striped(flight_info, stripes)
+    inventory_events.publish(inventory_events.FlightChange(flight=flight_info, available=totals))
+    logger.info(f"Flight {flight_id} now uses {stripes or 'single-row'} seat counters")
+    return {"flight_id": str(flight_uuid), "seat_stripes": stripes, **totals}
+
+
+async def flight_availability(session: AsyncSession, flight_id: str) -> Optional[Dict[str, Any]]:
+    """Current availability of one flight, summing the stripes when it is striped"""
+    try:
+        flight_uuid = uuid.UUID(str(flight_id))
+    except ValueError:
+        return None
+    row = (await session.execute(
+        select(Flight.seat_stripes, Flight.updated_at, *(getattr(Flight, field) for field in AVAILABILITY_FIELDS))
+        .where(Flight.id == flight_uuid)
+    )).first()
+    if row is None:
+        return None
+
+    availability = {"flight_id": str(flight_uuid), "updated_at": row.updated_at}
+    availability.update({field: getattr(row, field) for field in AVAILABILITY_FIELDS})
+    if row.seat_stripes:
+        result = await session.execute(
+            select(FlightSeatStripe.availability_field, func.sum(FlightSeatStripe.available))
+            .where(FlightSeatStripe.flight_id == flight_uuid)
+            .group_by(FlightSeatStripe.availability_field)
+        )
+        availability.update({field: int(total) for field, total in result.all()})
+    return availability
+
+
+async def sync_striped_totals(session_factory=AsyncSessionLocal) -> int:
+    """
+    Copy stripe totals into the flights columns where they differ, one
+    statement per cabin for all striped flights; returns the columns changed
+    """
+    changed = 0
+    async with session_factory() as session:
+        async with session.begin():
+            for field in AVAILABILITY_FIELDS:
+                column = getattr(Flight, field)
+                totals = (
+                    select(FlightSeatStripe.flight_id, func.sum(FlightSeatStripe.available).label("total"))
+                    .where(FlightSeatStripe.availability_field == field)
+                    .group_by(FlightSeatStripe.flight_id)
+                    .subquery()
+                )
+                result = await session.execute(
+                    update(Flight)
+                    .where(Flight.id == totals.c.flight_id, column.is_distinct_from(totals.c.total))
+                    .values({field: totals.c.total})
+                    .returning(
+                        Flight.id,
+                        Flight.origin_airport_id,
+                        Flight.destination_airport_id,
+                        Flight.departure_time,
+                        column,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                for row in result.all():
+                    flight = {
+                        "id": str(row.id),
+                        "origin_airport_id": str(row.origin_airport_id),
+                        "destination_airport_id": str(row.destination_airport_id),
+                        "departure_time": row.departure_time,
+                    }
+                    inventory_events.publish_seat_change(flight, field, row[-1])
+                    changed += 1
+    return changed
+
+
+class StripedTotalsSync:
+    """Background task that keeps flights columns in step with their stripes"""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await sync_striped_totals(self._session_factory)
+            except Exception as e:
+                logger.warning(f"Striped seat total sync failed: {e}")
+
+    def start(self, interval: float = STRIPED_SEATS_SYNC_SECONDS):
+        """Start the sync (no-op if disabled or already running)"""
+        if interval <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Process-wide sync started with the application
+striped_totals_sync = StripedTotalsSync()
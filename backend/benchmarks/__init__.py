@@ -0,0 +1,11 @@
+"""
+Benchmark tooling for the flight booking backend.
+
+- `benchmarks.inventory`: deterministic synthetic airports, airlines and
+  flights at production-like scale, bulk loaded with COPY.
+- `benchmarks.harness`: HTTP load harness for search, flight detail,
+  availability and booking creation at fixed concurrency levels, writing
+  JSON results that can be compared between runs.
+
+Run `python -m benchmarks --help` from the backend directory.
+"""
@@ -0,0 +1,194 @@
+"""
+Benchmark command line.
+
+    python -m benchmarks generate --airports 2000 --airlines 200 --days 365 --reset
+    python -m benchmarks hot-flight --workers 64 --attempts 5000 --stripes 16
+    python -m benchmarks booking-load --flights 4 --bookings 5000 --concurrency 200 --pipeline
+    python -m benchmarks auth --token "$TOKEN"
+    python -m benchmarks run --base-url http://localhost:8000 --concurrency 1 8 32 \
+        --output results/baseline.json
+
+All commands read POSTGRES_URL from the environment (or .env); auth reads
+the Supabase settings instead.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import date
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+load_dotenv()
+
+from benchmarks.auth_verification import compare_verification  # noqa: E402
+from benchmarks.booking_load import booking_load_benchmark, pick_flights, pipeline_comparison  # noqa: E402
+from benchmarks.harness import SCENARIOS, load_workload, report, run_benchmarks  # noqa: E402
+from benchmarks.inventory import InventoryConfig, load_inventory, postgres_dsn  # noqa: E402
+from benchmarks.seat_contention import compare_striped, hot_flight_benchmark, pick_hot_flight  # noqa: E402
+
+
+def write_output(document: dict, output: str):
+    text = json.dumps(document, indent=2, default=str)
+    if output == "-":
+        print(text)
+        return
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text + "\n")
+    print(f"Results written to {path}")
+
+
+async def generate(args):
+    config = InventoryConfig(
+        airports=args.airports,
+        airlines=args.airlines,
+        routes_per_airport=args.routes_per_airport,
+        days=args.days,
+        max_flights_per_route_day=args.max_flights_per_route_day,
+        start_date=date.fromisoformat(args.start_date),
+        seed=args.seed,
+    )
+    print(f"Generating ~{config.expected_flights:,} flights (seed {config.seed})")
+    stats = await load_inventory(config, reset=args.reset, defer_indexes=not args.keep_indexes)
+    write_output(stats, args.output)
+
+
+async def run(args):
+    workload = await load_workload(postgres_dsn(), size=args.workload_size, seed=args.seed)
+    results = await run_benchmarks(
+        args.base_url,
+        workload,
+        scenarios=args.scenarios,
+        concurrency_levels=args.concurrency,
+        requests_per_level=args.requests,
+        warmup_requests=args.warmup,
+        token=args.token,
+        seed=args.seed,
+    )
+    config = {key: value for key, value in vars(args).items() if key not in ("token", "handler")}
+    write_output(report(config, results), args.output)
+
+
+async def hot_flight(args):
+    flight_id = args.flight_id or await pick_hot_flight(args.cabin_class)
+    if not flight_id:
+        raise SystemExit("No upcoming flight found; load an inventory first")
+    results = []
+    for workers in args.workers:
+        options = dict(
+            cabin_class=args.cabin_class,
+            workers=workers,
+            attempts=args.attempts,
+            seats_per_booking=args.seats,
+            restore=not args.keep_reservations,
+        )
+        if args.stripes:
+            results.extend(await compare_striped(flight_id, args.stripes, **options))
+        else:
+            results.append(await hot_flight_benchmark(flight_id, **options))
+    config = {key: value for key, value in vars(args).items() if key != "handler"}
+    write_output(report(config, results), args.output)
+
+
+async def booking_load(args):
+    flight_ids = args.flight_id or await pick_flights(args.flights)
+    if not flight_ids:
+        raise SystemExit("No upcoming flight found; load an inventory first")
+    results = []
+    for concurrency in args.concurrency:
+        options = dict(
+            bookings=args.bookings,
+            concurrency=concurrency,
+            max_passengers=args.max_passengers,
+            round_trip_share=args.round_trip_share,
+            cleanup=not args.keep_bookings,
+            seed=args.seed,
+        )
+        if args.pipeline:
+            results.extend(await pipeline_comparison(flight_ids, **options))
+        else:
+            results.append(await booking_load_benchmark(flight_ids, **options))
+    config = {key: value for key, value in vars(args).items() if key != "handler"}
+    write_output(report(config, results), args.output)
+    if not all(result["consistent"] for result in results):
+        raise SystemExit("Inventory check failed: seats were oversold or lost")
+
+
+async def auth_verification(args):
+    results = await compare_verification(args.token, args.local_requests, args.remote_requests)
+    config = {key: value for key, value in vars(args).items() if key not in ("token", "handler")}
+    write_output(report(config, results), args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Flight booking benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gen = subparsers.add_parser("generate", help="Generate and bulk load a synthetic inventory")
+    defaults = InventoryConfig()
+    gen.add_argument("--airports", type=int, default=defaults.airports)
+    gen.add_argument("--airlines", type=int, default=defaults.airlines)
+    gen.add_argument("--routes-per-airport", type=int, default=defaults.routes_per_airport)
+    gen.add_argument("--days", type=int, default=defaults.days)
+    gen.add_argument("--max-flights-per-route-day", type=int, default=defaults.max_flights_per_route_day)
+    gen.add_argument("--start-date", default=defaults.start_date.isoformat())
+    gen.add_argument("--seed", type=int, default=defaults.seed)
+    gen.add_argument("--reset", action="store_true",
+                     help="TRUNCATE flights, airports and airlines (CASCADE, includes bookings) first")
+    gen.add_argument("--keep-indexes", action="store_true", help="Do not drop flight indexes during the load")
+    gen.add_argument("--output", default="-", help="File for load statistics (default: stdout)")
+    gen.set_defaults(handler=generate)
+
+    bench = subparsers.add_parser("run", help="Run the HTTP benchmark against a running API")
+    bench.add_argument("--base-url", default="http://localhost:8000")
+    bench.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    bench.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    bench.add_argument("--requests", type=int, default=500, help="Measured requests per scenario and level")
+    bench.add_argument("--warmup", type=int, default=50)
+    bench.add_argument("--workload-size", type=int, default=1000)
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--token", help="Bearer token for the booking scenario")
+    bench.add_argument("--output", default="-", help="JSON results file (default: stdout)")
+    bench.set_defaults(handler=run)
+
+    hot = subparsers.add_parser("hot-flight", help="Measure seat reservations on a single contended flight")
+    hot.add_argument("--flight-id", help="Flight to reserve on (default: upcoming flight with most seats)")
+    hot.add_argument("--cabin-class", default="economy", choices=["economy", "premium-economy", "business", "first"])
+    hot.add_argument("--workers", nargs="+", type=int, default=[1, 16, 64])
+    hot.add_argument("--attempts", type=int, default=2000, help="Reservation attempts per worker level")
+    hot.add_argument("--seats", type=int, default=1, help="Seats per reservation")
+    hot.add_argument("--stripes", type=int, default=0, help="Also run with the flight split into this many seat counters")
+    hot.add_argument("--keep-reservations", action="store_true", help="Do not return the reserved seats afterwards")
+    hot.add_argument("--output", default="-", help="JSON results file (default: stdout)")
+    hot.set_defaults(handler=hot_flight)
+
+    load = subparsers.add_parser("booking-load", help="Place many concurrent bookings and check nothing was oversold")
+    load.add_argument("--flight-id", nargs="+", help="Flights to book on (default: the upcoming flights with most seats)")
+    load.add_argument("--flights", type=int, default=4, help="How many flights to pick when --flight-id is not given")
+    load.add_argument("--bookings", type=int, default=2000, help="Booking attempts per concurrency level")
+    load.add_argument("--concurrency", nargs="+", type=int, default=[50, 200])
+    load.add_argument("--max-passengers", type=int, default=4)
+    load.add_argument("--round-trip-share", type=float, default=0.3)
+    load.add_argument("--pipeline", action="store_true", help="Also run through the group-commit pipeline and compare")
+    load.add_argument("--keep-bookings", action="store_true", help="Do not cancel and delete the bookings afterwards")
+    load.add_argument("--seed", type=int, default=42)
+    load.add_argument("--output", default="-", help="JSON results file (default: stdout)")
+    load.set_defaults(handler=booking_load)
+
+    verify = subparsers.add_parser("auth", help="Compare local and remote access token verification")
+    verify.add_argument("--token", required=True, help="A current Supabase access token")
+    verify.add_argument("--local-requests", type=int, default=10000)
+    verify.add_argument("--remote-requests", type=int, default=200)
+    verify.add_argument("--output", default="-", help="JSON results file (default: stdout)")
+    verify.set_defaults(handler=auth_verification)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Access token verification: local signature check vs a Supabase round trip.
+
+Verifies the same token repeatedly through app.services.auth, once in
+process (signature, expiry and audience against SUPABASE_JWT_SECRET or the
+JWKS) and once with supabase.auth.get_user, and reports what each path costs
+every authenticated request.
+"""
+import time
+from typing import Any, Dict, List
+
+from app.services.auth import verify_token_locally, verify_token_remotely
+from benchmarks.harness import summarize
+
+VERIFIERS = {"local": verify_token_locally, "remote": verify_token_remotely}
+
+
+async def verification_benchmark(token: str, mode: str, requests: int) -> Dict[str, Any]:
+    """Verify `token` `requests` times, one after the other, with one verifier"""
+    verify = VERIFIERS[mode]
+    latencies: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        try:
+            await verify(token)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - request_started)
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(latencies, {}, errors, elapsed)
+    return {
+        "mode": mode,
+        "requests": requests,
+        "errors": errors,
+        "verifications_per_second": summary["throughput_rps"],
+        "latency_ms": summary["latency_ms"],
+    }
+
+
+async def compare_verification(token: str, local_requests: int = 10000, remote_requests: int = 200) -> List[Dict[str, Any]]:
+    """Both paths on the same token; the remote one gets fewer requests as each is a network call"""
+    local = await verification_benchmark(token, "local", local_requests)
+    remote = await verification_benchmark(token, "remote", remote_requests)
+    if remote["latency_ms"]["p50"] and local["latency_ms"]["p50"]:
+        local["p50_speedup"] = round(remote["latency_ms"]["p50"] / local["latency_ms"]["p50"], 1)
+    return [local, remote]
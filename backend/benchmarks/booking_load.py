@@ -0,0 +1,211 @@
+"""
+Concurrent booking load test with an oversell check.
+
+Thousands of bookings (one-way and round-trip, one to several passengers,
+mixed cabins) are placed concurrently on a handful of flights through
+app.services.booking.place_booking, the same path POST /bookings takes, in
+either per-request or group-commit mode. Afterwards the run is audited
+against the database:
+
+- no cabin on any of the flights has negative availability, and
+- for every flight and cabin, the seats that disappeared equal the
+  passengers on the run's live bookings.
+
+The run books under a dedicated user id and, by default, cancels and deletes
+its bookings afterwards, which returns the seats. Run it against a database
+nobody else is booking on, or the audit will count their bookings as missing.
+"""
+import asyncio
+import itertools
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+
+from app.database.database import AsyncSessionLocal
+from app.models import Booking, BookingFlight, Flight, Passenger
+from app.services import seat_stripes
+from app.services.booking import place_booking
+from app.services.seat_holds import cancel_bookings
+from app.services.seat_inventory import publish_seat_changes
+from benchmarks.harness import summarize
+
+CABIN_CLASSES = ("economy", "premium-economy", "business", "first")
+# Cabin picked for each passenger: mostly economy, like real traffic
+CABIN_WEIGHTS = (80, 10, 8, 2)
+
+Inventory = Dict[Tuple[str, str], int]
+
+
+class LoadRequest(NamedTuple):
+    """One booking the load test will attempt"""
+    booking_data: Dict[str, Any]
+    seats: Counter  # (flight_id, cabin_class) -> seats
+
+
+def generate_booking_requests(
+    flight_ids: Sequence[str],
+    count: int,
+    max_passengers: int = 4,
+    round_trip_share: float = 0.3,
+    seed: int = 42,
+) -> List[LoadRequest]:
+    """Deterministic mix of booking payloads over the given flights"""
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        round_trip = len(flight_ids) > 1 and rng.random() < round_trip_share
+        flights = rng.sample(list(flight_ids), 2 if round_trip else 1)
+        passengers = [
+            {
+                "type": "adult",
+                "first_name": f"Load{index}",
+                "last_name": "Test",
+                "date_of_birth": "1990-01-01",
+                "cabin_class": rng.choices(CABIN_CLASSES, CABIN_WEIGHTS)[0],
+            }
+            for index in range(rng.randint(1, max_passengers))
+        ]
+        booking_data = {
+            "trip_type": "round-trip" if round_trip else "one-way",
+            "total_amount": 100 * len(passengers),
+            "flights": [
+                {"flight_id": flight_id, "is_return_flight": position == 1}
+                for position, flight_id in enumerate(flights)
+            ],
+            "passengers": passengers,
+        }
+        seats = Counter((flight_id, passenger["cabin_class"]) for flight_id in flights for passenger in passengers)
+        requests.append(LoadRequest(booking_data, seats))
+    return requests
+
+
+def inventory_violations(before: Inventory, after: Inventory, sold: Inventory) -> List[str]:
+    """Everything wrong with the inventory after a run; empty when nothing was oversold or lost"""
+    violations = []
+    for key in sorted(set(before) | set(after) | set(sold)):
+        flight_id, cabin_class = key
+        if after.get(key, 0) < 0:
+            violations.append(f"{flight_id} {cabin_class}: availability went negative ({after[key]})")
+        taken = before.get(key, 0) - after.get(key, 0)
+        if taken != sold.get(key, 0):
+            violations.append(f"{flight_id} {cabin_class}: {taken} seats gone but {sold.get(key, 0)} passengers booked")
+    return violations
+
+
+async def read_inventory(flight_ids: Sequence[str], session_factory=AsyncSessionLocal) -> Inventory:
+    """Seats left per flight and cabin, summing the stripes of striped flights"""
+    inventory = {}
+    async with session_factory() as session:
+        for flight_id in flight_ids:
+            availability = await seat_stripes.flight_availability(session, flight_id)
+            for cabin_class in CABIN_CLASSES:
+                inventory[(flight_id, cabin_class)] = availability[f"{cabin_class.replace('-', '_')}_available"] or 0
+    return inventory
+
+
+async def sold_seats(user_id: uuid.UUID, session_factory=AsyncSessionLocal) -> Inventory:
+    """Passengers on the run's bookings that still hold seats, per flight and cabin"""
+    async with session_factory() as session:
+        result = await session.execute(
+            select(BookingFlight.flight_id, Passenger.cabin_class, func.count(Passenger.id))
+            .join(Booking, Booking.id == BookingFlight.booking_id)
+            .join(Passenger, Passenger.booking_id == Booking.id)
+            .where(Booking.user_id == user_id, Booking.status != "cancelled")
+            .group_by(BookingFlight.flight_id, Passenger.cabin_class)
+        )
+        return {(str(flight_id), cabin_class): seats for flight_id, cabin_class, seats in result.all()}
+
+
+async def remove_load_bookings(user_id: uuid.UUID, session_factory=AsyncSessionLocal) -> int:
+    """Cancel the run's bookings (returning their seats) and delete them"""
+    async with session_factory() as session:
+        async with session.begin():
+            bookings, released = await cancel_bookings(session, Booking.user_id == user_id)
+            await session.execute(delete(Booking).where(Booking.user_id == user_id))
+    publish_seat_changes(released)
+    return len(bookings)
+
+
+async def booking_load_benchmark(
+    flight_ids: Sequence[str],
+    bookings: int = 2000,
+    concurrency: int = 200,
+    max_passengers: int = 4,
+    round_trip_share: float = 0.3,
+    pipeline: bool = False,
+    cleanup: bool = True,
+    seed: int = 42,
+    session_factory=AsyncSessionLocal,
+) -> Dict[str, Any]:
+    """Place `bookings` bookings from `concurrency` tasks, then audit the inventory"""
+    user_id = uuid.uuid4()
+    requests = generate_booking_requests(flight_ids, bookings, max_passengers, round_trip_share, seed)
+    before = await read_inventory(flight_ids, session_factory)
+    sequence = itertools.count()
+    latencies: List[float] = []
+    outcomes = {"booked": 0, "sold_out": 0, "errors": 0}
+
+    async def worker():
+        while (index := next(sequence)) < len(requests):
+            started = time.perf_counter()
+            try:
+                await place_booking(str(user_id), requests[index].booking_data, pipeline=pipeline)
+            except HTTPException as e:
+                outcomes["sold_out" if e.status_code < 500 else "errors"] += 1
+                continue
+            except Exception:
+                outcomes["errors"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            outcomes["booked"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    after = await read_inventory(flight_ids, session_factory)
+    sold = await sold_seats(user_id, session_factory)
+    violations = inventory_violations(before, after, sold)
+    removed = await remove_load_bookings(user_id, session_factory) if cleanup else 0
+
+    summary = summarize(latencies, {}, outcomes["errors"], elapsed)
+    return {
+        "mode": "pipeline" if pipeline else "per-request",
+        "flights": list(flight_ids),
+        "concurrency": concurrency,
+        "attempts": bookings,
+        **outcomes,
+        "seats_sold": sum(sold.values()),
+        "bookings_per_second": summary["throughput_rps"],
+        "latency_ms": summary["latency_ms"],
+        # Must always hold: nothing oversold, every seat taken belongs to a passenger
+        "consistent": not violations,
+        "violations": violations,
+        "bookings_removed": removed,
+    }
+
+
+async def pick_flights(count: int, session_factory=AsyncSessionLocal) -> List[str]:
+    """Upcoming flights with the most economy seats left"""
+    async with session_factory() as session:
+        result = await session.execute(
+            select(Flight.id)
+            .where(Flight.departure_time > func.now(), Flight.status == "scheduled")
+            .order_by(Flight.economy_available.desc().nulls_last())
+            .limit(count)
+        )
+        return [str(flight_id) for flight_id in result.scalars().all()]
+
+
+async def pipeline_comparison(flight_ids: Sequence[str], session_factory=AsyncSessionLocal, **options) -> List[Dict[str, Any]]:
+    """Run the same load per request and through the group-commit pipeline"""
+    per_request = await booking_load_benchmark(flight_ids, pipeline=False, session_factory=session_factory, **options)
+    pipelined = await booking_load_benchmark(flight_ids, pipeline=True, session_factory=session_factory, **options)
+    if per_request["bookings_per_second"]:
+        pipelined["speedup"] = round(pipelined["bookings_per_second"] / per_request["bookings_per_second"], 2)
+    return [per_request, pipelined]
@@ -0,0 +1,200 @@
+"""
+HTTP load harness.
+
+Each scenario issues one kind of request against a running API; every
+scenario is measured at each requested concurrency level with a fixed
+number of requests after a short warm-up. Request parameters are drawn from
+a workload sample of real flights taken with a REPEATABLE table sample, so
+two runs against the same inventory send the same requests.
+"""
+import asyncio
+import itertools
+import math
+import random
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import httpx
+
+SCENARIOS = ("search", "flight_detail", "availability", "booking")
+
+
+class FlightSample(NamedTuple):
+    flight_id: str
+    origin: str
+    destination: str
+    departure_date: str
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    params: Optional[Dict[str, Any]] = None
+    json: Optional[Dict[str, Any]] = None
+
+
+async def load_workload(dsn: str, size: int = 1000, seed: int = 42) -> List[FlightSample]:
+    """Draw a repeatable sample of upcoming flights to build requests from"""
+    import asyncpg
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        estimate = await conn.fetchval("SELECT reltuples FROM pg_class WHERE relname = 'flights'")
+        percent = min(100.0, size * 200.0 / max(estimate or 0, 1))
+        rows = await conn.fetch(
+            f"""
+            SELECT f.id, o.iata_code, d.iata_code, f.departure_time
+            FROM flights f TABLESAMPLE BERNOULLI ({percent}) REPEATABLE ({seed})
+            JOIN airports o ON o.id = f.origin_airport_id
+            JOIN airports d ON d.id = f.destination_airport_id
+            WHERE f.departure_time > now() AND f.economy_available > 0
+            ORDER BY f.id
+            LIMIT $1
+            """,
+            size,
+        )
+    finally:
+        await conn.close()
+    return [FlightSample(str(r[0]), r[1], r[2], r[3].date().isoformat()) for r in rows]
+
+
+def build_request(scenario: str, sample: FlightSample, sequence: int) -> Request:
+    if scenario == "search":
+        return Request("GET", "/flights/search", params={
+            "from_code": sample.origin, "to_code": sample.destination,
+            "departure_date": sample.departure_date, "adults": 1,
+        })
+    if scenario == "flight_detail":
+        return Request("GET", f"/flights/{sample.flight_id}")
+    if scenario == "availability":
+        return Request("GET", f"/flights/{sample.flight_id}/availability")
+    if scenario == "booking":
+        return Request("POST", "/bookings", json={
+            "trip_type": "one-way",
+            "flights": [{"flight_id": sample.flight_id, "is_return_flight": False}],
+            "passengers": [{
+                "type": "adult", "first_name": "Bench", "last_name": f"Passenger{sequence}",
+                "cabin_class": "economy",
+            }],
+            "total_amount": 0,
+        })
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return None
+    # Rounding first keeps e.g. 0.99 * 100 from becoming rank 100
+    rank = max(1, math.ceil(round(fraction * len(sorted_values), 9)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], status_codes: Dict[int, int], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Throughput and latency percentiles (milliseconds) for one measurement"""
+    ordered = sorted(latencies)
+    completed = len(ordered)
+    return {
+        "requests": completed + errors,
+        "errors": errors + sum(count for code, count in status_codes.items() if code >= 400),
+        "status_codes": {str(code): count for code, count in sorted(status_codes.items())},
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(ordered) / completed * 1000, 2) if completed else None,
+            **{
+                name: round(percentile(ordered, fraction) * 1000, 2) if completed else None
+                for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+            },
+        },
+    }
+
+
+async def measure(
+    client: httpx.AsyncClient,
+    make_request: Callable[[int], Request],
+    concurrency: int,
+    total: int,
+) -> Dict[str, Any]:
+    """Send `total` requests from `concurrency` workers and summarize them"""
+    sequence = itertools.count()
+    latencies: List[float] = []
+    status_codes: Dict[int, int] = {}
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            n = next(sequence)
+            if n >= total:
+                return
+            request = make_request(n)
+            started = time.perf_counter()
+            try:
+                response = await client.request(request.method, request.path, params=request.params, json=request.json)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, status_codes, errors, time.perf_counter() - started)
+
+
+async def run_benchmarks(
+    base_url: str,
+    workload: List[FlightSample],
+    scenarios: Sequence[str] = SCENARIOS,
+    concurrency_levels: Sequence[int] = (1, 8, 32),
+    requests_per_level: int = 500,
+    warmup_requests: int = 50,
+    token: Optional[str] = None,
+    seed: int = 42,
+) -> List[Dict[str, Any]]:
+    """Measure every scenario at every concurrency level; booking needs a bearer token"""
+    if not workload:
+        raise ValueError("The workload sample is empty; load an inventory first")
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    results = []
+    limits = httpx.Limits(max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels))
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        for scenario in scenarios:
+            if scenario == "booking" and not token:
+                results.append({"scenario": scenario, "skipped": "no --token given"})
+                continue
+            for concurrency in concurrency_levels:
+                rng = random.Random(f"{seed}:{scenario}:{concurrency}")
+                order = [rng.randrange(len(workload)) for _ in range(warmup_requests + requests_per_level)]
+
+                def make_request(n, offset=0):
+                    return build_request(scenario, workload[order[offset + n]], offset + n)
+
+                await measure(client, make_request, concurrency, warmup_requests)
+                summary = await measure(
+                    client, lambda n: make_request(n, warmup_requests), concurrency, requests_per_level
+                )
+                results.append({"scenario": scenario, "concurrency": concurrency, **summary})
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(config: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Wrap results with enough context to compare two runs"""
+    return {
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "config": config,
+        "results": results,
+    }
@@ -0,0 +1,258 @@
+"""
+Deterministic synthetic flight inventory.
+
+The same InventoryConfig (including its seed) always produces the same
+airports, airlines, routes and flights, so benchmark runs on different
+machines or branches use identical data. Flights are generated lazily, one
+day at a time with a per-day random stream, which keeps memory flat for
+tens of millions of rows and lets any single day be regenerated on its own.
+
+Rows are loaded with PostgreSQL COPY through asyncpg. With defer_indexes the
+flights indexes are dropped for the load and recreated afterwards, which is
+much faster than maintaining them row by row.
+"""
+import itertools
+import logging
+import math
+import os
+import random
+import time
+import uuid
+from decimal import Decimal
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.models import Flight
+
+logger = logging.getLogger(__name__)
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+ALPHANUMERIC = LETTERS + "0123456789"
+CABIN_SEATS = {"economy": (120, 220), "premium_economy": (0, 40), "business": (8, 40), "first": (0, 12)}
+CRUISE_SPEED_KMH = 800
+TAXI_MINUTES = 30
+
+AIRPORT_COLUMNS = ("id", "iata_code", "icao_code", "name", "city", "country", "latitude", "longitude", "timezone")
+AIRLINE_COLUMNS = ("id", "code", "name", "logo_url")
+FLIGHT_COLUMNS = (
+    "id", "flight_number", "airline_id", "origin_airport_id", "destination_airport_id",
+    "departure_time", "arrival_time", "duration_minutes", "status",
+    "economy_price", "premium_economy_price", "business_price", "first_price",
+    "economy_available", "premium_economy_available", "business_available", "first_available",
+    "stops",
+)
+
+
+class InventoryConfig(NamedTuple):
+    """Size and shape of a synthetic inventory; the defaults produce ~18M flights"""
+    airports: int = 2000
+    airlines: int = 200
+    routes_per_airport: int = 10
+    days: int = 365
+    max_flights_per_route_day: int = 4
+    start_date: date = date(2026, 1, 1)
+    seed: int = 42
+
+    @property
+    def expected_flights(self) -> int:
+        return int(self.airports * self.routes_per_airport * self.days * (1 + self.max_flights_per_route_day) / 2)
+
+
+class Route(NamedTuple):
+    origin: int
+    destination: int
+    airline: int
+    duration_minutes: int
+    base_fare: float
+
+
+def seeded_uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def money(value: float) -> Decimal:
+    return Decimal(f"{value:.2f}")
+
+
+def airport_code(index: int) -> str:
+    """Distinct 3-letter code for each index below 26**3, spread over the code space"""
+    # 7919 is coprime with 26**3, so this is a permutation of the code space
+    value = (index * 7919) % 26 ** 3
+    return "".join(LETTERS[value // 26 ** power % 26] for power in (2, 1, 0))
+
+
+def airline_code(index: int) -> str:
+    """Distinct 2-character code for each index below 36**2"""
+    value = (index * 37) % 36 ** 2
+    return ALPHANUMERIC[value // 36] + ALPHANUMERIC[value % 36]
+
+
+def generate_airports(config: InventoryConfig) -> List[tuple]:
+    if config.airports > 26 ** 3:
+        raise ValueError(f"At most {26 ** 3} airports can have distinct IATA codes")
+    rng = random.Random(f"{config.seed}:airports")
+    rows = []
+    for i in range(config.airports):
+        code = airport_code(i)
+        rows.append((
+            seeded_uuid(rng), code, "X" + code, f"{code} International", f"City {code}",
+            f"Country {i % 150}", round(rng.uniform(-60, 70), 4), round(rng.uniform(-180, 180), 4), "UTC",
+        ))
+    return rows
+
+
+def generate_airlines(config: InventoryConfig) -> List[tuple]:
+    if config.airlines > 36 ** 2:
+        raise ValueError(f"At most {36 ** 2} airlines can have distinct codes")
+    rng = random.Random(f"{config.seed}:airlines")
+    return [
+        (seeded_uuid(rng), airline_code(i), f"Airline {airline_code(i)}", None)
+        for i in range(config.airlines)
+    ]
+
+
+def great_circle_km(a: tuple, b: tuple) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[6], a[7], b[6], b[7]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def generate_routes(config: InventoryConfig, airports: List[tuple]) -> List[Route]:
+    """
+    Pick routes_per_airport destinations per airport with Zipf-weighted
+    popularity, so a few hubs get most of the traffic as in real networks.
+    """
+    rng = random.Random(f"{config.seed}:routes")
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(airports))))
+    routes = []
+    for origin in range(len(airports)):
+        destinations = set()
+        wanted = min(config.routes_per_airport, len(airports) - 1)
+        while len(destinations) < wanted:
+            destination = rng.choices(range(len(airports)), cum_weights=cum_weights)[0]
+            if destination != origin:
+                destinations.add(destination)
+        for destination in sorted(destinations):
+            distance = great_circle_km(airports[origin], airports[destination])
+            duration = int(distance / CRUISE_SPEED_KMH * 60) + TAXI_MINUTES
+            routes.append(Route(origin, destination, rng.randrange(config.airlines), duration, 50 + distance * 0.08))
+    return routes
+
+
+def generate_flights(
+    config: InventoryConfig,
+    airports: List[tuple],
+    airlines: List[tuple],
+    routes: List[Route],
+    days: Optional[range] = None,
+) -> Iterator[tuple]:
+    """Yield flight rows (FLIGHT_COLUMNS order) day by day"""
+    for day in days if days is not None else range(config.days):
+        rng = random.Random(f"{config.seed}:flights:{day}")
+        midnight = datetime.combine(config.start_date + timedelta(days=day), datetime.min.time(), tzinfo=timezone.utc)
+        for number, route in enumerate(routes):
+            for _ in range(rng.randint(1, config.max_flights_per_route_day)):
+                departure = midnight + timedelta(minutes=rng.randrange(5 * 60, 23 * 60, 5))
+                fare = route.base_fare * rng.uniform(0.7, 1.6)
+                seats = {cabin: rng.randint(low, high) for cabin, (low, high) in CABIN_SEATS.items()}
+                yield (
+                    seeded_uuid(rng),
+                    f"{airline_code(route.airline)}{number % 9000 + 100}",
+                    airlines[route.airline][0],
+                    airports[route.origin][0],
+                    airports[route.destination][0],
+                    departure,
+                    departure + timedelta(minutes=route.duration_minutes),
+                    route.duration_minutes,
+                    "scheduled",
+                    money(fare),
+                    money(fare * 1.6) if seats["premium_economy"] else None,
+                    money(fare * 3.2) if seats["business"] else None,
+                    money(fare * 6.0) if seats["first"] else None,
+                    seats["economy"],
+                    seats["premium_economy"],
+                    seats["business"],
+                    seats["first"],
+                    0,
+                )
+
+
+def postgres_dsn() -> str:
+    """POSTGRES_URL in the plain postgresql:// form asyncpg expects"""
+    url = os.getenv("POSTGRES_URL")
+    if not url:
+        raise ValueError("POSTGRES_URL environment variable is required")
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def flight_index_ddl() -> List[Tuple[str, str]]:
+    """(index name, CREATE INDEX statement) for every index declared on Flight"""
+    dialect = postgresql.dialect()
+    return [(index.name, str(CreateIndex(index).compile(dialect=dialect))) for index in Flight.__table__.indexes]
+
+
+async def load_inventory(
+    config: InventoryConfig,
+    dsn: Optional[str] = None,
+    reset: bool = False,
+    defer_indexes: bool = True,
+    batch_size: int = 50_000,
+) -> dict:
+    """
+    Generate and COPY the inventory into the database; returns load statistics.
+
+    reset truncates airports, airlines and flights (and, through CASCADE,
+    every booking) first; without it the load fails if generated codes
+    already exist.
+    """
+    import asyncpg
+
+    airports = generate_airports(config)
+    airlines = generate_airlines(config)
+    routes = generate_routes(config, airports)
+    conn = await asyncpg.connect(dsn or postgres_dsn())
+    started = time.perf_counter()
+    flights = 0
+    try:
+        if reset:
+            await conn.execute("TRUNCATE flights, airports, airlines CASCADE")
+        await conn.copy_records_to_table("airports", records=airports, columns=AIRPORT_COLUMNS)
+        await conn.copy_records_to_table("airlines", records=airlines, columns=AIRLINE_COLUMNS)
+
+        indexes = flight_index_ddl() if defer_indexes else []
+        for name, _ in indexes:
+            await conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+        batch = []
+        for row in generate_flights(config, airports, airlines, routes):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                await conn.copy_records_to_table("flights", records=batch, columns=FLIGHT_COLUMNS)
+                flights += len(batch)
+                batch = []
+                if flights % (batch_size * 20) == 0:
+                    logger.info(f"Loaded {flights:,} flights")
+        if batch:
+            await conn.copy_records_to_table("flights", records=batch, columns=FLIGHT_COLUMNS)
+            flights += len(batch)
+
+        for name, ddl in indexes:
+            logger.info(f"Creating index {name}")
+            await conn.execute(ddl)
+        await conn.execute("ANALYZE airports; ANALYZE airlines; ANALYZE flights")
+    finally:
+        await conn.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "config": {**config._asdict(), "start_date": config.start_date.isoformat()},
+        "airports": len(airports),
+        "airlines": len(airlines),
+        "routes": len(routes),
+        "flights": flights,
+        "seconds": round(elapsed, 1),
+        "flights_per_second": round(flights / elapsed) if elapsed else None,
+    }
@@ -0,0 +1,126 @@
+"""
+Single hot flight contention benchmark.
+
+Many concurrent workers reserve seats on the same flight through
+app.services.seat_inventory until it sells out (or the attempt budget is
+spent). Every reservation is an independent transaction, so the result shows
+how many conditional decrements per second one row sustains, and the final
+availability proves that no seat was sold twice.
+
+compare_striped repeats the run with the flight switched to striped seat
+counters, to compare their throughput with the single-row path.
+"""
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from app.database.database import AsyncSessionLocal
+from app.models import Flight
+from app.services import seat_inventory, seat_stripes
+from app.services.seat_inventory import SeatRequest
+from benchmarks.harness import summarize
+
+
+async def available_seats(flight_id: str, cabin_class: str, session_factory=AsyncSessionLocal) -> int:
+    """Seats left in the cabin, summing the stripes of a striped flight"""
+    async with session_factory() as session:
+        availability = await seat_stripes.flight_availability(session, flight_id)
+    return availability[f"{cabin_class.replace('-', '_')}_available"] or 0
+
+
+async def hot_flight_benchmark(
+    flight_id: str,
+    cabin_class: str = "economy",
+    workers: int = 32,
+    attempts: int = 2000,
+    seats_per_booking: int = 1,
+    restore: bool = True,
+    reserve=None,
+    session_factory=AsyncSessionLocal,
+) -> Dict[str, Any]:
+    """
+    Hammer one flight with `attempts` reservations from `workers` tasks.
+
+    `reserve` defaults to seat_inventory.reserve and can be swapped for another
+    reservation strategy with the same signature to compare them.
+    """
+    reserve = reserve or seat_inventory.reserve
+    before = await available_seats(flight_id, cabin_class, session_factory)
+    request = SeatRequest(flight_id, cabin_class, seats_per_booking)
+    sequence = itertools.count()
+    latencies: List[float] = []
+    outcomes = {"reserved": 0, "sold_out": 0, "errors": 0}
+
+    async def worker():
+        while next(sequence) < attempts:
+            started = time.perf_counter()
+            try:
+                await reserve([request], session_factory=session_factory)
+            except HTTPException:
+                outcomes["sold_out"] += 1
+                continue
+            except Exception:
+                outcomes["errors"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            outcomes["reserved"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+    after = await available_seats(flight_id, cabin_class, session_factory)
+
+    seats_taken = outcomes["reserved"] * seats_per_booking
+    if restore and seats_taken:
+        await seat_inventory.release([request._replace(seats=seats_taken)], session_factory=session_factory)
+
+    summary = summarize(latencies, {}, outcomes["errors"], elapsed)
+    return {
+        "flight_id": flight_id,
+        "cabin_class": cabin_class,
+        "mode": "single-row",
+        "workers": workers,
+        "attempts": attempts,
+        **outcomes,
+        "available_before": before,
+        "available_after": after,
+        # Must always hold: every reserved seat is accounted for exactly once
+        "consistent": before - after == seats_taken and after >= 0,
+        "reservations_per_second": summary["throughput_rps"],
+        "latency_ms": summary["latency_ms"],
+    }
+
+
+async def compare_striped(
+    flight_id: str,
+    stripes: int,
+    session_factory=AsyncSessionLocal,
+    **options,
+) -> List[Dict[str, Any]]:
+    """
+    Run the benchmark on the single-row counters, then again with the flight
+    split into `stripes` counters, and switch it back afterwards
+    """
+    single_row = await hot_flight_benchmark(flight_id, session_factory=session_factory, **options)
+    await seat_stripes.set_stripes(flight_id, stripes, session_factory=session_factory)
+    try:
+        striped = await hot_flight_benchmark(flight_id, session_factory=session_factory, **options)
+    finally:
+        await seat_stripes.set_stripes(flight_id, 0, session_factory=session_factory)
+    striped["mode"] = f"striped-{stripes}"
+    if single_row["reservations_per_second"]:
+        striped["speedup"] = round(striped["reservations_per_second"] / single_row["reservations_per_second"], 2)
+    return [single_row, striped]
+
+
+async def pick_hot_flight(cabin_class: str = "economy", session_factory=AsyncSessionLocal) -> Optional[str]:
+    """The upcoming flight with the most seats left in the cabin"""
+    column = getattr(Flight, f"{cabin_class.replace('-', '_')}_available")
+    async with session_factory() as session:
+        result = await session.execute(select(Flight.id).where(Flight.departure_time > func.now()).order_by(column.desc().nulls_last()).limit(1))
+        flight_id = result.scalar_one_or_none()
+    return str(flight_id) if flight_id else None
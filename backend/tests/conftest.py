@@ -4,13 +4,53 @@ Test fixtures for the backend tests.
 import os
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add path to import app modules
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.main import app
+from app.services.principal_cache import principal_cache
+
+
+def async_context(value=None):
+    """MagicMock usable as `async with`, yielding `value` and recording how the block was exited"""
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=value)
+    context.__aexit__ = AsyncMock(return_value=False)
+    return context
+
+
+def make_session_factory(*results, savepoint=False):
+    """
+    Mock of an async session factory for services that take `session_factory`.
+
+    session.execute() returns `results` in order. session.begin() is a
+    transaction mock whose __aexit__ records how the block was left; with
+    `savepoint`, session.begin_nested() gets one too. Imported by the service
+    tests as `from conftest import make_session_factory`.
+
+    Returns:
+        (factory, session, transaction)
+    """
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=list(results))
+    transaction = async_context()
+    session.begin.return_value = transaction
+    if savepoint:
+        session.begin_nested.return_value = async_context()
+    factory = MagicMock(return_value=async_context(session))
+    return factory, session, transaction
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """
+    Tokens are reused across tests with different payloads; start each test uncached.
+    """
+    principal_cache.clear()
+    yield
 
 
 @pytest.fixture
@@ -55,6 +95,22 @@ def valid_jwt_payload():
     }
 
 
+@pytest.fixture
+def auth_headers(valid_jwt_payload, monkeypatch):
+    """
+    Authorization header with a real HS256 token for valid_jwt_payload, which
+    app.services.auth verifies locally.
+    """
+    import time
+    import jwt
+
+    secret = "test-jwt-secret"
+    monkeypatch.setattr("app.services.auth.AUTH_VERIFICATION", "local")
+    monkeypatch.setattr("app.services.auth.SUPABASE_JWT_SECRET", secret)
+    token = jwt.encode({**valid_jwt_payload, "exp": int(time.time()) + 600}, secret, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
 @pytest.fixture
 def admin_jwt_payload():
     """
@@ -1,11 +1,13 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timezone, timedelta
 import os
 
 from app.main import app
 from app.routers.flights import get_current_user
+from app.database.database import get_db
+from app.services.flight_search import FlightSearchResult
 
 
 @pytest.fixture(scope="module")
@@ -15,48 +17,17 @@ def client():
         yield c
 
 
-@patch('app.routers.flights.get_supabase_client')
-def test_search_flights_unit(mock_get_supabase_client, client):
+@patch('app.routers.flights.search_flight_inventory', new_callable=AsyncMock)
+def test_search_flights_unit(mock_search_flight_inventory, test_client):
     """
     Unit test for the search_flights endpoint.
 
-    This test mocks the Supabase client to isolate the endpoint logic and verify
-    that the query is constructed correctly based on the search parameters.
+    This test mocks the search engine to isolate the endpoint logic and verify
+    that the query parameters are normalized and forwarded correctly.
     """
     # Arrange
-    mock_supabase = MagicMock()
-    mock_get_supabase_client.return_value = mock_supabase
-
-    # Mock query builders for airports and flights
-    mock_airport_query = MagicMock()
-    mock_flight_query = MagicMock()
-
-    # Configure the side effect for the table method
-    def table_side_effect(table_name):
-        if table_name == 'airports':
-            return mock_airport_query
-        elif table_name == 'flights':
-            return mock_flight_query
-        return MagicMock()
-
-    mock_supabase.table.side_effect = table_side_effect
-
-    # Set up mocks for chained calls
-    for builder in [mock_airport_query, mock_flight_query]:
-        builder.select.return_value = builder
-        builder.eq.return_value = builder
-        builder.gte.return_value = builder
-        builder.lt.return_value = builder
-
-    # Mock responses for airport ID lookups
-    origin_airport_id = 'b1c2d3e4-f5g6-7890-1234-567890abcdef'
-    destination_airport_id = 'c1d2e3f4-g5h6-7890-1234-567890abcdef'
-
-    mock_origin_response = MagicMock(data=[{'id': origin_airport_id}], error=None)
-    mock_dest_response = MagicMock(data=[{'id': destination_airport_id}], error=None)
-    mock_airport_query.execute.side_effect = [mock_origin_response, mock_dest_response]
-
-    # Mock response for the final flights query
+    origin_airport_id = 'b1c2d3e4-f5a6-7890-1234-567890abcdef'
+    destination_airport_id = 'c1d2e3f4-a5b6-7890-1234-567890abcdef'
     mock_flight_data = {
         "id": "123e4567-e89b-12d3-a456-426614174000",
         "flight_number": "UA225",
@@ -86,13 +57,14 @@ def test_search_flights_unit(mock_get_supabase_client, client):
             "id": destination_airport_id, "iata_code": "LAX", "name": "Los Angeles International Airport", "city": "Los Angeles", "country": "USA", "icao_code": "KLAX", "timezone": "America/Los_Angeles"
         }
     }
-    mock_flights_response = MagicMock(data=[mock_flight_data], error=None)
-    mock_flight_query.execute.return_value = mock_flights_response
+    mock_search_flight_inventory.return_value = FlightSearchResult([mock_flight_data])
+    app.dependency_overrides[get_db] = lambda: MagicMock()
 
     # Act
-    response = client.get(
-        "/flights/search?from_code=JFK&to_code=LAX&departure_date=2025-12-01&cabin_class=economy&adults=1&children=0&infants=0"
+    response = test_client.get(
+        "/flights/search?from_code=JFK&to_code=LAX&departure_date=2025-12-01&cabin_class=economy&adults=1&children=0&infants=0&sort_by=price"
     )
+    app.dependency_overrides.clear()
 
     # Assert
     assert response.status_code == 200
@@ -100,22 +72,27 @@ def test_search_flights_unit(mock_get_supabase_client, client):
     assert len(response_data) == 1
     assert response_data[0]['flight_number'] == 'UA225'
 
-    # Verify airport ID lookups
-    mock_supabase.table.assert_any_call('airports')
-    mock_airport_query.select.assert_any_call('id')
-    mock_airport_query.eq.assert_any_call('iata_code', 'JFK')
-    mock_airport_query.eq.assert_any_call('iata_code', 'LAX')
+    mock_search_flight_inventory.assert_awaited_once()
+    _, params = mock_search_flight_inventory.call_args.args
+    assert params.from_code == 'JFK'
+    assert params.to_code == 'LAX'
+    assert params.trip_type == 'one-way'
+    assert mock_search_flight_inventory.call_args.kwargs['sort_by'] == 'price'
+    assert 'X-Search-Partial' not in response.headers
+
 
-    # Verify flight query
-    mock_supabase.table.assert_any_call('flights')
-    mock_flight_query.select.assert_called_with(
-        '*, airline:airlines(*), origin_airport:airports!origin_airport_id(*), destination_airport:airports!destination_airport_id(*)'
+@patch('app.services.flight_search.reference_data')
+def test_streamed_search_rejects_bad_date_before_streaming(mock_reference_data, test_client):
+    """A bad date gets its 400 instead of a 200 with a broken body"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.airport_id.side_effect = lambda code: f"id-{code}"
+
+    response = test_client.get(
+        "/flights/search?from_code=JFK&to_code=LAX&departure_date=2025-13-45&cabin_class=economy&adults=1&stream=true"
     )
-    mock_flight_query.eq.assert_any_call('origin_airport_id', origin_airport_id)
-    mock_flight_query.eq.assert_any_call('destination_airport_id', destination_airport_id)
-    mock_flight_query.gte.assert_any_call('departure_time', '2025-12-01T00:00:00')
-    mock_flight_query.lt.assert_any_call('departure_time', '2025-12-01T23:59:59')
-    mock_flight_query.gte.assert_any_call('economy_available', 1)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid date '2025-13-45', expected YYYY-MM-DD"
 
 
 @pytest.mark.skipif(
@@ -1,30 +1,27 @@
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+import copy
 import uuid
-import json
-from fastapi import status
+from fastapi import HTTPException, status
 
 
 @pytest.fixture
 def round_trip_booking_payload():
-    """Fixture to create a valid round-trip booking payload"""
+    """Fixture to create a valid round-trip booking payload (BookingCreate)"""
     outbound_flight_id = str(uuid.uuid4())
     return_flight_id = str(uuid.uuid4())
     
     return {
         "trip_type": "round-trip",
-        "cabin_class": "economy",
         "total_amount": 1200.00,
         "flights": [
             {
                 "flight_id": outbound_flight_id,
-                "is_return_flight": False,
-                "price": 600.00
+                "is_return_flight": False
             },
             {
                 "flight_id": return_flight_id,
-                "is_return_flight": True,
-                "price": 600.00
+                "is_return_flight": True
             }
         ],
         "passengers": [
@@ -34,13 +31,15 @@ def round_trip_booking_payload():
                 "last_name": "Doe",
                 "date_of_birth": "1990-01-01",
                 "passport_number": "AB123456",
-                "nationality": "US"
+                "nationality": "US",
+                "cabin_class": "economy"
             },
             {
                 "type": "child",
                 "first_name": "Jane",
                 "last_name": "Doe",
-                "date_of_birth": "2015-01-01"
+                "date_of_birth": "2015-01-01",
+                "cabin_class": "economy"
             }
         ]
     }
@@ -49,23 +48,47 @@ def round_trip_booking_payload():
 @pytest.fixture
 def invalid_round_trip_booking_payload(round_trip_booking_payload):
     """Fixture to create an invalid round-trip booking payload (no return flight)"""
-    payload = round_trip_booking_payload.copy()
+    payload = copy.deepcopy(round_trip_booking_payload)
     # Mark both flights as outbound (not return)
     for flight in payload["flights"]:
         flight["is_return_flight"] = False
     return payload
 
 
-@patch('app.services.booking.validate_flight_availability')
-@patch('app.services.booking.update_seat_availability')
-@patch('app.services.booking.get_booking_details_by_id')
+def booking_details(booking_id, user_id, payload):
+    """Booking document as get_booking_details_by_id returns it for `payload`"""
+    created_at = "2025-11-01T12:00:00+00:00"
+    return {
+        "id": booking_id,
+        "user_id": user_id,
+        "booking_reference": "SBJ-7K3M9QX",
+        "trip_type": payload["trip_type"],
+        "total_amount": payload["total_amount"],
+        "status": "pending",
+        "hold_expires_at": "2025-11-01T12:15:00+00:00",
+        "created_at": created_at,
+        "updated_at": created_at,
+        "flights": [
+            {"id": f"bf-{index}", "booking_id": booking_id, "created_at": created_at, **flight}
+            for index, flight in enumerate(payload["flights"])
+        ],
+        "passengers": [
+            {"id": f"p-{index}", "booking_id": booking_id, "created_at": created_at, **passenger}
+            for index, passenger in enumerate(payload["passengers"])
+        ],
+    }
+
+
+@patch('app.services.booking.EmailNotificationService.send_booking_confirmation', new_callable=AsyncMock)
+@patch('app.services.booking.write_booking', new_callable=AsyncMock)
+@patch('app.services.booking.get_booking_details_by_id', new_callable=AsyncMock)
 @patch('app.services.auth.get_supabase_client')
 @patch('app.routers.bookings.get_supabase_client')
 @patch('app.services.booking.get_supabase_client')
 def test_create_round_trip_booking_success(
     mock_booking_supabase, mock_router_supabase, mock_auth_supabase,
-    mock_get_booking_details, mock_update_seats, mock_validate_flights,
-    test_client, mock_jwt_decode, valid_jwt_payload, round_trip_booking_payload
+    mock_get_booking_details, mock_write_booking, mock_send_confirmation,
+    test_client, auth_headers, valid_jwt_payload, round_trip_booking_payload
 ):
     """Test successful creation of a round-trip booking"""
     # Arrange
@@ -73,67 +96,22 @@ def test_create_round_trip_booking_success(
     mock_booking_supabase.return_value = mock_supabase
     mock_router_supabase.return_value = mock_supabase
     mock_auth_supabase.return_value = mock_supabase
-    
-    mock_jwt_decode.return_value = valid_jwt_payload
-    
-    # Mock validate_flight_availability to return success
-    mock_validate_flights.return_value = (True, "", [{"flight_id": "flight-1"}])
-    
-    # Mock update_seat_availability to return updated flights
-    mock_update_seats.return_value = [{"flight_id": "flight-1", "new_available_seats": 8}]
-    
-    # Mock booking creation response
-    booking_id = str(uuid.uuid4())
-    mock_booking_response = MagicMock()
-    mock_booking_response.data = [{"id": booking_id}]
-    mock_booking_response.error = None
-    
-    # Mock booking flights and passengers responses
-    mock_success_response = MagicMock()
-    mock_success_response.data = [{"id": "success"}]
-    mock_success_response.error = None
-    
-    # Set up the mock responses for database operations
-    mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
-        mock_booking_response, mock_success_response, mock_success_response
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"email": "john@example.com"}
     ]
     
-    # Mock get_booking_details_by_id to return booking details
-    mock_booking_details = {
-        "id": booking_id,
-        "trip_type": "round-trip",
-        "flights": [
-            {
-                "id": "bf-1",
-                "flight_id": round_trip_booking_payload["flights"][0]["flight_id"],
-                "is_return_flight": False
-            },
-            {
-                "id": "bf-2",
-                "flight_id": round_trip_booking_payload["flights"][1]["flight_id"],
-                "is_return_flight": True
-            }
-        ],
-        "passengers": [
-            {
-                "id": "p-1",
-                "first_name": "John",
-                "last_name": "Doe"
-            },
-            {
-                "id": "p-2",
-                "first_name": "Jane",
-                "last_name": "Doe"
-            }
-        ]
-    }
-    mock_get_booking_details.return_value = mock_booking_details
+    # Seats and booking rows are written in one transaction
+    booking_id = str(uuid.uuid4())
+    mock_write_booking.return_value = booking_id
+    mock_get_booking_details.return_value = booking_details(
+        booking_id, valid_jwt_payload["sub"], round_trip_booking_payload
+    )
     
     # Act
     response = test_client.post(
         "/bookings",
         json=round_trip_booking_payload,
-        headers={"Authorization": "Bearer fake-token"}
+        headers=auth_headers
     )
     
     # Assert
@@ -146,16 +124,22 @@ def test_create_round_trip_booking_success(
     assert len(response_data["passengers"]) == 2
     
     # Verify the correct service methods were called
-    mock_validate_flights.assert_called_once()
-    mock_update_seats.assert_called_once()
-    mock_get_booking_details.assert_called_once_with(booking_id, user_id=valid_jwt_payload["sub"])
+    mock_write_booking.assert_awaited_once()
+    user_id, booking_data, seat_requests = mock_write_booking.call_args.args
+    assert user_id == valid_jwt_payload["sub"]
+    # Both passengers fly economy: one request for two seats on each leg
+    assert [(request.is_return, request.cabin_class, request.seats) for request in seat_requests] == [
+        (False, "economy", 2), (True, "economy", 2)
+    ]
+    mock_get_booking_details.assert_awaited_once_with(booking_id, user_id=valid_jwt_payload["sub"])
+    mock_send_confirmation.assert_awaited_once()
 
 
 @patch('app.services.auth.get_supabase_client')
 @patch('app.routers.bookings.get_supabase_client')
 def test_create_round_trip_booking_invalid_return_flight(
     mock_router_supabase, mock_auth_supabase,
-    test_client, mock_jwt_decode, valid_jwt_payload, invalid_round_trip_booking_payload
+    test_client, auth_headers, invalid_round_trip_booking_payload
 ):
     """Test round-trip booking creation fails when no return flight is specified"""
     # Arrange
@@ -163,13 +147,11 @@ def test_create_round_trip_booking_invalid_return_flight(
     mock_router_supabase.return_value = mock_supabase
     mock_auth_supabase.return_value = mock_supabase
     
-    mock_jwt_decode.return_value = valid_jwt_payload
-    
     # Act
     response = test_client.post(
         "/bookings",
         json=invalid_round_trip_booking_payload,
-        headers={"Authorization": "Bearer fake-token"}
+        headers=auth_headers
     )
     
     # Assert
@@ -178,13 +160,13 @@ def test_create_round_trip_booking_invalid_return_flight(
     assert "Round-trip bookings must have exactly one flight marked as return" in response_data["detail"]
 
 
-@patch('app.services.booking.validate_flight_availability')
+@patch('app.services.booking.write_booking', new_callable=AsyncMock)
 @patch('app.services.auth.get_supabase_client')
 @patch('app.routers.bookings.get_supabase_client')
 @patch('app.services.booking.get_supabase_client')
 def test_create_round_trip_booking_not_enough_seats(
-    mock_booking_supabase, mock_router_supabase, mock_auth_supabase, mock_validate_flights,
-    test_client, mock_jwt_decode, valid_jwt_payload, round_trip_booking_payload
+    mock_booking_supabase, mock_router_supabase, mock_auth_supabase, mock_write_booking,
+    test_client, auth_headers, round_trip_booking_payload
 ):
     """Test round-trip booking creation fails when not enough seats are available"""
     # Arrange
@@ -193,17 +175,15 @@ def test_create_round_trip_booking_not_enough_seats(
     mock_router_supabase.return_value = mock_supabase
     mock_auth_supabase.return_value = mock_supabase
     
-    mock_jwt_decode.return_value = valid_jwt_payload
-    
-    # Mock validate_flight_availability to return failure
-    error_message = "Not enough economy seats available on return flight SBJ456 (ID: flight-2). Available: 1, Requested: 2"
-    mock_validate_flights.return_value = (False, error_message, [])
+    # The booking transaction reports the short leg
+    error_message = "Not enough economy seats available for return flight SBJ456. Available: 1, Requested: 2"
+    mock_write_booking.side_effect = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_message)
     
     # Act
     response = test_client.post(
         "/bookings",
         json=round_trip_booking_payload,
-        headers={"Authorization": "Bearer fake-token"}
+        headers=auth_headers
     )
     
     # Assert
@@ -0,0 +1,111 @@
+import time
+from unittest.mock import AsyncMock
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app.services import auth
+from app.services.auth import JwksCache, SigningKeyUnavailable, get_current_user
+from app.services.principal_cache import principal_cache
+
+
+SECRET = "test-jwt-secret"
+
+
+def make_token(secret=SECRET, **overrides):
+    claims = {
+        "sub": "user-1",
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": "traveller@example.com",
+        "user_metadata": {"first_name": "Ada"},
+        "exp": int(time.time()) + 600,
+        **overrides,
+    }
+    return jwt.encode({key: value for key, value in claims.items() if value is not None}, secret, algorithm="HS256")
+
+
+@pytest.fixture
+def local_auth(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_VERIFICATION", "local")
+    monkeypatch.setattr(auth, "SUPABASE_JWT_SECRET", SECRET)
+    remote = AsyncMock(return_value={"id": "remote-user"})
+    monkeypatch.setattr(auth, "verify_token_remotely", remote)
+    return remote
+
+
+async def test_valid_token_is_verified_without_calling_supabase(local_auth):
+    user = await get_current_user(make_token())
+
+    assert user["id"] == "user-1"
+    assert user["email"] == "traveller@example.com"
+    assert user["user_metadata"] == {"first_name": "Ada"}
+    assert user["app_metadata"] == {}
+    local_auth.assert_not_awaited()
+
+
+@pytest.mark.parametrize("token", [
+    make_token(exp=int(time.time()) - 60),
+    make_token(aud="anon"),
+    make_token(secret="someone-elses-secret"),
+    make_token(exp=None),
+    "not-a-token",
+])
+async def test_bad_tokens_are_rejected_locally(local_auth, token):
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(token)
+
+    assert exc_info.value.status_code == 401
+    local_auth.assert_not_awaited()
+
+
+async def test_verified_principal_is_reused_until_logout(local_auth, monkeypatch):
+    token = make_token()
+    decode = AsyncMock(wraps=auth.verify_token_claims)
+    monkeypatch.setattr(auth, "verify_token_claims", decode)
+
+    assert (await get_current_user(token))["id"] == "user-1"
+    assert (await get_current_user(token))["id"] == "user-1"
+    assert decode.await_count == 1
+    principal_cache.invalidate(token)
+    await get_current_user(token)
+    assert decode.await_count == 2
+
+
+async def test_token_is_checked_remotely_without_a_local_key(local_auth, monkeypatch):
+    monkeypatch.setattr(auth, "SUPABASE_JWT_SECRET", None)
+
+    assert await get_current_user(make_token()) == {"id": "remote-user"}
+    local_auth.assert_awaited_once()
+
+
+async def test_remote_mode_always_asks_supabase(local_auth, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_VERIFICATION", "remote")
+
+    assert await get_current_user(make_token()) == {"id": "remote-user"}
+
+
+async def test_jwks_cache_refetches_for_unknown_key_ids(monkeypatch):
+    monkeypatch.setattr(auth, "JWKS_MIN_REFRESH_SECONDS", 0)
+    fetch = AsyncMock(side_effect=[[{"kid": "a", "kty": "EC"}], [{"kid": "a"}, {"kid": "b", "kty": "EC"}]])
+    cache = JwksCache("https://example.supabase.co/jwks", ttl_seconds=600, fetch=fetch)
+
+    assert (await cache.get_key("a"))["kid"] == "a"
+    assert (await cache.get_key("a"))["kid"] == "a"
+    assert fetch.await_count == 1
+    # Rotated keys are picked up on first sight
+    assert (await cache.get_key("b"))["kty"] == "EC"
+    assert fetch.await_count == 2
+    assert cache.stats()["hits"] == 1
+
+
+async def test_jwks_cache_keeps_old_keys_when_fetching_fails():
+    fetch = AsyncMock(side_effect=[[{"kid": "a"}], OSError("unreachable")])
+    cache = JwksCache("https://example.supabase.co/jwks", ttl_seconds=0, fetch=fetch)
+
+    assert (await cache.get_key("a"))["kid"] == "a"
+    assert (await cache.get_key("a"))["kid"] == "a"
+    assert cache.stats()["failures"] == 1
+    with pytest.raises(SigningKeyUnavailable):
+        await cache.get_key("unknown")
@@ -0,0 +1,65 @@
+from app.services import inventory_events
+from app.services.booking_cache import BookingDocumentCache, booking_cache, document_size
+
+
+def booking_document(booking_id, flight_id="f1", user_id="u1"):
+    return {
+        "id": booking_id,
+        "user_id": user_id,
+        "status": "confirmed",
+        "flights": [{"id": f"bf-{booking_id}", "booking_id": booking_id, "flight_id": flight_id}],
+        "passengers": [{"first_name": "John", "last_name": "Doe"}],
+    }
+
+
+def test_cache_hit_returns_copies_and_counts():
+    """Documents handed out can be decorated without touching the cached one"""
+    cache = BookingDocumentCache(max_bytes=10_000, ttl_seconds=60)
+    cache.set(booking_document("b1"))
+
+    document = cache.get("b1")
+    document["passengers"][0]["first_name"] = "Jane"
+
+    assert cache.get("b1")["passengers"][0]["first_name"] == "John"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (2, 1, 0.6667)
+
+
+def test_cache_is_bounded_by_bytes():
+    """The least recently used documents go once the byte budget is exceeded"""
+    size = document_size(booking_document("b1"))
+    cache = BookingDocumentCache(max_bytes=size * 2, ttl_seconds=60)
+    cache.set(booking_document("b1"))
+    cache.set(booking_document("b2"))
+    cache.get("b1")
+    cache.set(booking_document("b3"))
+
+    assert cache.get("b2") is None
+    assert cache.get("b1") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= size * 2
+
+
+def test_invalidation_during_a_read_discards_the_stale_document():
+    cache = BookingDocumentCache(max_bytes=10_000, ttl_seconds=60)
+    generation = cache.generation()
+    cache.invalidate(["b1"])
+    cache.set(booking_document("b1"), generation)
+
+    assert cache.get("b1") is None
+
+
+def test_flight_status_change_drops_bookings_on_that_flight():
+    booking_cache.clear()
+    booking_cache.set(booking_document("b1", flight_id="f1"))
+    booking_cache.set(booking_document("b2", flight_id="f2"))
+
+    # Seat count changes leave booking documents alone
+    inventory_events.publish_seat_change({"id": "f1"}, "economy_available", 3)
+    assert booking_cache.get("b1") is not None
+
+    inventory_events.publish_status_change({"id": "f1"}, "delayed")
+    assert booking_cache.get("b1") is None
+    assert booking_cache.get("b2") is not None
+    booking_cache.clear()
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.booking_pipeline import GroupCommitPipeline
+
+
+def recording_writer(batches, fail=()):
+    async def write(items):
+        batches.append(list(items))
+        return [HTTPException(status_code=400, detail="sold out") if item in fail else f"booking-{item}" for item in items]
+    return write
+
+
+async def test_burst_is_written_in_one_batch():
+    batches = []
+    pipeline = GroupCommitPipeline(recording_writer(batches), max_batch=100, max_wait_ms=5)
+
+    results = await asyncio.gather(*(pipeline.submit("flight-1", index) for index in range(20)))
+
+    assert results == [f"booking-{index}" for index in range(20)]
+    assert batches == [list(range(20))]
+    assert pipeline.stats()["busy_keys"] == 0
+
+
+async def test_full_batch_does_not_wait_for_the_window():
+    batches = []
+    pipeline = GroupCommitPipeline(recording_writer(batches), max_batch=4, max_wait_ms=60_000)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(pipeline.submit("flight-1", index) for index in range(8))), timeout=1
+    )
+
+    assert len(results) == 8
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+
+async def test_each_request_gets_its_own_outcome():
+    batches = []
+    pipeline = GroupCommitPipeline(recording_writer(batches, fail={1}), max_batch=10, max_wait_ms=1)
+
+    outcomes = await asyncio.gather(*(pipeline.submit("flight-1", index) for index in range(3)), return_exceptions=True)
+
+    assert outcomes[0] == "booking-0" and outcomes[2] == "booking-2"
+    assert isinstance(outcomes[1], HTTPException)
+
+
+async def test_flights_are_batched_separately():
+    batches = []
+    pipeline = GroupCommitPipeline(recording_writer(batches), max_batch=10, max_wait_ms=1)
+
+    await asyncio.gather(pipeline.submit("flight-1", 1), pipeline.submit("flight-2", 2), pipeline.submit("flight-1", 3))
+
+    assert sorted(batches) == [[1, 3], [2]]
+
+
+async def test_writer_failure_fails_the_whole_batch():
+    async def broken(items):
+        raise RuntimeError("connection reset")
+
+    pipeline = GroupCommitPipeline(broken, max_batch=10, max_wait_ms=1)
+
+    with pytest.raises(RuntimeError):
+        await asyncio.gather(pipeline.submit("flight-1", 1), pipeline.submit("flight-1", 2))
+    assert pipeline.stats()["batches"] == 1
+
+
+async def test_requests_that_went_away_while_queued_are_not_written():
+    batches = []
+    pipeline = GroupCommitPipeline(recording_writer(batches), max_batch=10, max_wait_ms=50)
+
+    gone = asyncio.ensure_future(pipeline.submit("flight-1", 1))
+    staying = asyncio.ensure_future(pipeline.submit("flight-1", 2))
+    await asyncio.sleep(0)
+    gone.cancel()
+
+    assert await staying == "booking-2"
+    assert batches == [[2]]
+    assert pipeline.stats()["dropped"] == 1
+
+
+async def test_requests_that_went_away_during_the_write_are_undone():
+    writing = asyncio.Event()
+    finish = asyncio.Event()
+    abandoned = []
+
+    async def slow_writer(items):
+        writing.set()
+        await finish.wait()
+        return [f"booking-{item}" for item in items]
+
+    async def abandon(item, booking_id):
+        abandoned.append((item, booking_id))
+
+    pipeline = GroupCommitPipeline(slow_writer, max_batch=10, max_wait_ms=0, abandon=abandon)
+    gone = asyncio.ensure_future(pipeline.submit("flight-1", 1))
+    staying = asyncio.ensure_future(pipeline.submit("flight-1", 2))
+    await writing.wait()
+    gone.cancel()
+    finish.set()
+
+    assert await staying == "booking-2"
+    assert abandoned == [(1, "booking-1")]
+    assert pipeline.stats()["abandoned"] == 1
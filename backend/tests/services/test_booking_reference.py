@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.booking_reference import (
+    REFERENCE_ALPHABET,
+    REFERENCE_LENGTH,
+    BookingReferenceAllocator,
+    decode_reference,
+    encode_reference,
+)
+
+from conftest import make_session_factory
+
+
+def block_results(*blocks):
+    """Results of the sequence query, one (block start, block size) row each"""
+    results = []
+    for block in blocks:
+        result = MagicMock()
+        result.one.return_value = block
+        results.append(result)
+    return results
+
+
+def test_references_are_unique_reversible_and_unambiguous():
+    references = [encode_reference(number) for number in range(1, 5001)]
+
+    assert len(set(references)) == len(references)
+    assert all(len(reference) == len("SBJ-") + REFERENCE_LENGTH for reference in references)
+    assert all(set(reference[4:]) <= set(REFERENCE_ALPHABET) for reference in references)
+    assert [decode_reference(reference) for reference in references] == list(range(1, 5001))
+
+
+def test_consecutive_numbers_do_not_look_sequential():
+    first, second = encode_reference(1000), encode_reference(1001)
+    assert sum(a != b for a, b in zip(first, second)) > 2
+
+
+def test_decode_is_lenient_about_case_and_look_alikes():
+    reference = encode_reference(42)
+    assert decode_reference(reference.lower()) == 42
+    with pytest.raises(ValueError):
+        decode_reference("SBJ-1A2B3C")
+
+
+async def test_allocator_serves_a_block_from_memory():
+    factory, session, _ = make_session_factory(*block_results((1, 100), (101, 100)))
+    allocator = BookingReferenceAllocator(session_factory=factory)
+
+    numbers = [await allocator.next_number() for _ in range(60)]
+
+    assert numbers == list(range(1, 61))
+    assert session.execute.await_count == 1
+
+
+async def test_allocator_leases_the_next_block_ahead_of_time():
+    factory, session, _ = make_session_factory(*block_results((1, 10), (5001, 10)))
+    allocator = BookingReferenceAllocator(session_factory=factory)
+
+    numbers = [await allocator.next_number() for _ in range(9)]
+    await asyncio.sleep(0)  # let the background lease run
+    numbers += [await allocator.next_number() for _ in range(3)]
+
+    assert numbers == list(range(1, 11)) + [5001, 5002]
+    assert session.execute.await_count == 2
+    assert allocator.stats()["leases"] == 2
+
+
+async def test_concurrent_callers_share_one_lease():
+    """Callers queued on the same lease must not install, and discard, a block each"""
+    starts = iter(range(1, 10**6, 1000))
+
+    async def lease(statement):
+        await asyncio.sleep(0)
+        result = MagicMock()
+        result.one.return_value = (next(starts), 1000)
+        return result
+
+    factory, session, _ = make_session_factory()
+    session.execute = AsyncMock(side_effect=lease)
+    allocator = BookingReferenceAllocator(session_factory=factory)
+
+    numbers = await asyncio.gather(*(allocator.next_number() for _ in range(300)))
+
+    assert sorted(numbers) == list(range(1, 301))
+    assert allocator.stats()["leases"] <= 2
@@ -2,13 +2,35 @@ import pytest
 from unittest.mock import MagicMock, patch, AsyncMock
 from fastapi import HTTPException
 import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 
+from sqlalchemy.dialects import postgresql
+
+from app.models import Booking, BookingFlight, Flight, Passenger
+from app.services.booking_cache import booking_cache
 from app.services.booking import (
-    validate_flight_availability,
-    update_seat_availability,
-    rollback_seat_deductions,
-    create_booking
+    create_booking,
+    decode_booking_cursor,
+    get_booking_details_by_id,
+    list_user_bookings,
+    BookingWrite,
+    passenger_update_statements,
+    update_booking_details,
+    user_bookings_query,
+    write_booking,
+    write_booking_batch,
 )
+from app.services.seat_inventory import SeatRequest
+
+from conftest import make_session_factory
+
+
+@pytest.fixture(autouse=True)
+def mock_booking_references():
+    with patch('app.services.booking.booking_references') as mock_references:
+        mock_references.allocate = AsyncMock(return_value="SBJ-7K3M9QX")
+        yield mock_references
 
 
 @pytest.fixture
@@ -18,18 +40,6 @@ def mock_supabase():
     return mock
 
 
-@pytest.fixture
-def mock_flight_data():
-    """Fixture to create mock flight data for testing"""
-    return {
-        "id": str(uuid.uuid4()),
-        "flight_number": "SBJ123",
-        "economy_available": 50,
-        "business_available": 20,
-        "first_available": 10
-    }
-
-
 @pytest.fixture
 def mock_flight_items():
     """Fixture to create mock flight items for testing"""
@@ -77,300 +87,424 @@ def mock_booking_data(mock_flight_items):
     }
 
 
+@patch('app.services.booking.get_booking_details_by_id')
+@patch('app.services.booking.write_booking', new_callable=AsyncMock)
 @patch('app.services.booking.get_supabase_client')
-async def test_validate_flight_availability_success(mock_get_supabase, mock_supabase, mock_flight_items, mock_flight_data):
-    """Test successful validation of flight availability"""
+async def test_create_booking_success(
+    mock_get_supabase, mock_write_booking, mock_get_booking_details,
+    mock_supabase, mock_booking_data
+):
+    """Test successful booking creation"""
     # Arrange
+    user_id = "user-123"
+    booking_id = "booking-123"
     mock_get_supabase.return_value = mock_supabase
+    mock_write_booking.return_value = booking_id
     
-    # Configure mock responses for each flight
-    mock_response = MagicMock()
-    mock_response.data = mock_flight_data
-    mock_response.error = None
-    
-    # Set up the mock to return the flight data for each flight
-    mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = mock_response
+    # Mock get_booking_details_by_id to return booking details
+    mock_booking_details = {"id": booking_id, "flights": [], "passengers": []}
+    mock_get_booking_details.return_value = mock_booking_details
     
     # Act
-    is_valid, error_message, flights_to_update = await validate_flight_availability(mock_flight_items)
+    result = await create_booking(user_id, mock_booking_data)
     
     # Assert
-    assert is_valid is True
-    assert error_message == ""
-    assert len(flights_to_update) == len(mock_flight_items)
+    assert result == mock_booking_details
+    mock_write_booking.assert_awaited_once()
+    seat_requests = mock_write_booking.call_args.args[2]
+    assert [r.seats for r in seat_requests] == [2, 2]
+    assert [r.is_return for r in seat_requests] == [False, True]
+    assert all(r.cabin_class == "economy" for r in seat_requests)
+    mock_get_booking_details.assert_called_once_with(booking_id, user_id=user_id)
     
-    # Verify the correct calls were made
-    mock_supabase.table.assert_called_with("flights")
-    assert mock_supabase.table.return_value.select.call_count == len(mock_flight_items)
+    # No rows are written through PostgREST any more
+    mock_supabase.table.return_value.insert.assert_not_called()
 
 
+@patch('app.services.booking.get_booking_details_by_id')
+@patch('app.services.booking.write_booking', new_callable=AsyncMock)
 @patch('app.services.booking.get_supabase_client')
-async def test_validate_flight_availability_not_enough_seats(mock_get_supabase, mock_supabase, mock_flight_items):
-    """Test validation failure when not enough seats are available"""
+async def test_create_booking_mixed_cabins(
+    mock_get_supabase, mock_write_booking, mock_get_booking_details,
+    mock_supabase, mock_booking_data
+):
+    """Seats are taken from each passenger's own cabin class"""
     # Arrange
     mock_get_supabase.return_value = mock_supabase
-    
-    # Configure mock response with insufficient seats
-    mock_response = MagicMock()
-    mock_response.data = {
-        "id": mock_flight_items[0]["flight_id"],
-        "flight_number": "SBJ123",
-        "economy_available": 1,  # Not enough for 2 passengers
-        "business_available": 5,
-        "first_available": 3
-    }
-    mock_response.error = None
-    
-    # Set up the mock to return the flight data
-    mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = mock_response
+    mock_write_booking.return_value = "booking-123"
+    mock_get_booking_details.return_value = {"id": "booking-123"}
+    mock_booking_data["passengers"][1]["cabin_class"] = "business"
     
     # Act
-    is_valid, error_message, flights_to_update = await validate_flight_availability(mock_flight_items)
+    await create_booking("user-123", mock_booking_data)
     
     # Assert
-    assert is_valid is False
-    assert "Not enough economy seats available" in error_message
-    assert len(flights_to_update) == 0
+    seat_requests = mock_write_booking.call_args.args[2]
+    assert [(r.cabin_class, r.seats, r.is_return) for r in seat_requests] == [
+        ("economy", 1, False), ("business", 1, False), ("economy", 1, True), ("business", 1, True)
+    ]
 
 
+@patch('app.services.booking.write_booking', new_callable=AsyncMock)
 @patch('app.services.booking.get_supabase_client')
-async def test_validate_flight_availability_flight_not_found(mock_get_supabase, mock_supabase, mock_flight_items):
-    """Test validation failure when a flight is not found"""
+async def test_create_booking_validation_failure(
+    mock_get_supabase, mock_write_booking,
+    mock_supabase, mock_booking_data
+):
+    """Test booking creation failure when a leg is short of seats"""
     # Arrange
+    user_id = "user-123"
     mock_get_supabase.return_value = mock_supabase
     
-    # Configure mock response with an error
-    mock_response = MagicMock()
-    mock_response.data = None
-    mock_response.error = "Flight not found"
-    
-    # Set up the mock to return the error
-    mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = mock_response
+    # The transaction rolls back and reports the short leg
+    error_message = "Not enough seats available"
+    mock_write_booking.side_effect = HTTPException(status_code=400, detail=error_message)
     
-    # Act
-    is_valid, error_message, flights_to_update = await validate_flight_availability(mock_flight_items)
+    # Act & Assert
+    with pytest.raises(HTTPException) as excinfo:
+        await create_booking(user_id, mock_booking_data)
     
-    # Assert
-    assert is_valid is False
-    assert "Flight with ID" in error_message
-    assert "not found" in error_message
-    assert len(flights_to_update) == 0
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == error_message
 
 
+@patch('app.services.booking.write_booking', new_callable=AsyncMock)
 @patch('app.services.booking.get_supabase_client')
-async def test_update_seat_availability_deduct(mock_get_supabase, mock_supabase):
-    """Test successful seat deduction"""
+async def test_create_booking_unexpected_error(
+    mock_get_supabase, mock_write_booking,
+    mock_supabase, mock_booking_data
+):
+    """Test database errors surface as a 500"""
     # Arrange
     mock_get_supabase.return_value = mock_supabase
+    mock_write_booking.side_effect = RuntimeError("connection reset")
     
-    flights_to_update = [
-        {
-            "flight_id": "flight-1",
-            "cabin_class": "economy",
-            "num_passengers": 2,
-            "available_seats": 10
-        }
-    ]
-    
-    # Configure mock response for update
-    mock_response = MagicMock()
-    mock_response.data = {"id": "flight-1", "economy_available": 8}
-    mock_response.error = None
-    
-    # Set up the mock to return the update response
-    mock_supabase.table.return_value.update.return_value.eq.return_value.execute.return_value = mock_response
-    
-    # Act
-    updated_flights = await update_seat_availability(flights_to_update, deduct=True)
-    
-    # Assert
-    assert len(updated_flights) == 1
-    assert updated_flights[0]["new_available_seats"] == 8
+    # Act & Assert
+    with pytest.raises(HTTPException) as excinfo:
+        await create_booking("user-123", mock_booking_data)
     
-    # Verify the correct calls were made
-    mock_supabase.table.assert_called_with("flights")
-    mock_supabase.table.return_value.update.assert_called_once()
+    assert excinfo.value.status_code == 500
+    assert "connection reset" in excinfo.value.detail
 
 
-@patch('app.services.booking.get_supabase_client')
-async def test_update_seat_availability_restore(mock_get_supabase, mock_supabase):
-    """Test successful seat restoration"""
+@patch('app.services.booking.seat_inventory')
+async def test_write_booking_single_transaction_with_bulk_inserts(mock_seat_inventory, mock_booking_data):
+    """Seats and all rows go through one transaction; child rows are one executemany each"""
     # Arrange
-    mock_get_supabase.return_value = mock_supabase
-    
-    flights_to_update = [
-        {
-            "flight_id": "flight-1",
-            "cabin_class": "economy",
-            "num_passengers": 2,
-            "available_seats": 8
-        }
-    ]
-    
-    # Configure mock response for update
-    mock_response = MagicMock()
-    mock_response.data = {"id": "flight-1", "economy_available": 10}
-    mock_response.error = None
-    
-    # Set up the mock to return the update response
-    mock_supabase.table.return_value.update.return_value.eq.return_value.execute.return_value = mock_response
+    user_id = str(uuid.uuid4())
+    booking_id = uuid.uuid4()
+    reservations = [MagicMock()]
+    mock_seat_inventory.reserve_seats = AsyncMock(return_value=reservations)
+    booking_result = MagicMock()
+    booking_result.scalar_one.return_value = booking_id
+    factory, session, transaction = make_session_factory(booking_result, MagicMock(), MagicMock())
+    seat_requests = [SeatRequest(f["flight_id"], "economy", 2) for f in mock_booking_data["flights"]]
     
     # Act
-    updated_flights = await update_seat_availability(flights_to_update, deduct=False)
+    result = await write_booking(user_id, mock_booking_data, seat_requests, session_factory=factory)
     
     # Assert
-    assert len(updated_flights) == 1
-    assert updated_flights[0]["new_available_seats"] == 10
-    
-    # Verify the correct calls were made
-    mock_supabase.table.assert_called_with("flights")
-    mock_supabase.table.return_value.update.assert_called_once()
+    assert result == str(booking_id)
+    mock_seat_inventory.reserve_seats.assert_awaited_once_with(session, seat_requests)
+    booking_insert = session.execute.call_args_list[0].args[0].compile()
+    assert booking_insert.params["status"] == "pending"
+    assert booking_insert.params["booking_reference"] == "SBJ-7K3M9QX"
+    assert "hold_expires_at" in str(booking_insert)
+    assert session.execute.await_count == 3
+    flights_rows = session.execute.call_args_list[1].args[1]
+    passenger_rows = session.execute.call_args_list[2].args[1]
+    assert [row["is_return_flight"] for row in flights_rows] == [False, True]
+    assert all(row["booking_id"] == booking_id for row in flights_rows + passenger_rows)
+    assert [row["date_of_birth"].year for row in passenger_rows] == [1990, 2015]
+    assert transaction.__aexit__.call_args.args[0] is None
+    mock_seat_inventory.publish_seat_changes.assert_called_once_with(reservations)
 
 
-@patch('app.services.booking.update_seat_availability')
-async def test_rollback_seat_deductions(mock_update_seat_availability):
-    """Test rollback of seat deductions"""
+@patch('app.services.booking.seat_inventory')
+async def test_write_booking_failure_rolls_back_seats(mock_seat_inventory, mock_booking_data):
+    """A failed insert aborts the transaction, so the seat decrements are never committed"""
     # Arrange
-    mock_update_seat_availability.return_value = []
-    flights_updated = [
-        {
-            "flight_id": "flight-1",
-            "cabin_class": "economy",
-            "num_passengers": 2,
-            "available_seats": 8
-        }
-    ]
+    mock_seat_inventory.reserve_seats = AsyncMock(return_value=[MagicMock()])
+    booking_result = MagicMock()
+    booking_result.scalar_one.return_value = uuid.uuid4()
+    factory, _, transaction = make_session_factory(booking_result, RuntimeError("constraint violation"))
     
-    # Act
-    await rollback_seat_deductions(flights_updated)
+    # Act & Assert
+    with pytest.raises(RuntimeError):
+        await write_booking(str(uuid.uuid4()), mock_booking_data, [], session_factory=factory)
     
-    # Assert
-    mock_update_seat_availability.assert_called_once_with(flights_updated, deduct=False)
+    assert transaction.__aexit__.call_args.args[0] is RuntimeError
+    mock_seat_inventory.publish_seat_changes.assert_not_called()
 
 
-@patch('app.services.booking.get_booking_details_by_id')
-@patch('app.services.booking.update_seat_availability')
-@patch('app.services.booking.validate_flight_availability')
-@patch('app.services.booking.get_supabase_client')
-async def test_create_booking_success(
-    mock_get_supabase, mock_validate_flight_availability, 
-    mock_update_seat_availability, mock_get_booking_details,
-    mock_supabase, mock_booking_data
-):
-    """Test successful booking creation"""
+def make_booking_rows(count):
+    """Bookings with one flight and two passengers each, as the ORM would return them"""
+    user_id = uuid.uuid4()
+    bookings, flight_rows, passengers = [], [], []
+    for index in range(count):
+        booking = Booking(id=uuid.uuid4(), user_id=user_id, booking_reference=f"SBJ-{index:06d}",
+                          trip_type="one-way", total_amount=Decimal("199.00"), status="confirmed")
+        flight = Flight(id=uuid.uuid4(), flight_number=f"SB{index}", airline_id=uuid.uuid4(),
+                        origin_airport_id=uuid.uuid4(), destination_airport_id=uuid.uuid4(),
+                        economy_price=Decimal("199.00"), economy_available=10)
+        booking_flight = BookingFlight(id=uuid.uuid4(), booking_id=booking.id, flight_id=flight.id, is_return_flight=False)
+        bookings.append(booking)
+        flight_rows.append((booking_flight, flight))
+        for name in ("John", "Jane"):
+            passengers.append(Passenger(id=uuid.uuid4(), booking_id=booking.id, type="adult", first_name=name,
+                                        last_name="Doe", date_of_birth=date(1990, 1, 1), cabin_class="economy"))
+    return user_id, bookings, flight_rows, passengers
+
+
+@patch('app.services.booking.reference_data')
+async def test_list_user_bookings_details_use_constant_queries(mock_reference_data):
+    """A page of 200 bookings is loaded with the same three queries as one booking"""
     # Arrange
-    user_id = "user-123"
-    mock_get_supabase.return_value = mock_supabase
-    
-    # Mock validate_flight_availability to return success
-    mock_validate_flight_availability.return_value = (True, "", [{"flight_id": "flight-1"}])
-    
-    # Mock update_seat_availability to return updated flights
-    mock_update_seat_availability.return_value = [{"flight_id": "flight-1", "new_available_seats": 8}]
-    
-    # Mock booking creation response
-    booking_id = "booking-123"
-    mock_booking_response = MagicMock()
-    mock_booking_response.data = [{"id": booking_id}]
-    mock_booking_response.error = None
-    
-    # Mock booking flights response
-    mock_flights_response = MagicMock()
-    mock_flights_response.data = [{"id": "bf-1"}, {"id": "bf-2"}]
-    mock_flights_response.error = None
-    
-    # Mock passengers response
-    mock_passengers_response = MagicMock()
-    mock_passengers_response.data = [{"id": "p-1"}, {"id": "p-2"}]
-    mock_passengers_response.error = None
-    
-    # Set up the mock responses
-    mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
-        mock_booking_response, mock_flights_response, mock_passengers_response
-    ]
-    
-    # Mock get_booking_details_by_id to return booking details
-    mock_booking_details = {"id": booking_id, "flights": [], "passengers": []}
-    mock_get_booking_details.return_value = mock_booking_details
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.refresh_missing = AsyncMock()
+    user_id, bookings, flight_rows, passengers = make_booking_rows(200)
+    bookings_result = MagicMock()
+    bookings_result.scalars.return_value.all.return_value = bookings
+    flights_result = MagicMock()
+    flights_result.all.return_value = flight_rows
+    passengers_result = MagicMock()
+    passengers_result.scalars.return_value.all.return_value = passengers
+    factory, session, _ = make_session_factory(bookings_result, flights_result, passengers_result)
     
     # Act
-    result = await create_booking(user_id, mock_booking_data)
+    page = await list_user_bookings(str(user_id), limit=200, session_factory=factory)
+    documents = page.bookings
     
     # Assert
-    assert result == mock_booking_details
-    mock_validate_flight_availability.assert_called_once()
-    mock_update_seat_availability.assert_called_once()
-    mock_get_booking_details.assert_called_once_with(booking_id, user_id=user_id)
+    assert session.execute.await_count == 3
+    mock_reference_data.refresh_missing.assert_awaited_once()
+    assert mock_reference_data.attach.call_count == 200
+    assert [d["id"] for d in documents] == [str(b.id) for b in bookings]
+    first = documents[0]
+    assert first["flights"][0]["flight"]["flight_number"] == "SB0"
+    assert first["flights"][0]["booking_id"] == first["id"]
+    assert [p["first_name"] for p in first["passengers"]] == ["John", "Jane"]
+    assert first["passengers"][0]["date_of_birth"] == "1990-01-01"
+    assert first["total_amount"] == 199.0
+
+
+async def test_list_user_bookings_without_bookings():
+    bookings_result = MagicMock()
+    bookings_result.scalars.return_value.all.return_value = []
+    factory, session, _ = make_session_factory(bookings_result)
+    
+    page = await list_user_bookings(str(uuid.uuid4()), session_factory=factory)
     
-    # Verify the correct calls were made to create booking, flights, and passengers
-    assert mock_supabase.table.call_count >= 3
+    assert page.bookings == [] and page.next_cursor is None
+    assert session.execute.await_count == 1
 
 
-@patch('app.services.booking.rollback_seat_deductions')
-@patch('app.services.booking.update_seat_availability')
-@patch('app.services.booking.validate_flight_availability')
-@patch('app.services.booking.get_supabase_client')
-async def test_create_booking_validation_failure(
-    mock_get_supabase, mock_validate_flight_availability, 
-    mock_update_seat_availability, mock_rollback_seat_deductions,
-    mock_supabase, mock_booking_data
-):
-    """Test booking creation failure due to validation"""
-    # Arrange
-    user_id = "user-123"
-    mock_get_supabase.return_value = mock_supabase
+def compiled(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+async def test_list_user_bookings_pages_by_keyset():
+    """One row past the page size means there is a next page, keyed on the last row kept"""
+    user_id, bookings, _, _ = make_booking_rows(3)
+    start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    for index, booking in enumerate(bookings):
+        booking.created_at = start - timedelta(minutes=index)
+    bookings_result = MagicMock()
+    bookings_result.scalars.return_value.all.return_value = bookings
+    factory, session, _ = make_session_factory(bookings_result)
+    
+    page = await list_user_bookings(str(user_id), limit=2, details=False, session_factory=factory)
+    
+    assert [b["id"] for b in page.bookings] == [str(b.id) for b in bookings[:2]]
+    assert decode_booking_cursor(page.next_cursor) == (bookings[1].created_at, bookings[1].id)
+    sql = compiled(session.execute.call_args.args[0])
+    assert "ORDER BY bookings.created_at DESC, bookings.id DESC" in sql
+    assert "LIMIT" in sql
+    
+    next_sql = compiled(user_bookings_query(str(user_id), cursor=page.next_cursor))
+    assert "(bookings.created_at, bookings.id) < (" in next_sql
+
+
+def test_user_bookings_query_filters():
+    sql = compiled(user_bookings_query(str(uuid.uuid4()), status_filter="confirmed", when="past", trip_type="round-trip"))
     
-    # Mock validate_flight_availability to return failure
-    error_message = "Not enough seats available"
-    mock_validate_flight_availability.return_value = (False, error_message, [])
+    assert "bookings.status = " in sql
+    assert "bookings.trip_type = " in sql
+    assert "NOT (EXISTS (SELECT" in sql
+    assert "flights.departure_time > now()" in sql
+
+
+def test_decode_booking_cursor_rejects_garbage():
+    with pytest.raises(HTTPException) as excinfo:
+        decode_booking_cursor("not-a-cursor")
+    assert excinfo.value.status_code == 400
+
+
+@patch('app.services.booking.reference_data')
+async def test_get_booking_details_by_id_reads_through_cache(mock_reference_data):
+    """The second read is served from the cache and still checks ownership"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.refresh_missing = AsyncMock()
+    booking_cache.clear()
+    user_id, bookings, flight_rows, passengers = make_booking_rows(1)
+    booking_result = MagicMock()
+    booking_result.scalar_one_or_none.return_value = bookings[0]
+    flights_result = MagicMock()
+    flights_result.all.return_value = flight_rows
+    passengers_result = MagicMock()
+    passengers_result.scalars.return_value.all.return_value = passengers
+    factory, session, _ = make_session_factory(booking_result, flights_result, passengers_result)
+    booking_id = str(bookings[0].id)
+    
+    first = await get_booking_details_by_id(booking_id, user_id=str(user_id), session_factory=factory)
+    second = await get_booking_details_by_id(booking_id, user_id=str(user_id), session_factory=factory)
+    
+    assert first == second
+    assert session.execute.await_count == 3
+    with pytest.raises(HTTPException) as excinfo:
+        await get_booking_details_by_id(booking_id, user_id=str(uuid.uuid4()), session_factory=factory)
+    assert excinfo.value.status_code == 404
+    booking_cache.clear()
+
+
+async def test_get_booking_details_by_id_not_found():
+    missing = MagicMock()
+    missing.scalar_one_or_none.return_value = None
+    factory, _, _ = make_session_factory(missing)
     
-    # Act & Assert
     with pytest.raises(HTTPException) as excinfo:
-        await create_booking(user_id, mock_booking_data)
+        await get_booking_details_by_id(str(uuid.uuid4()), user_id=str(uuid.uuid4()), session_factory=factory)
     
+    assert excinfo.value.status_code == 404
+
+
+def test_passenger_update_statements_group_by_changed_fields():
+    """Nine passengers renamed together are one statement; a different edit gets its own"""
+    booking_id = uuid.uuid4()
+    updates = [{"id": str(uuid.uuid4()), "last_name": "Smith", "first_name": f"P{i}"} for i in range(9)]
+    updates.append({"id": str(uuid.uuid4()), "date_of_birth": "1990-01-01"})
+    
+    statements = passenger_update_statements(booking_id, updates)
+    
+    assert len(statements) == 2
+    sql = compiled(statements[1])
+    assert sql.startswith("UPDATE passengers SET first_name=passenger_changes.first_name, last_name=passenger_changes.last_name")
+    assert "FROM (VALUES" in sql
+    assert "passengers.booking_id = " in sql
+
+
+def test_passenger_update_statements_reject_bad_ids():
+    with pytest.raises(HTTPException) as excinfo:
+        passenger_update_statements(uuid.uuid4(), [{"id": "p1", "first_name": "Jane"}])
     assert excinfo.value.status_code == 400
-    assert excinfo.value.detail == error_message
-    
-    # Verify no seat updates or rollbacks were attempted
-    mock_update_seat_availability.assert_not_called()
-    mock_rollback_seat_deductions.assert_not_called()
 
 
-@patch('app.services.booking.rollback_seat_deductions')
-@patch('app.services.booking.update_seat_availability')
-@patch('app.services.booking.validate_flight_availability')
-@patch('app.services.booking.get_supabase_client')
-async def test_create_booking_rollback_on_failure(
-    mock_get_supabase, mock_validate_flight_availability, 
-    mock_update_seat_availability, mock_rollback_seat_deductions,
-    mock_supabase, mock_booking_data
-):
-    """Test rollback when booking creation fails"""
-    # Arrange
-    user_id = "user-123"
-    mock_get_supabase.return_value = mock_supabase
+@patch('app.services.booking.seat_inventory')
+@patch('app.services.booking.seat_holds')
+@patch('app.services.booking.reference_data')
+async def test_update_booking_details_in_one_transaction(mock_reference_data, mock_seat_holds, mock_seat_inventory):
+    """Cancellation and passenger edits commit together and the new document comes back"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.refresh_missing = AsyncMock()
+    released = [MagicMock()]
+    mock_seat_holds.cancel_bookings = AsyncMock(return_value=([], released))
+    user_id, bookings, flight_rows, passengers = make_booking_rows(1)
+    booking_result = MagicMock()
+    booking_result.scalar_one_or_none.return_value = bookings[0]
+    flights_result = MagicMock()
+    flights_result.all.return_value = flight_rows
+    passengers_result = MagicMock()
+    passengers_result.scalars.return_value.all.return_value = passengers
+    factory, session, transaction = make_session_factory(
+        booking_result, MagicMock(), flights_result, passengers_result
+    )
+    changes = {
+        "status": "cancelled",
+        "passengers": [{"id": str(p.id), "last_name": "Smith"} for p in passengers],
+    }
     
-    # Mock validate_flight_availability to return success
-    updated_flights = [{"flight_id": "flight-1", "new_available_seats": 8}]
-    mock_validate_flight_availability.return_value = (True, "", [{"flight_id": "flight-1"}])
+    document = await update_booking_details(str(bookings[0].id), str(user_id), changes, session_factory=factory)
     
-    # Mock update_seat_availability to return updated flights
-    mock_update_seat_availability.return_value = updated_flights
+    assert document["status"] == "cancelled"
+    assert session.execute.await_count == 4
+    assert "FOR UPDATE" in compiled(session.execute.call_args_list[0].args[0])
+    mock_seat_holds.cancel_bookings.assert_awaited_once()
+    assert transaction.__aexit__.call_args.args[0] is None
+    mock_seat_inventory.publish_seat_changes.assert_called_once_with(released)
+
+
+async def test_update_booking_details_not_owned():
+    missing = MagicMock()
+    missing.scalar_one_or_none.return_value = None
+    factory, session, _ = make_session_factory(missing)
+    booking_id = str(uuid.uuid4())
     
-    # Mock booking creation to fail
-    mock_booking_response = MagicMock()
-    mock_booking_response.data = None
-    mock_booking_response.error = "Database error"
+    with pytest.raises(HTTPException) as excinfo:
+        await update_booking_details(booking_id, str(uuid.uuid4()), {"status": "cancelled"}, session_factory=factory)
     
-    # Set up the mock to return the error
-    mock_supabase.table.return_value.insert.return_value.execute.return_value = mock_booking_response
+    assert excinfo.value.status_code == 404
+    assert excinfo.value.detail == f"Booking with ID {booking_id} not found or does not belong to you"
+
+
+@pytest.mark.parametrize("new_status", ["confirmed", "pending"])
+async def test_update_booking_details_only_cancels(new_status):
+    """Confirming an unpaid hold or reviving a cancelled booking would skip the seat accounting"""
+    factory, session, _ = make_session_factory()
     
-    # Act & Assert
     with pytest.raises(HTTPException) as excinfo:
-        await create_booking(user_id, mock_booking_data)
+        await update_booking_details(str(uuid.uuid4()), str(uuid.uuid4()), {"status": new_status}, session_factory=factory)
     
-    assert excinfo.value.status_code == 500
-    assert "Failed to create booking" in excinfo.value.detail
-    
-    # Verify rollback was attempted
-    mock_rollback_seat_deductions.assert_called_once_with(updated_flights)
+    assert excinfo.value.status_code == 409
+    session.execute.assert_not_awaited()
+
+
+def booking_writes(mock_booking_data, count):
+    return [
+        BookingWrite(str(uuid.uuid4()), mock_booking_data,
+                     [SeatRequest(f["flight_id"], "economy", 2) for f in mock_booking_data["flights"]], f"SBJ-00000{index}")
+        for index in range(count)
+    ]
+
+
+def inserted_bookings_result(writes):
+    result = MagicMock()
+    result.all.return_value = [(uuid.uuid4(), write.booking_reference) for write in reversed(writes)]
+    return result
+
+
+@patch('app.services.booking.seat_inventory')
+async def test_write_booking_batch_takes_seats_once_for_the_batch(mock_seat_inventory, mock_booking_data):
+    """Ten bookings: one seat decrement per flight and cabin, three inserts, one commit"""
+    mock_seat_inventory.reserve_seats = AsyncMock(return_value=[MagicMock()])
+    writes = booking_writes(mock_booking_data, 10)
+    factory, session, transaction = make_session_factory(
+        inserted_bookings_result(writes), MagicMock(), MagicMock(), savepoint=True
+    )
+    
+    outcomes = await write_booking_batch(writes, session_factory=factory)
+    
+    assert all(isinstance(outcome, str) for outcome in outcomes)
+    assert len(set(outcomes)) == 10
+    combined = mock_seat_inventory.reserve_seats.call_args.args[1]
+    assert [request.seats for request in combined] == [20, 20]
+    assert session.execute.await_count == 3
+    assert len(session.execute.call_args_list[2].args[1]) == 10 * len(mock_booking_data["passengers"])
+    assert transaction.__aexit__.call_args.args[0] is None
+
+
+@patch('app.services.booking.seat_inventory')
+async def test_write_booking_batch_falls_back_to_one_by_one(mock_seat_inventory, mock_booking_data):
+    """Not enough seats for everyone: the bookings that fit are kept, the rest fail alone"""
+    shortage = HTTPException(status_code=400, detail="Not enough economy seats available")
+    mock_seat_inventory.reserve_seats = AsyncMock(side_effect=[shortage, [MagicMock()], shortage, [MagicMock()]])
+    writes = booking_writes(mock_booking_data, 3)
+    factory, session, _ = make_session_factory(
+        inserted_bookings_result([writes[0], writes[2]]), MagicMock(), MagicMock(), savepoint=True
+    )
+    
+    outcomes = await write_booking_batch(writes, session_factory=factory)
+    
+    assert isinstance(outcomes[0], str) and isinstance(outcomes[2], str)
+    assert outcomes[1] is shortage
+    assert session.begin_nested.call_count == 4
+    mock_seat_inventory.publish_seat_changes.assert_called_once()
@@ -0,0 +1,129 @@
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.models import Booking, Flight
+from app.services.flight_cancellation import FlightCancellation, cancel_flight, notify_cancelled_bookings
+from app.services.seat_inventory import SeatRequest, SeatReservation
+
+from conftest import make_session_factory
+
+
+FLIGHT_ID = uuid.UUID(int=1)
+OTHER_LEG = str(uuid.UUID(int=2))
+USER_ID = str(uuid.UUID(int=9))
+
+
+def flight_result(flight):
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = flight
+    return result
+
+
+def rows_result(*rows):
+    result = MagicMock()
+    result.all.return_value = list(rows)
+    return result
+
+
+def compiled(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def cancelled_flight():
+    return Flight(id=FLIGHT_ID, flight_number="SB400", status="cancelled", origin_airport_id=uuid.UUID(int=10),
+                  destination_airport_id=uuid.UUID(int=11), economy_available=0)
+
+
+@patch('app.services.flight_cancellation.inventory_events')
+@patch('app.services.flight_cancellation.publish_seat_changes')
+@patch('app.services.flight_cancellation.cancel_bookings', new_callable=AsyncMock)
+async def test_cancel_flight_cancels_all_bookings_in_one_transaction(mock_cancel_bookings, mock_publish, mock_events):
+    """A whole flight's bookings take the same fixed number of statements"""
+    bookings = [{"id": str(uuid.uuid4()), "user_id": USER_ID, "status": "cancelled"} for _ in range(400)]
+    released = [SeatReservation(SeatRequest(OTHER_LEG, "economy", 400), {"id": OTHER_LEG}, 412)]
+    mock_cancel_bookings.return_value = (bookings, released)
+    factory, session, transaction = make_session_factory(
+        flight_result(cancelled_flight()),
+        rows_result((uuid.UUID(USER_ID), "traveller@example.com")),
+    )
+
+    cancellation = await cancel_flight(str(FLIGHT_ID), session_factory=factory)
+
+    assert cancellation.summary() == {
+        "flight_id": str(FLIGHT_ID), "status": "cancelled", "bookings_cancelled": 400, "seats_returned": 400,
+    }
+    assert cancellation.emails == {USER_ID: "traveller@example.com"}
+    assert session.execute.await_count == 2
+    assert "UPDATE flights SET status=" in compiled(session.execute.call_args_list[0].args[0])
+    condition = compiled(mock_cancel_bookings.call_args.args[1])
+    assert "booking_flights.flight_id = " in condition
+    assert mock_cancel_bookings.call_args.kwargs["exclude_flights"] == [FLIGHT_ID]
+    assert transaction.__aexit__.call_args.args[0] is None
+    mock_publish.assert_called_once_with(released)
+    mock_events.publish_status_change.assert_called_once()
+
+
+@patch('app.services.flight_cancellation.inventory_events')
+@patch('app.services.flight_cancellation.publish_seat_changes')
+@patch('app.services.seat_holds.release_seats', new_callable=AsyncMock)
+async def test_cancel_flight_leaves_its_own_seat_counts_alone(mock_release_seats, mock_publish, mock_events):
+    """Only the other legs of the cancelled bookings get their seats back"""
+    booking = Booking(id=uuid.uuid4(), user_id=uuid.UUID(USER_ID), booking_reference="SBJ-7K3M9QX",
+                      trip_type="round-trip", total_amount=200, status="cancelled")
+    cancelled = MagicMock()
+    cancelled.scalars.return_value.all.return_value = [booking]
+    released = [SeatReservation(SeatRequest(OTHER_LEG, "economy", 2), {"id": OTHER_LEG}, 120)]
+    mock_release_seats.return_value = released
+    factory, session, _ = make_session_factory(
+        flight_result(cancelled_flight()),
+        cancelled,
+        # What the seat query returns once the cancelled flight is filtered out
+        rows_result((uuid.UUID(OTHER_LEG), "economy", 2)),
+        rows_result(),
+    )
+
+    cancellation = await cancel_flight(str(FLIGHT_ID), session_factory=factory)
+
+    seats_query = session.execute.call_args_list[2].args[0]
+    assert "booking_flights.flight_id NOT IN" in compiled(seats_query)
+    assert [FLIGHT_ID] in seats_query.compile().params.values()
+    mock_release_seats.assert_awaited_once_with(session, [SeatRequest(OTHER_LEG, "economy", 2)])
+    assert cancellation.summary()["seats_returned"] == 2
+    mock_publish.assert_called_once_with(released)
+
+
+@patch('app.services.flight_cancellation.inventory_events')
+@patch('app.services.flight_cancellation.cancel_bookings', new_callable=AsyncMock, return_value=([], []))
+async def test_cancel_flight_rerun_is_a_no_op(mock_cancel_bookings, mock_events):
+    factory, session, _ = make_session_factory(flight_result(cancelled_flight()))
+
+    cancellation = await cancel_flight(str(FLIGHT_ID), session_factory=factory)
+
+    assert cancellation.summary()["bookings_cancelled"] == 0
+    assert cancellation.summary()["seats_returned"] == 0
+    assert session.execute.await_count == 1
+
+
+async def test_cancel_flight_unknown_flight():
+    factory, _, _ = make_session_factory(flight_result(None))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await cancel_flight(str(FLIGHT_ID), session_factory=factory)
+    assert exc_info.value.status_code == 404
+
+
+@patch('app.services.flight_cancellation.EmailNotificationService.send_booking_update', new_callable=AsyncMock)
+async def test_notify_cancelled_bookings_skips_users_without_email(mock_send):
+    mock_send.side_effect = [Exception("smtp down"), True]
+    bookings = [{"id": str(uuid.uuid4()), "user_id": USER_ID} for _ in range(2)]
+    bookings.append({"id": str(uuid.uuid4()), "user_id": str(uuid.uuid4())})
+    cancellation = FlightCancellation({"id": str(FLIGHT_ID)}, bookings, [], {USER_ID: "traveller@example.com"})
+
+    await notify_cancelled_bookings(cancellation)
+
+    # One failing email does not stop the rest
+    assert mock_send.await_count == 2
@@ -0,0 +1,134 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+pytest.importorskip("numpy")
+
+from app.models import Flight
+from app.services.flight_index import ColumnarFlightIndex
+from app.services.inventory_events import FlightChange
+
+from conftest import make_session_factory
+
+
+DAY = date(2025, 12, 1)
+
+
+def flight_row(flight_id, hour, economy_price, duration=180, airline_id="airline-1", economy_available=10, business_price=None):
+    departure = datetime(2025, 12, 1, hour, tzinfo=timezone.utc)
+    return {
+        "id": flight_id,
+        "flight_number": f"SB{flight_id}",
+        "airline_id": airline_id,
+        "origin_airport_id": "origin-1",
+        "destination_airport_id": "destination-1",
+        "departure_time": departure,
+        "arrival_time": departure + timedelta(minutes=duration),
+        "duration_minutes": duration,
+        "status": "scheduled",
+        "economy_price": economy_price,
+        "premium_economy_price": None,
+        "business_price": business_price,
+        "first_price": None,
+        "economy_available": economy_available,
+        "premium_economy_available": 0,
+        "business_available": 4,
+        "first_available": 0,
+    }
+
+
+@pytest.fixture
+def index():
+    index = ColumnarFlightIndex()
+    index.build([
+        flight_row("f1", 8, 300.0, duration=200),
+        flight_row("f2", 12, 150.0, duration=180, airline_id="airline-2"),
+        flight_row("f3", 17, 220.0, duration=240, economy_available=1),
+        flight_row("f4", 9, 100.0, business_price=900.0),
+    ])
+    return index
+
+
+def search_ids(index, **kwargs):
+    params = dict(cabin_class="economy", total_passengers=1)
+    params.update(kwargs)
+    return [row["id"] for row in index.search("origin-1", "destination-1", DAY, **params)]
+
+
+def test_search_applies_filters_as_masks(index):
+    """Availability, price, duration and airline filters all narrow the partition"""
+    assert search_ids(index, total_passengers=2, sort_by="price") == ["f4", "f2", "f1"]
+    assert search_ids(index, min_price=120, max_price=250, sort_by="price") == ["f2", "f3"]
+    assert search_ids(index, max_duration=180, sort_by="price") == ["f4", "f2"]
+    assert search_ids(index, airline_id="airline-2") == ["f2"]
+    assert search_ids(index, airline_id="unknown") == []
+
+
+def test_search_supports_all_sort_modes(index):
+    """Each sort_by mode orders the matching rows in both directions"""
+    assert search_ids(index, sort_by="departure_time") == ["f1", "f4", "f2", "f3"]
+    assert search_ids(index, sort_by="arrival_time", sort_order="desc") == ["f3", "f2", "f4", "f1"]
+    assert search_ids(index, sort_by="duration", sort_order="desc") == ["f3", "f1", "f2", "f4"]
+
+
+def test_search_null_prices_are_excluded_by_price_filters(index):
+    """Cabins without a fare never satisfy a price filter, like NULL in SQL"""
+    assert search_ids(index, cabin_class="business", min_price=0) == ["f4"]
+
+
+def test_search_other_partitions_are_empty(index):
+    """Searching another day or route never scans this partition"""
+    assert index.search("origin-1", "destination-1", date(2025, 12, 2), "economy", 1) == []
+
+
+def test_apply_change_updates_seats_and_status(index):
+    """Published seat and status changes are reflected in subsequent searches"""
+    index.apply_change(FlightChange(flight={"flight_id": "f2"}, available={"economy_available": 0}))
+    index.apply_change(FlightChange(flight={"id": "f1"}, status="delayed"))
+
+    rows = {row["id"]: row for row in index.search("origin-1", "destination-1", DAY, "economy", 0)}
+    assert rows["f2"]["economy_available"] == 0
+    assert rows["f1"]["status"] == "delayed"
+    assert "f2" not in search_ids(index)
+    assert index.stats()["deltas_applied"] == 2
+
+
+def test_search_rows_are_rendered_from_columns(index):
+    """Rows carry the display columns rebuilt from the arrays, nothing else"""
+    row = {row["id"]: row for row in index.search("origin-1", "destination-1", DAY, "economy", 1)}["f4"]
+
+    assert row == flight_row("f4", 9, 100.0, business_price=900.0)
+
+
+def scanning_session_factory(rows, during_scan):
+    """Session factory whose streamed scan calls `during_scan` halfway through"""
+    async def scan():
+        for i, row in enumerate(rows):
+            if i == len(rows) // 2:
+                during_scan()
+            yield Flight(**row)
+
+    factory, session, _ = make_session_factory()
+    session.stream_scalars = AsyncMock(side_effect=lambda *args, **kwargs: scan())
+    return factory
+
+
+async def test_changes_published_during_a_reload_survive_the_swap():
+    """Seats sold while the table is scanned are not undone by the reload"""
+    rows = [flight_row("f1", 8, 300.0), flight_row("f2", 12, 150.0)]
+    index = ColumnarFlightIndex()
+    index.build(rows)
+
+    def sell_seats():
+        # f1 was already read with 10 seats when these are sold
+        index.apply_change(FlightChange(flight={"id": "f1"}, available={"economy_available": 2}))
+        index.apply_change(FlightChange(flight={"id": "f2"}, status="cancelled"))
+
+    index._session_factory = scanning_session_factory(rows, sell_seats)
+    await index.load()
+
+    result = {row["id"]: row for row in index.search("origin-1", "destination-1", DAY, "economy", 0)}
+    assert result["f1"]["economy_available"] == 2
+    assert result["f2"]["status"] == "cancelled"
+    assert index.stats()["deltas_replayed"] == 2
+    assert not index.is_loading
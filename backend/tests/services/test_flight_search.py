@@ -0,0 +1,354 @@
+import asyncio
+import base64
+import json
+import pytest
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.models import Airline, Airport
+from app.schemas.flight import FlightSearchParams, Passengers
+from app.services.flight_search import (
+    after_keyset,
+    build_fare_calendar_query,
+    build_leg_query,
+    decode_cursor,
+    encode_cursor,
+    fare_calendar,
+    parse_search_date,
+    rank_round_trip_pairs,
+    search_flight_inventory,
+    search_flight_page,
+)
+from app.services.reference_data import ReferenceDataRegistry
+
+from conftest import make_session_factory
+
+
+ORIGIN_ID = str(uuid.uuid4())
+DESTINATION_ID = str(uuid.uuid4())
+AIRLINE_ID = str(uuid.uuid4())
+
+
+def compile_query(query):
+    """Compile a statement for PostgreSQL and return (sql, params)"""
+    compiled = query.compile(dialect=postgresql.dialect())
+    return str(compiled), compiled.params
+
+
+def scalars_result(rows):
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = rows
+    return result
+
+
+def fingerprint_result(value):
+    result = MagicMock()
+    result.one.return_value = value
+    return result
+
+
+def test_build_leg_query_only_selects_flights():
+    """The leg query filters by airport ids and never joins the reference tables"""
+    query = build_leg_query(ORIGIN_ID, DESTINATION_ID, date(2025, 12, 1), "economy", 2)
+    sql, params = compile_query(query)
+
+    assert "JOIN" not in sql
+    assert "flights.origin_airport_id =" in sql
+    assert "flights.economy_available >=" in sql
+    assert 2 in params.values()
+
+
+def test_build_leg_query_filters_and_price_sort():
+    """Optional filters and the cabin-specific price sort are applied"""
+    query = build_leg_query(
+        ORIGIN_ID, DESTINATION_ID, date(2025, 12, 1), "premium-economy", 1,
+        sort_by="price", sort_order="desc", min_price=100, max_price=900,
+        airline_id=AIRLINE_ID, max_duration=300,
+    )
+    sql, params = compile_query(query)
+
+    assert "flights.premium_economy_price >=" in sql
+    assert "flights.premium_economy_price <=" in sql
+    assert "flights.duration_minutes <=" in sql
+    assert "flights.airline_id =" in sql
+    assert "ORDER BY flights.premium_economy_price DESC, flights.id" in sql
+    assert AIRLINE_ID in params.values()
+
+
+def test_build_leg_query_without_passengers_skips_availability():
+    """A search with no seated passengers does not filter on availability"""
+    sql, _ = compile_query(build_leg_query(ORIGIN_ID, DESTINATION_ID, date(2025, 12, 1), "business", 0))
+    assert "business_available" not in sql.split("WHERE", 1)[1]
+
+
+def test_parse_search_date_rejects_invalid_dates():
+    """Malformed dates are reported as a bad request"""
+    with pytest.raises(HTTPException) as exc_info:
+        parse_search_date("12/01/2025")
+    assert exc_info.value.status_code == 400
+
+
+async def test_reference_data_registry_resolves_codes_and_attaches_records():
+    """The registry resolves codes case-insensitively and attaches records to flight rows"""
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    airports = [
+        Airport(id=uuid.UUID(ORIGIN_ID), iata_code="JFK", name="JFK", city="New York", country="USA", created_at=created_at),
+        Airport(id=uuid.UUID(DESTINATION_ID), iata_code="LAX", name="LAX", city="Los Angeles", country="USA", created_at=created_at),
+    ]
+    airlines = [Airline(id=uuid.UUID(AIRLINE_ID), code="UA", name="United Airlines", created_at=created_at)]
+    factory, _, _ = make_session_factory(
+        fingerprint_result((2, created_at, 1, created_at)),
+        scalars_result(airports),
+        scalars_result(airlines),
+    )
+    registry = ReferenceDataRegistry(session_factory=factory)
+
+    version = await registry.load()
+
+    assert version == 1
+    assert registry.airport_id("jfk") == ORIGIN_ID
+    assert registry.airline_id("ua") == AIRLINE_ID
+    flight = registry.attach({
+        "airline_id": AIRLINE_ID,
+        "origin_airport_id": ORIGIN_ID,
+        "destination_airport_id": DESTINATION_ID,
+    })
+    assert flight["airline"]["name"] == "United Airlines"
+    assert flight["destination_airport"]["iata_code"] == "LAX"
+
+
+async def test_reference_data_registry_skips_reload_when_unchanged():
+    """reload_if_changed only publishes a new version when the fingerprint moves"""
+    fingerprint = (0, None, 0, None)
+    factory, _, _ = make_session_factory(
+        fingerprint_result(fingerprint), scalars_result([]), scalars_result([]),
+        fingerprint_result(fingerprint),
+    )
+    registry = ReferenceDataRegistry(session_factory=factory)
+    await registry.load()
+
+    assert await registry.reload_if_changed() is False
+    assert registry.version == 1
+
+
+def round_trip_params():
+    return FlightSearchParams(
+        from_code="JFK", to_code="LAX", departure_date="2025-12-01", return_date="2025-12-08",
+        passengers=Passengers(adults=1), trip_type="round-trip",
+    )
+
+
+@patch("app.services.flight_search.reference_data")
+async def test_round_trip_legs_run_concurrently(mock_reference_data):
+    """Both legs are in flight at the same time and results are tagged by direction"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.airport_id.side_effect = lambda code: {"JFK": ORIGIN_ID, "LAX": DESTINATION_ID}[code]
+    started = []
+    both_started = asyncio.Event()
+
+    async def fake_leg(origin_airport_id, *args, **kwargs):
+        started.append(origin_airport_id)
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), timeout=1)
+        return [{"id": f"flight-from-{origin_airport_id}"}]
+
+    async def fake_leg_with_session(db, *args, **kwargs):
+        return await fake_leg(*args, **kwargs)
+
+    with patch("app.services.flight_search.search_leg", side_effect=fake_leg_with_session), \
+         patch("app.services.flight_search.search_leg_in_new_session", side_effect=fake_leg):
+        result = await search_flight_inventory(MagicMock(), round_trip_params())
+
+    assert not result.partial
+    assert [f["is_return"] for f in result.flights] == [False, True]
+
+
+@patch("app.services.flight_search.reference_data")
+async def test_round_trip_failed_leg_returns_partial_result(mock_reference_data):
+    """A failing return leg yields the outbound flights plus a partial marker instead of an error"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.airport_id.side_effect = lambda code: {"JFK": ORIGIN_ID, "LAX": DESTINATION_ID}[code]
+
+    with patch("app.services.flight_search.search_leg", new_callable=AsyncMock, return_value=[{"id": "out"}]), \
+         patch("app.services.flight_search.search_leg_in_new_session", new_callable=AsyncMock, side_effect=TimeoutError()):
+        result = await search_flight_inventory(MagicMock(), round_trip_params())
+
+    assert result.partial
+    assert result.failed_legs == ("return",)
+    assert result.flights == [{"id": "out", "is_return": False}]
+
+
+@pytest.mark.parametrize("outbound_error, status_code", [
+    (TimeoutError(), 504),
+    (ConnectionError("database unreachable"), 503),
+])
+@patch("app.services.flight_search.reference_data")
+async def test_round_trip_both_legs_failing_names_them(mock_reference_data, outbound_error, status_code):
+    """With nothing to return the search reports which legs failed and why"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.airport_id.side_effect = lambda code: {"JFK": ORIGIN_ID, "LAX": DESTINATION_ID}[code]
+
+    with patch("app.services.flight_search.search_leg", new_callable=AsyncMock, side_effect=outbound_error), \
+         patch("app.services.flight_search.search_leg_in_new_session", new_callable=AsyncMock, side_effect=TimeoutError()):
+        with pytest.raises(HTTPException) as exc_info:
+            await search_flight_inventory(MagicMock(), round_trip_params())
+
+    assert exc_info.value.status_code == status_code
+    assert exc_info.value.detail == "Flight search failed for the outbound and return legs"
+
+
+def test_search_cursor_round_trip_and_sort_mismatch():
+    """Cursors decode back to their keyset position and are bound to the sort they were issued for"""
+    departure = datetime(2025, 12, 1, 9, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor("return", "departure_time", "asc", (departure, "abc"))
+
+    assert decode_cursor(cursor, "departure_time", "asc") == ("return", (departure, "abc"))
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, "price", "asc")
+    assert exc_info.value.status_code == 400
+    with pytest.raises(HTTPException):
+        decode_cursor("not-a-cursor", "departure_time", "asc")
+
+
+@pytest.mark.parametrize("sort_by, after", [
+    ("departure_time", [1]),
+    ("departure_time", "x"),
+    ("departure_time", ["not-a-date", "id"]),
+    ("departure_time", ["2025-12-01T09:30:00", "id"]),
+    ("price", ["cheap", "id"]),
+    ("price", [199.0, 7]),
+])
+def test_malformed_cursor_positions_are_rejected(sort_by, after):
+    """A cursor whose position does not fit the sort is a 400, never a 500"""
+    payload = json.dumps({"leg": "outbound", "sort": [sort_by, "asc"], "after": after})
+    cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, sort_by, "asc")
+    assert exc_info.value.status_code == 400
+
+
+def test_build_leg_query_keyset_page():
+    """A keyset page seeks past the last (sort value, id) and limits the rows fetched"""
+    query = build_leg_query(
+        ORIGIN_ID, DESTINATION_ID, date(2025, 12, 1), "economy", 1,
+        sort_by="price", after=(199.0, AIRLINE_ID), limit=21,
+    )
+    sql, params = compile_query(query)
+
+    assert "flights.economy_price >" in sql
+    assert "flights.id >" in sql
+    assert "flights.economy_price IS NOT NULL" in sql
+    assert "LIMIT" in sql
+    assert 21 in params.values()
+
+
+def test_after_keyset_matches_descending_order():
+    """The in-memory keyset filter skips rows up to and including the cursor position"""
+    rows = [
+        {"id": "a", "economy_price": 300.0},
+        {"id": "b", "economy_price": 200.0},
+        {"id": "c", "economy_price": 200.0},
+        {"id": "d", "economy_price": None},
+    ]
+    page = after_keyset(rows, (200.0, "b"), "price", "desc", "economy")
+    assert [row["id"] for row in page] == ["c"]
+
+
+@patch("app.services.flight_search.reference_data")
+async def test_search_page_moves_to_return_leg_when_outbound_is_exhausted(mock_reference_data):
+    """The last outbound page hands out a cursor for the start of the return leg"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.airport_id.side_effect = lambda code: {"JFK": ORIGIN_ID, "LAX": DESTINATION_ID}[code]
+    departure = datetime(2025, 12, 1, 8, tzinfo=timezone.utc)
+
+    with patch("app.services.flight_search.fetch_leg", new_callable=AsyncMock,
+               return_value=[{"id": "out-1", "departure_time": departure}]):
+        first = await search_flight_page(MagicMock(), round_trip_params(), limit=5)
+
+    assert first.flights == [{"id": "out-1", "departure_time": departure, "is_return": False}]
+    assert decode_cursor(first.next_cursor, "departure_time", "asc") == ("return", None)
+
+    returns = [{"id": f"ret-{i}", "departure_time": departure} for i in range(3)]
+    with patch("app.services.flight_search.fetch_leg", new_callable=AsyncMock, return_value=returns):
+        second = await search_flight_page(MagicMock(), round_trip_params(), limit=2, cursor=first.next_cursor)
+
+    assert [f["id"] for f in second.flights] == ["ret-0", "ret-1"]
+    assert all(f["is_return"] for f in second.flights)
+    assert decode_cursor(second.next_cursor, "departure_time", "asc") == ("return", (departure, "ret-1"))
+
+
+def test_fare_calendar_query_is_one_grouped_aggregate():
+    """The calendar is a single GROUP BY over the route/departure range"""
+    query = build_fare_calendar_query(ORIGIN_ID, DESTINATION_ID, date(2025, 11, 28), date(2025, 12, 4), "business", 2)
+    sql, _ = compile_query(query)
+
+    assert "JOIN" not in sql
+    assert "min(flights.business_price)" in sql
+    assert "count(flights.id)" in sql
+    assert "flights.business_available >=" in sql
+    assert "GROUP BY date(timezone('UTC', flights.departure_time))" in sql
+
+
+@patch("app.services.flight_search.reference_data")
+async def test_fare_calendar_fills_days_without_flights(mock_reference_data):
+    """Every day in the window is returned, with empty days reported as zero flights"""
+    mock_reference_data.ensure_loaded = AsyncMock()
+    mock_reference_data.airport_id.side_effect = lambda code: {"JFK": ORIGIN_ID, "LAX": DESTINATION_ID}[code]
+    result = MagicMock()
+    result.all.return_value = [(date(2025, 12, 1), 199.5, 3)]
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=result)
+
+    calendar = await fare_calendar(db, "JFK", "LAX", "2025-12-01", 1)
+
+    db.execute.assert_awaited_once()
+    assert calendar == [
+        {"departure_date": date(2025, 11, 30), "cheapest_price": None, "flight_count": 0},
+        {"departure_date": date(2025, 12, 1), "cheapest_price": 199.5, "flight_count": 3},
+        {"departure_date": date(2025, 12, 2), "cheapest_price": None, "flight_count": 0},
+    ]
+
+
+def leg_flight(flight_id, price, duration, departure):
+    return {
+        "id": flight_id,
+        "economy_price": price,
+        "duration_minutes": duration,
+        "departure_time": departure,
+        "arrival_time": departure + timedelta(minutes=duration),
+    }
+
+
+@pytest.mark.parametrize("rank_by", ["price", "duration", "score"])
+def test_rank_round_trip_pairs_matches_brute_force(rank_by):
+    """The heap merge returns the same top pairs as ranking the full cross product"""
+    out_day, return_day = datetime(2025, 12, 1, tzinfo=timezone.utc), datetime(2025, 12, 8, tzinfo=timezone.utc)
+    outbound = [leg_flight(f"o{i}", 100 + (i * 37) % 90, 120 + (i * 53) % 200, out_day) for i in range(12)]
+    inbound = [leg_flight(f"r{i}", 80 + (i * 41) % 120, 150 + (i * 29) % 180, return_day) for i in range(9)]
+
+    pairs = rank_round_trip_pairs(outbound, inbound, rank_by, "economy", 10)
+
+    every_pair = rank_round_trip_pairs(outbound, inbound, rank_by, "economy", len(outbound) * len(inbound))
+    assert len(every_pair) == len(outbound) * len(inbound)
+    assert [p["score"] for p in pairs] == sorted(p["score"] for p in every_pair)[:10]
+    if rank_by == "price":
+        assert pairs[0]["total_price"] == min(f["economy_price"] for f in outbound) + min(f["economy_price"] for f in inbound)
+
+
+def test_rank_round_trip_pairs_skips_return_before_outbound_arrival():
+    """A return flight leaving before the outbound lands is never paired with it"""
+    departure = datetime(2025, 12, 1, 8, tzinfo=timezone.utc)
+    outbound = [leg_flight("out", 100, 300, departure)]
+    inbound = [
+        leg_flight("too-early", 50, 300, departure + timedelta(hours=2)),
+        leg_flight("evening", 90, 300, departure + timedelta(hours=10)),
+    ]
+
+    pairs = rank_round_trip_pairs(outbound, inbound, "price", "economy", 5)
+
+    assert [p["return_flight"]["id"] for p in pairs] == ["evening"]
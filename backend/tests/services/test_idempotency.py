@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.idempotency import IdempotencyStore, ensure_single_worker, request_fingerprint, transient
+
+
+BOOKING = {"trip_type": "one-way", "flights": [{"flight_id": "f1"}]}
+
+
+async def test_retry_replays_first_response():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    calls = []
+
+    async def book():
+        calls.append(1)
+        return {"id": "b1", "passengers": []}
+
+    first = await store.run("k", request_fingerprint(BOOKING), book)
+    replayed, result = await store.run("k", request_fingerprint(dict(BOOKING)), book)
+
+    assert first == (False, {"id": "b1", "passengers": []})
+    assert replayed is True and result == {"id": "b1", "passengers": []}
+    assert len(calls) == 1
+    # A replay hands out a copy
+    result["passengers"].append("x")
+    assert (await store.run("k", request_fingerprint(BOOKING), book))[1]["passengers"] == []
+
+
+async def test_in_flight_duplicates_wait_for_the_first_execution():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    release = asyncio.Event()
+    calls = []
+
+    async def book():
+        calls.append(1)
+        await release.wait()
+        return {"id": "b1"}
+
+    fingerprint = request_fingerprint(BOOKING)
+    tasks = [asyncio.create_task(store.run("k", fingerprint, book)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    outcomes = await asyncio.gather(*tasks)
+
+    assert len(calls) == 1
+    assert sorted(replayed for replayed, _ in outcomes) == [False, True, True, True, True]
+    assert store.stats()["waits"] == 4
+
+
+async def test_validation_errors_are_replayed_but_state_dependent_errors_are_not():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    fingerprint = request_fingerprint(BOOKING)
+
+    async def invalid():
+        raise HTTPException(status_code=400, detail="Booking must have at least one passenger")
+
+    async def sold_out():
+        raise transient(HTTPException(status_code=400, detail="Not enough seats"))
+
+    async def hold_expired():
+        raise HTTPException(status_code=409, detail="Seat hold expired")
+
+    async def broken():
+        raise HTTPException(status_code=500, detail="database down")
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc_info:
+            await store.run("invalid", fingerprint, invalid)
+        assert exc_info.value.detail == "Booking must have at least one passenger"
+    assert store.executions == 1
+
+    # A retry after seats free up, or after a fix on the server, runs again
+    for key, operation in (("sold-out", sold_out), ("expired", hold_expired), ("broken", broken)):
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await store.run(key, fingerprint, operation)
+    assert store.executions == 7
+    assert store.stats()["entries"] == 1
+
+
+async def test_key_reused_for_another_request_is_rejected():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+
+    async def book():
+        return {"id": "b1"}
+
+    await store.run("k", request_fingerprint(BOOKING), book)
+    with pytest.raises(HTTPException) as exc_info:
+        await store.run("k", request_fingerprint({**BOOKING, "trip_type": "round-trip"}), book)
+    assert exc_info.value.status_code == 422
+
+
+async def test_expired_entries_run_again():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=0)
+    calls = []
+
+    async def book():
+        calls.append(1)
+        return {"id": "b1"}
+
+    await store.run("k", "f", book)
+    await store.run("k", "f", book)
+
+    assert len(calls) == 2
+    assert store.stats()["expirations"] == 1
+
+
+def test_startup_refuses_several_workers(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    ensure_single_worker()
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(RuntimeError, match="WEB_CONCURRENCY=4"):
+        ensure_single_worker()
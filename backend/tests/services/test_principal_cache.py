@@ -0,0 +1,55 @@
+import time
+
+from app.services.principal_cache import ENTRY_OVERHEAD_BYTES, PrincipalCache, token_digest
+
+
+def test_principal_is_cached_per_scope_until_token_expiry():
+    cache = PrincipalCache(max_bytes=10_000)
+    cache.set("token", {"id": "u1"}, time.time() + 60, scope="services")
+
+    assert cache.get("token", scope="services") == {"id": "u1"}
+    assert cache.get("token", scope="middleware") is None
+    assert cache.get("other", scope="services") is None
+    assert cache.stats()["hit_ratio"] == round(1 / 3, 4)
+
+
+def test_expired_or_exp_less_tokens_are_not_served():
+    cache = PrincipalCache(max_bytes=10_000)
+    cache.set("no-exp", {"id": "u1"}, None, scope="services")
+    cache.set("expired", {"id": "u1"}, time.time() - 1, scope="services")
+    cache.set("expiring", {"id": "u1"}, time.time() + 60, scope="services")
+    # Expiry is the token's exp, so rewind it instead of waiting
+    key, (_, principal, size) = next(iter(cache._entries.items()))
+    cache._entries[key] = (time.time() - 1, principal, size)
+
+    assert cache.get("no-exp", scope="services") is None
+    assert cache.get("expired", scope="services") is None
+    assert cache.get("expiring", scope="services") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_principals_are_evicted_past_the_byte_budget():
+    cache = PrincipalCache(max_bytes=3 * (ENTRY_OVERHEAD_BYTES + 20))
+    expires_at = time.time() + 60
+    for name in ("a", "b", "c"):
+        cache.set(name, {"id": name}, expires_at, scope="services")
+    cache.get("a", scope="services")
+    cache.set("d", {"id": "d"}, expires_at, scope="services")
+
+    assert cache.get("b", scope="services") is None
+    assert cache.get("a", scope="services") == {"id": "a"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_logout_invalidates_every_scope_and_keys_are_digests():
+    cache = PrincipalCache(max_bytes=10_000)
+    expires_at = time.time() + 60
+    cache.set("token", {"id": "u1"}, expires_at, scope="services")
+    cache.set("token", {"id": "u1", "email": None}, expires_at, scope="middleware")
+
+    assert all(isinstance(digest, bytes) and digest != b"token" for _, digest in cache._entries)
+    assert ("services", token_digest("token")) in cache._entries
+    assert cache.invalidate("token") == 2
+    assert cache.get("token", scope="services") is None
+    assert cache.get("token", scope="middleware") is None
@@ -0,0 +1,124 @@
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.route_graph import (
+    ItineraryRequest,
+    RouteGraph,
+    build_connection_flights_query,
+    build_itineraries,
+)
+
+from conftest import make_session_factory
+
+
+DAY = date(2025, 12, 1)
+
+
+def at(hour, minute=0, day=0):
+    return datetime(2025, 12, 1, tzinfo=timezone.utc) + timedelta(days=day, hours=hour, minutes=minute)
+
+
+def flight(flight_id, origin, destination, departure, minutes, price):
+    return {
+        "id": flight_id,
+        "origin_airport_id": origin,
+        "destination_airport_id": destination,
+        "departure_time": departure,
+        "arrival_time": departure + timedelta(minutes=minutes),
+        "economy_price": price,
+    }
+
+
+def make_graph():
+    graph = RouteGraph(session_factory=MagicMock())
+    graph.add_routes([
+        ("JFK", "LAX", 360),
+        ("JFK", "ORD", 150),
+        ("ORD", "LAX", 240),
+        ("JFK", "ATL", 140),
+        ("ATL", "DEN", 200),
+        ("DEN", "LAX", 150),
+        ("ORD", "JFK", 140),
+    ])
+    return graph
+
+
+def test_paths_respect_stop_budget_and_duration_bound():
+    """Paths are ordered by their duration lower bound and limited by stops and max_duration"""
+    graph = make_graph()
+
+    assert graph.paths("JFK", "LAX", max_stops=0) == [("JFK", "LAX")]
+    assert graph.paths("JFK", "LAX", max_stops=1) == [("JFK", "LAX"), ("JFK", "ORD", "LAX")]
+    assert graph.paths("JFK", "LAX", max_stops=2, min_connection=45)[-1] == ("JFK", "ATL", "DEN", "LAX")
+    assert ("JFK", "ATL", "DEN", "LAX") not in graph.paths("JFK", "LAX", max_stops=2, max_duration=500)
+
+
+def test_build_itineraries_enforces_connection_window_and_ranks_by_price():
+    """Connections shorter than the minimum or longer than the maximum are never built"""
+    paths = [("JFK", "LAX"), ("JFK", "ORD", "LAX")]
+    flights = [
+        flight("direct", "JFK", "LAX", at(8), 360, 500.0),
+        flight("jfk-ord", "JFK", "ORD", at(7), 150, 120.0),
+        flight("ord-lax-tight", "ORD", "LAX", at(9, 40), 240, 100.0),  # 10 minute connection
+        flight("ord-lax-ok", "ORD", "LAX", at(11), 240, 150.0),
+        flight("ord-lax-late", "ORD", "LAX", at(20), 240, 50.0),  # 10.5 hour connection
+    ]
+    request = ItineraryRequest(departure_date=DAY, min_connection=45, max_connection=360)
+
+    itineraries = build_itineraries(paths, flights, request)
+
+    assert [[s["id"] for s in i["segments"]] for i in itineraries] == [["jfk-ord", "ord-lax-ok"], ["direct"]]
+    assert itineraries[0]["stops"] == 1
+    assert itineraries[0]["total_price"] == 270.0
+    assert itineraries[0]["total_duration_minutes"] == 480
+
+
+def test_build_itineraries_prunes_by_price_and_duration():
+    """max_price and max_duration drop itineraries and sort_by=duration ranks by elapsed time"""
+    paths = [("JFK", "LAX"), ("JFK", "ORD", "LAX")]
+    flights = [
+        flight("direct", "JFK", "LAX", at(8), 360, 500.0),
+        flight("jfk-ord", "JFK", "ORD", at(7), 150, 120.0),
+        flight("ord-lax", "ORD", "LAX", at(11), 240, 150.0),
+        flight("next-day", "JFK", "LAX", at(8, day=1), 300, 90.0),
+    ]
+
+    by_duration = build_itineraries(paths, flights, ItineraryRequest(departure_date=DAY, sort_by="duration"))
+    assert [i["segments"][0]["id"] for i in by_duration] == ["direct", "jfk-ord"]
+
+    cheap_only = build_itineraries(paths, flights, ItineraryRequest(departure_date=DAY, max_price=300))
+    assert [i["stops"] for i in cheap_only] == [1]
+
+    fast_only = build_itineraries(paths, flights, ItineraryRequest(departure_date=DAY, max_duration=400))
+    assert [i["segments"][0]["id"] for i in fast_only] == ["direct"]
+
+
+def test_connection_flights_query_loads_all_edges_at_once():
+    """Candidate flights for every edge come from one query over the route tuples"""
+    query = build_connection_flights_query({("a", "b"), ("b", "c")}, DAY, "economy", 2)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    assert sql.count("SELECT") == 1
+    assert "(flights.origin_airport_id, flights.destination_airport_id) IN" in sql
+    assert "flights.economy_available >=" in sql
+
+
+async def test_refresh_merges_changed_routes_without_dropping_existing_ones():
+    """An incremental refresh only adds or shortens edges and advances the watermark"""
+    built = datetime(2025, 11, 1, tzinfo=timezone.utc)
+    full = MagicMock()
+    full.all.return_value = [("JFK", "ORD", 150, built)]
+    delta = MagicMock()
+    delta.all.return_value = [("ORD", "LAX", 240, built + timedelta(minutes=5)), ("JFK", "ORD", 140, built)]
+    factory, session, _ = make_session_factory(full, delta)
+    graph = RouteGraph(session_factory=factory)
+
+    await graph.rebuild()
+    await graph.refresh()
+
+    assert graph.neighbours("JFK") == {"ORD": 140}
+    assert graph.neighbours("ORD") == {"LAX": 240}
+    assert "flights.updated_at >" in str(session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert graph.stats()["incremental_refreshes"] == 1
@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+from app.services.search_cache import SearchResultCache, route_tag
+
+
+ROUTE = ("origin-1", "destination-1")
+
+
+def flight_row(flight_id, day="2025-12-01"):
+    return {
+        "id": flight_id,
+        "origin_airport_id": ROUTE[0],
+        "destination_airport_id": ROUTE[1],
+        "departure_time": f"{day}T10:00:00+00:00",
+    }
+
+
+def test_cache_hit_returns_copies_and_counts():
+    """Hits are counted and returned rows can be mutated without touching the cache"""
+    cache = SearchResultCache(max_entries=10, ttl_seconds=60)
+    cache.set("key", [flight_row("f1")], [route_tag(*ROUTE, "2025-12-01")])
+
+    rows = cache.get("key")
+    rows[0]["is_return"] = True
+
+    assert "is_return" not in cache.get("key")[0]
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    """The least recently used entry is evicted once the cache is full"""
+    cache = SearchResultCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", [], [])
+    cache.set("b", [], [])
+    cache.get("a")
+    cache.set("c", [], [])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == []
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_expires_entries_after_ttl():
+    """Entries older than the TTL are treated as misses"""
+    cache = SearchResultCache(max_entries=10, ttl_seconds=5)
+    with patch("app.services.search_cache.time.monotonic", return_value=100.0):
+        cache.set("key", [], [])
+    with patch("app.services.search_cache.time.monotonic", return_value=106.0):
+        assert cache.get("key") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidate_flight_only_drops_matching_route_and_day():
+    """A seat change invalidates searches on the flight's route/day, including ones that filtered it out"""
+    cache = SearchResultCache(max_entries=10, ttl_seconds=60)
+    cache.set("same-day-without-flight", [], [route_tag(*ROUTE, "2025-12-01")])
+    cache.set("same-day-with-flight", [flight_row("f1")], [route_tag(*ROUTE, "2025-12-01")])
+    cache.set("other-day", [flight_row("f2", "2025-12-02")], [route_tag(*ROUTE, "2025-12-02")])
+
+    dropped = cache.invalidate_flight(flight_row("f1"))
+
+    assert dropped == 2
+    assert cache.get("same-day-without-flight") is None
+    assert cache.get("other-day") is not None
+
+
+def test_invalidate_flight_without_route_uses_flight_index():
+    """When only the flight id is known, entries containing that flight are dropped"""
+    cache = SearchResultCache(max_entries=10, ttl_seconds=60)
+    cache.set("with-flight", [flight_row("f1")], [route_tag(*ROUTE, "2025-12-01")])
+    cache.set("without-flight", [flight_row("f2")], [route_tag(*ROUTE, "2025-12-01")])
+
+    assert cache.invalidate_flight({"flight_id": "f1"}) == 1
+    assert cache.get("without-flight") is not None
@@ -0,0 +1,138 @@
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.models import Booking
+from app.services.seat_holds import (
+    SeatHoldReaper,
+    cancel_booking,
+    convert_hold,
+    hold_deadline,
+    reap_expired_holds,
+)
+from app.services.seat_inventory import SeatRequest
+
+from conftest import make_session_factory
+
+
+BOOKING_ID = uuid.UUID(int=7)
+FLIGHT_A = str(uuid.UUID(int=1))
+
+
+def cancelled_bookings_result(*booking_ids):
+    bookings = []
+    for booking_id in booking_ids:
+        booking = Booking(id=booking_id, user_id=uuid.UUID(int=9), booking_reference="SBJ-ABC123",
+                          trip_type="one-way", total_amount=100, status="cancelled")
+        bookings.append(booking)
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = bookings
+    return result
+
+
+def booked_seats_result(*rows):
+    result = MagicMock()
+    result.all.return_value = list(rows)
+    return result
+
+
+def compiled(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_hold_deadline_disabled_with_zero_ttl():
+    assert hold_deadline(0) is None
+    assert "now()" in str(hold_deadline(600))
+
+
+@patch('app.services.seat_holds.release_seats', new_callable=AsyncMock)
+@patch('app.services.seat_holds.publish_seat_changes')
+async def test_cancel_booking_returns_seats_in_same_transaction(mock_publish, mock_release_seats):
+    """The status change and the seat return commit together and caches hear about it afterwards"""
+    released = [MagicMock()]
+    mock_release_seats.return_value = released
+    factory, session, transaction = make_session_factory(
+        cancelled_bookings_result(BOOKING_ID),
+        booked_seats_result((uuid.UUID(FLIGHT_A), "economy", 2)),
+    )
+
+    booking = await cancel_booking(str(BOOKING_ID), user_id=str(uuid.UUID(int=9)), session_factory=factory)
+
+    assert booking["id"] == str(BOOKING_ID)
+    assert booking["status"] == "cancelled"
+    cancel_sql = compiled(session.execute.call_args_list[0].args[0])
+    assert "bookings.status != " in cancel_sql
+    assert "FOR UPDATE" in cancel_sql and "SKIP LOCKED" not in cancel_sql
+    mock_release_seats.assert_awaited_once_with(session, [SeatRequest(FLIGHT_A, "economy", 2)])
+    assert transaction.__aexit__.call_args.args[0] is None
+    mock_publish.assert_called_once_with(released)
+
+
+@patch('app.services.seat_holds.release_seats', new_callable=AsyncMock)
+@patch('app.services.seat_holds.publish_seat_changes')
+async def test_cancel_booking_already_cancelled(mock_publish, mock_release_seats):
+    """Nothing matched, so no seats are returned twice"""
+    factory, session, _ = make_session_factory(cancelled_bookings_result())
+
+    assert await cancel_booking(str(BOOKING_ID), session_factory=factory) is None
+    assert session.execute.await_count == 1
+    mock_release_seats.assert_not_called()
+    mock_publish.assert_called_once_with([])
+
+
+async def test_convert_hold_confirms_live_hold():
+    converted = MagicMock()
+    converted.first.return_value = (BOOKING_ID,)
+    factory, session, _ = make_session_factory(converted)
+
+    assert await convert_hold(str(BOOKING_ID), session_factory=factory) is True
+    sql = compiled(session.execute.call_args.args[0])
+    assert "bookings.hold_expires_at > now()" in sql
+
+
+@pytest.mark.parametrize("current_status, expected", [("confirmed", False), ("pending", 409), ("cancelled", 409)])
+async def test_convert_hold_when_not_pending_or_expired(current_status, expected):
+    not_converted = MagicMock()
+    not_converted.first.return_value = None
+    status_result = MagicMock()
+    status_result.scalar_one_or_none.return_value = current_status
+    factory, _, _ = make_session_factory(not_converted, status_result)
+
+    if expected == 409:
+        with pytest.raises(HTTPException) as exc_info:
+            await convert_hold(str(BOOKING_ID), session_factory=factory)
+        assert exc_info.value.status_code == 409
+    else:
+        assert await convert_hold(str(BOOKING_ID), session_factory=factory) is expected
+
+
+@patch('app.services.seat_holds.release_seats', new_callable=AsyncMock, return_value=[])
+@patch('app.services.seat_holds.publish_seat_changes')
+async def test_reap_expired_holds_claims_a_batch_with_skip_locked(mock_publish, mock_release_seats):
+    other_booking = uuid.UUID(int=8)
+    factory, session, _ = make_session_factory(
+        cancelled_bookings_result(BOOKING_ID, other_booking),
+        booked_seats_result((uuid.UUID(FLIGHT_A), "economy", 3)),
+    )
+
+    assert await reap_expired_holds(batch_size=50, session_factory=factory) == 2
+
+    sql = compiled(session.execute.call_args_list[0].args[0])
+    assert "bookings.status = " in sql and "bookings.hold_expires_at <= now()" in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "LIMIT" in sql
+    # Seats of the whole batch are summed per flight and returned together
+    assert session.execute.await_count == 2
+    mock_release_seats.assert_awaited_once_with(session, [SeatRequest(FLIGHT_A, "economy", 3)])
+
+
+@patch('app.services.seat_holds.reap_expired_holds', new_callable=AsyncMock)
+async def test_reaper_drains_full_batches(mock_reap):
+    mock_reap.side_effect = [10, 10, 3]
+    reaper = SeatHoldReaper(session_factory=MagicMock(), batch_size=10)
+
+    assert await reaper.run_once() == 23
+    assert mock_reap.await_count == 3
@@ -0,0 +1,168 @@
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.services.seat_inventory import (
+    SeatRequest,
+    release,
+    release_seats,
+    reserve,
+    reserve_seats,
+    seat_adjustment_statement,
+    seat_return_statement,
+)
+
+from conftest import make_session_factory
+
+
+FLIGHT_A = str(uuid.UUID(int=1))
+FLIGHT_B = str(uuid.UUID(int=2))
+
+
+def returning_row(flight_id, remaining):
+    row = MagicMock()
+    row.id = uuid.UUID(flight_id)
+    row.flight_number = f"SB{flight_id[-1]}"
+    row.origin_airport_id = uuid.UUID(int=10)
+    row.destination_airport_id = uuid.UUID(int=11)
+    row.departure_time = datetime(2025, 12, 1, 10, tzinfo=timezone.utc)
+    row.__getitem__.side_effect = lambda index: remaining if index == -1 else None
+    return row
+
+
+def result_with(row):
+    result = MagicMock()
+    result.first.return_value = row
+    return result
+
+
+def result_with_all(*rows):
+    result = MagicMock()
+    result.all.return_value = list(rows)
+    return result
+
+
+def test_seat_decrement_is_one_conditional_update():
+    """Taking seats checks and writes availability in a single UPDATE ... RETURNING"""
+    statement = seat_adjustment_statement(SeatRequest(FLIGHT_A, "premium-economy", 3), -3)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("UPDATE flights SET premium_economy_available=(flights.premium_economy_available +")
+    assert "flights.premium_economy_available >=" in sql
+    assert "RETURNING" in sql
+
+
+def test_seat_release_is_unconditional():
+    statement = seat_adjustment_statement(SeatRequest(FLIGHT_A, "economy", 2), 2)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert "economy_available >=" not in sql
+
+
+async def test_reserve_seats_locks_legs_in_flight_id_order():
+    """Legs are updated in id order regardless of booking order, avoiding deadlocks"""
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[result_with(returning_row(FLIGHT_A, 8)), result_with(returning_row(FLIGHT_B, 3))])
+
+    reservations = await reserve_seats(session, [SeatRequest(FLIGHT_B, "economy", 2, True), SeatRequest(FLIGHT_A, "economy", 2)])
+
+    assert [r.flight["id"] for r in reservations] == [FLIGHT_A, FLIGHT_B]
+    assert [r.remaining for r in reservations] == [8, 3]
+
+
+async def test_reserve_rolls_back_every_leg_when_one_is_short():
+    """A short leg raises inside the transaction, so the earlier leg's decrement is rolled back"""
+    flight_b = returning_row(FLIGHT_B, 1)
+    flight_b.seat_stripes = 0
+    shortage = result_with(flight_b)
+    factory, session, transaction = make_session_factory(
+        result_with(returning_row(FLIGHT_A, 8)), result_with(None), shortage
+    )
+
+    with patch("app.services.seat_inventory.inventory_events") as mock_events:
+        with pytest.raises(HTTPException) as exc_info:
+            await reserve(
+                [SeatRequest(FLIGHT_A, "economy", 2), SeatRequest(FLIGHT_B, "economy", 2, True)],
+                session_factory=factory,
+            )
+
+    assert exc_info.value.status_code == 400
+    assert "Not enough economy seats available for return flight SB2" in exc_info.value.detail
+    # The transaction block saw the exception (and therefore rolled back)
+    assert transaction.__aexit__.call_args.args[0] is HTTPException
+    mock_events.publish_seat_change.assert_not_called()
+
+
+async def test_reserve_rejects_unknown_flight():
+    factory, _, _ = make_session_factory(result_with(None), result_with(None))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await reserve([SeatRequest(FLIGHT_A, "economy", 1)], session_factory=factory)
+
+    assert exc_info.value.detail == f"Flight with ID {FLIGHT_A} not found"
+
+
+async def test_reserve_and_release_publish_after_commit():
+    """Caches are told about the new availability once the transaction has committed"""
+    factory, _, transaction = make_session_factory(
+        result_with(returning_row(FLIGHT_A, 8)), result_with_all(returning_row(FLIGHT_A, 10))
+    )
+
+    with patch("app.services.seat_inventory.inventory_events") as mock_events:
+        await reserve([SeatRequest(FLIGHT_A, "economy", 2)], session_factory=factory)
+        await release([SeatRequest(FLIGHT_A, "economy", 2)], session_factory=factory)
+
+    assert transaction.__aexit__.call_args.args[0] is None
+    published = [c.args[1:] for c in mock_events.publish_seat_change.call_args_list]
+    assert published == [("economy_available", 8), ("economy_available", 10)]
+
+
+async def test_invalid_flight_id_is_a_bad_request():
+    with pytest.raises(HTTPException) as exc_info:
+        seat_adjustment_statement(SeatRequest("not-a-uuid", "economy", 1), -1)
+    assert exc_info.value.status_code == 400
+
+
+def test_seat_return_is_one_statement_per_cabin():
+    """Returning seats to many flights is a single UPDATE ... FROM (VALUES ...)"""
+    statement = seat_return_statement("economy_available", {FLIGHT_B: 1, FLIGHT_A: 3})
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("UPDATE flights SET economy_available=(flights.economy_available + returned_seats.seats)")
+    assert "FROM (VALUES" in sql
+    assert "WHERE flights.id = returned_seats.flight_id" in sql
+    assert "RETURNING" in sql
+
+
+async def test_release_seats_sums_legs_per_flight_and_cabin():
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[
+        result_with_all(returning_row(FLIGHT_A, 4)),
+        result_with_all(returning_row(FLIGHT_A, 12), returning_row(FLIGHT_B, 7)),
+    ])
+
+    released = await release_seats(session, [
+        SeatRequest(FLIGHT_A, "economy", 2),
+        SeatRequest(FLIGHT_B, "economy", 1),
+        SeatRequest(FLIGHT_A.upper(), "economy", 1),
+        SeatRequest(FLIGHT_A, "business", 1),
+    ])
+
+    # One statement per cabin class, whatever the number of flights
+    assert session.execute.await_count == 2
+    assert [(r.request.cabin_class, r.flight["id"], r.request.seats) for r in released] == [
+        ("business", FLIGHT_A, 1),
+        ("economy", FLIGHT_A, 3),
+        ("economy", FLIGHT_B, 1),
+    ]
+
+
+async def test_release_seats_skips_missing_flights():
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result_with_all())
+
+    assert await release_seats(session, [SeatRequest(FLIGHT_A, "economy", 2)]) == []
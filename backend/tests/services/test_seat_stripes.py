@@ -0,0 +1,169 @@
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.services import seat_stripes
+from app.services.seat_inventory import SeatRequest, reserve_seats
+from app.services.seat_stripes import (
+    set_stripes,
+    split_seats,
+    stripe_decrement_statement,
+    stripe_return_statement,
+    take_seats,
+)
+
+
+FLIGHT_A = str(uuid.UUID(int=1))
+ROUTE = {
+    "id": FLIGHT_A,
+    "flight_number": "SB1",
+    "origin_airport_id": str(uuid.UUID(int=10)),
+    "destination_airport_id": str(uuid.UUID(int=11)),
+    "departure_time": datetime(2025, 12, 1, 10, tzinfo=timezone.utc),
+}
+
+
+@pytest.fixture(autouse=True)
+def forget_striped_flights():
+    seat_stripes._striped_flights.clear()
+    yield
+    seat_stripes._striped_flights.clear()
+
+
+def result_with(row):
+    result = MagicMock()
+    result.first.return_value = row
+    return result
+
+
+def result_with_all(*rows):
+    result = MagicMock()
+    result.all.return_value = list(rows)
+    return result
+
+
+def compiled(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_split_seats_spreads_remainder():
+    assert split_seats(10, 4) == [3, 3, 2, 2]
+    assert split_seats(2, 4) == [1, 1, 0, 0]
+    assert sum(split_seats(187, 16)) == 187
+
+
+def test_stripe_decrement_skips_locked_stripes():
+    """A booking takes one unlocked stripe with enough seats, starting from a random one"""
+    sql = compiled(stripe_decrement_statement(uuid.UUID(FLIGHT_A), "economy_available", 2, start=3))
+
+    assert sql.startswith("UPDATE flight_seat_stripes SET available=(flight_seat_stripes.available -")
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "flight_seat_stripes.available >=" in sql
+    # The candidate subquery scans the stripes rather than correlating to the updated row
+    assert "FROM flight_seat_stripes AS flight_seat_stripes_1" in sql
+    assert "RETURNING" in sql
+
+
+def test_stripe_return_is_set_based():
+    sql = compiled(stripe_return_statement("economy_available", {uuid.UUID(FLIGHT_A): 2}))
+
+    assert "FROM (VALUES" in sql
+    assert "flight_seat_stripes.stripe = " in sql
+    assert "RETURNING flights.id" in sql
+
+
+async def test_take_seats_from_one_stripe():
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result_with((3, 40)))
+
+    take = await take_seats(session, uuid.UUID(FLIGHT_A), "economy_available", 2, stripes=8)
+
+    assert take == (True, 38)
+    assert session.execute.await_count == 1
+
+
+async def test_take_seats_spills_over_stripes():
+    """No single stripe has enough seats, so they are gathered across stripes"""
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[
+        result_with(None),
+        result_with_all((0, 1), (1, 0), (2, 2), (3, 1)),
+        MagicMock(),
+        MagicMock(),
+    ])
+
+    take = await take_seats(session, uuid.UUID(FLIGHT_A), "economy_available", 3, stripes=4)
+
+    assert take == (True, 1)
+    # One locking read and one update per stripe drawn from
+    assert session.execute.await_count == 4
+    assert "FOR UPDATE" in compiled(session.execute.call_args_list[1].args[0])
+
+
+async def test_take_seats_short_across_all_stripes():
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[result_with(None), result_with_all((0, 1), (1, 1))])
+
+    take = await take_seats(session, uuid.UUID(FLIGHT_A), "economy_available", 3, stripes=2)
+
+    assert take == (False, 2)
+
+
+@patch('app.services.seat_inventory.seat_stripes.take_seats', new_callable=AsyncMock)
+async def test_reserve_seats_goes_straight_to_known_stripes(mock_take_seats):
+    """A flight known to be striped never touches its flights row"""
+    seat_stripes.remember_striped(ROUTE, 8)
+    mock_take_seats.return_value = seat_stripes.StripeTake(True, 41)
+    session = MagicMock()
+    session.execute = AsyncMock()
+
+    reservations = await reserve_seats(session, [SeatRequest(FLIGHT_A, "economy", 1)])
+
+    assert reservations[0].remaining == 41
+    assert reservations[0].flight == ROUTE
+    session.execute.assert_not_called()
+
+
+@patch('app.services.seat_inventory.seat_stripes.take_seats', new_callable=AsyncMock)
+async def test_reserve_seats_discovers_striped_flight(mock_take_seats):
+    """The single-row decrement misses, the flight turns out to be striped and is remembered"""
+    mock_take_seats.return_value = seat_stripes.StripeTake(True, 9)
+    flight_row = MagicMock(**{key: value for key, value in ROUTE.items() if key != "id"})
+    flight_row.id = uuid.UUID(FLIGHT_A)
+    flight_row.seat_stripes = 4
+    flight_row.__getitem__.side_effect = lambda index: 0 if index == -1 else None
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[result_with(None), result_with(flight_row)])
+
+    reservations = await reserve_seats(session, [SeatRequest(FLIGHT_A, "economy", 1)])
+
+    assert reservations[0].remaining == 9
+    assert mock_take_seats.call_args.args[4] == 4
+    assert seat_stripes.striped_flight(FLIGHT_A)["seat_stripes"] == 4
+
+
+@patch('app.services.seat_inventory.seat_stripes.take_seats', new_callable=AsyncMock)
+async def test_reserve_seats_short_on_striped_flight(mock_take_seats):
+    seat_stripes.remember_striped(ROUTE, 4)
+    mock_take_seats.return_value = seat_stripes.StripeTake(False, 1)
+    flight_row = MagicMock(**{key: value for key, value in ROUTE.items() if key != "id"})
+    flight_row.id = uuid.UUID(FLIGHT_A)
+    flight_row.seat_stripes = 4
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[result_with(None), result_with(flight_row)])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await reserve_seats(session, [SeatRequest(FLIGHT_A, "economy", 2)])
+
+    assert exc_info.value.status_code == 400
+    assert "Available: 1, Requested: 2" in exc_info.value.detail
+
+
+async def test_set_stripes_rejects_out_of_range():
+    with pytest.raises(HTTPException) as exc_info:
+        await set_stripes(FLIGHT_A, seat_stripes.MAX_SEAT_STRIPES + 1, session_factory=MagicMock())
+    assert exc_info.value.status_code == 400
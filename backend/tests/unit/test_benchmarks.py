@@ -0,0 +1,117 @@
+"""
+Unit tests for the benchmark inventory generator and result summaries.
+"""
+from datetime import timedelta
+
+from benchmarks.booking_load import generate_booking_requests, inventory_violations
+from benchmarks.harness import build_request, percentile, summarize, FlightSample
+from benchmarks.inventory import (
+    FLIGHT_COLUMNS,
+    InventoryConfig,
+    airline_code,
+    airport_code,
+    flight_index_ddl,
+    generate_airlines,
+    generate_airports,
+    generate_flights,
+    generate_routes,
+)
+
+
+SMALL = InventoryConfig(airports=50, airlines=10, routes_per_airport=4, days=3, max_flights_per_route_day=3, seed=7)
+
+
+def build(config):
+    airports = generate_airports(config)
+    airlines = generate_airlines(config)
+    routes = generate_routes(config, airports)
+    return airports, airlines, routes, list(generate_flights(config, airports, airlines, routes))
+
+
+def test_generator_is_deterministic_per_seed():
+    """The same config yields identical rows; a different seed does not"""
+    first = build(SMALL)
+    second = build(SMALL)
+    other = build(SMALL._replace(seed=8))
+
+    assert first == second
+    assert first[3] != other[3]
+
+
+def test_generator_rows_are_consistent():
+    """Codes are unique, routes never loop and arrival matches departure plus duration"""
+    airports, airlines, routes, flights = build(SMALL)
+
+    assert len({a[1] for a in airports}) == len(airports)
+    assert len({a[1] for a in airlines}) == len(airlines)
+    assert len(routes) == SMALL.airports * SMALL.routes_per_airport
+    assert all(route.origin != route.destination for route in routes)
+    assert len(flights) <= SMALL.airports * SMALL.routes_per_airport * SMALL.days * SMALL.max_flights_per_route_day
+    for flight in flights:
+        row = dict(zip(FLIGHT_COLUMNS, flight))
+        assert row["arrival_time"] - row["departure_time"] == timedelta(minutes=row["duration_minutes"])
+        assert row["departure_time"].date() - SMALL.start_date < timedelta(days=SMALL.days)
+
+
+def test_single_day_can_be_regenerated():
+    """Each day has its own random stream, so one day regenerates identically on its own"""
+    airports, airlines, routes, flights = build(SMALL)
+    day_two = list(generate_flights(SMALL, airports, airlines, routes, days=range(2, 3)))
+
+    assert day_two == [f for f in flights if f[5].date() == SMALL.start_date + timedelta(days=2)]
+
+
+def test_code_generators_do_not_collide():
+    assert len({airport_code(i) for i in range(26 ** 3)}) == 26 ** 3
+    assert len({airline_code(i) for i in range(36 ** 2)}) == 36 ** 2
+
+
+def test_flight_index_ddl_covers_search_index():
+    assert "ix_flights_origin_dest_departure" in dict(flight_index_ddl())
+
+
+def test_summarize_reports_percentiles_and_errors():
+    latencies = [i / 1000 for i in range(1, 101)]
+    summary = summarize(latencies, {200: 98, 503: 2}, errors=1, elapsed=2.0)
+
+    assert summary["requests"] == 101
+    assert summary["errors"] == 3
+    assert summary["throughput_rps"] == 50.0
+    assert summary["latency_ms"]["p50"] == 50.0
+    assert summary["latency_ms"]["p99"] == 99.0
+    assert percentile([], 0.5) is None
+
+
+def test_build_request_for_each_scenario():
+    sample = FlightSample("f-1", "AAA", "BBB", "2026-01-02")
+
+    assert build_request("search", sample, 0).params["from_code"] == "AAA"
+    assert build_request("availability", sample, 0).path == "/flights/f-1/availability"
+    booking = build_request("booking", sample, 3)
+    assert booking.method == "POST"
+    assert booking.json["flights"][0]["flight_id"] == "f-1"
+
+
+def test_booking_requests_are_deterministic_and_valid():
+    flights = ["f-1", "f-2", "f-3"]
+    requests = generate_booking_requests(flights, 200, max_passengers=3, seed=5)
+
+    assert requests == generate_booking_requests(flights, 200, max_passengers=3, seed=5)
+    for request in requests:
+        data = request.booking_data
+        legs = [leg["flight_id"] for leg in data["flights"]]
+        assert len(legs) == (2 if data["trip_type"] == "round-trip" else 1)
+        assert len(set(legs)) == len(legs)
+        assert 1 <= len(data["passengers"]) <= 3
+        assert sum(request.seats.values()) == len(legs) * len(data["passengers"])
+    assert {request.booking_data["trip_type"] for request in requests} == {"one-way", "round-trip"}
+
+
+def test_inventory_violations_flag_oversell_and_lost_seats():
+    before = {("f-1", "economy"): 10, ("f-1", "business"): 2}
+
+    assert inventory_violations(before, {("f-1", "economy"): 4, ("f-1", "business"): 2}, {("f-1", "economy"): 6}) == []
+    oversold = inventory_violations(before, {("f-1", "economy"): 0, ("f-1", "business"): -1}, {("f-1", "economy"): 10, ("f-1", "business"): 3})
+    assert oversold == ["f-1 business: availability went negative (-1)"]
+    lost = inventory_violations(before, {("f-1", "economy"): 3, ("f-1", "business"): 2}, {("f-1", "economy"): 6})
+    assert lost == ["f-1 economy: 7 seats gone but 6 passengers booked"]